@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.corpus
+
+    The synthetic media corpus used by the benchmark harness.
+
+    Each file is generated locally with FFmpeg's 'testsrc2' (video) and 'sine' (audio) lavfi sources. Subtitle
+    streams are muxed from a small SRT file.
+    The recorded ffprobe output of each file is kept in 'fixtures/<name>.json' so that the harness can run without
+    FFmpeg installed.
+
+"""
+import json
+import os
+import subprocess
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Language tags of the many track file, written in the different forms found in the wild (ISO 639-1/2B/2T and names)
+MANY_TRACK_LANGUAGES = [
+    'eng', 'fre', 'fra', 'ger', 'deu', 'spa', 'ita', 'jpn', 'chi',
+    'zho', 'kor', 'rus', 'por', 'dut', 'nld', 'swe', 'en', 'und',
+]
+
+SUBTITLE_TEXT = "1\n00:00:00,000 --> 00:00:05,000\nTest\n"
+
+CORPUS = [
+    {
+        "name":     "h264_1080p_stereo_eng",
+        "duration": 30,
+        "video":    {"size": "1920x1080", "rate": 24, "codec": "libx264", "pix_fmt": "yuv420p"},
+        "audio":    [{"channels": 2, "codec": "aac", "language": "eng"}],
+    },
+    {
+        "name":     "hevc_2160p10_51_multilang",
+        "duration": 20,
+        "video":    {"size": "3840x2160", "rate": 24, "codec": "libx265", "pix_fmt": "yuv420p10le"},
+        "audio":    [
+            {"channels": 6, "codec": "ac3", "language": "eng"},
+            {"channels": 2, "codec": "aac", "language": "fre"},
+            {"channels": 2, "codec": "aac", "language": "jpn"},
+        ],
+    },
+    {
+        "name":     "h264_1080p_36_tracks_multilang",
+        "duration": 10,
+        "video":    {"size": "1920x1080", "rate": 24, "codec": "libx264", "pix_fmt": "yuv420p"},
+        "audio":    [
+            {"channels": 6 if i % 3 == 0 else 2, "codec": "ac3" if i % 3 == 0 else "aac", "language": language}
+            for i, language in enumerate(MANY_TRACK_LANGUAGES)
+        ],
+        "subtitles": [{"language": language} for language in reversed(MANY_TRACK_LANGUAGES)],
+    },
+    {
+        "name":     "h264_720p_letterbox_und",
+        "duration": 15,
+        "video":    {"size": "1280x720", "rate": 30, "codec": "libx264", "pix_fmt": "yuv420p", "letterbox": 90},
+        "audio":    [{"channels": 2, "codec": "aac", "language": "und"}],
+    },
+]
+
+
+def generate_command(entry, output_file):
+    """
+    Returns the FFmpeg command that generates a corpus file
+
+    :param entry:
+    :param output_file:
+    :return:
+    """
+    video = entry['video']
+    command = [
+        'ffmpeg', '-hide_banner', '-y',
+        '-f', 'lavfi', '-i', 'testsrc2=size={}:rate={}:duration={}'.format(video['size'], video['rate'],
+                                                                          entry['duration']),
+    ]
+    for audio in entry['audio']:
+        command += ['-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000:duration={}'.format(entry['duration'])]
+    subtitle_input = len(entry['audio']) + 1
+    if entry.get('subtitles'):
+        command += ['-i', subtitle_file(output_file)]
+    video_filters = []
+    if video.get('letterbox'):
+        bar = video['letterbox']
+        video_filters.append('drawbox=x=0:y=0:w=iw:h={0}:color=black:t=fill,'
+                             'drawbox=x=0:y=ih-{0}:w=iw:h={0}:color=black:t=fill'.format(bar))
+    command += ['-map', '0:v:0']
+    if video_filters:
+        command += ['-vf', ','.join(video_filters)]
+    command += ['-c:v', video['codec'], '-preset', 'ultrafast', '-pix_fmt', video['pix_fmt']]
+    for i, audio in enumerate(entry['audio']):
+        command += [
+            '-map', '{}:a:0'.format(i + 1),
+            '-c:a:{}'.format(i), audio['codec'],
+            '-ac:a:{}'.format(i), str(audio['channels']),
+            '-metadata:s:a:{}'.format(i), 'language={}'.format(audio['language']),
+        ]
+    for i, subtitle in enumerate(entry.get('subtitles', [])):
+        command += [
+            '-map', '{}:s:0'.format(subtitle_input),
+            '-c:s:{}'.format(i), 'srt',
+            '-metadata:s:s:{}'.format(i), 'language={}'.format(subtitle['language']),
+        ]
+    command += [output_file]
+    return command
+
+
+def subtitle_file(output_file):
+    """
+    Returns the path of the SRT file that the subtitle streams of a corpus file are generated from
+
+    :param output_file:
+    :return:
+    """
+    return os.path.splitext(output_file)[0] + '.srt'
+
+
+def generate(corpus_directory):
+    """
+    Generate every corpus file with FFmpeg. Existing files are kept.
+
+    :param corpus_directory:
+    :return:
+    """
+    os.makedirs(corpus_directory, exist_ok=True)
+    paths = []
+    for entry in CORPUS:
+        path = os.path.join(corpus_directory, entry['name'] + '.mkv')
+        if not os.path.exists(path):
+            if entry.get('subtitles'):
+                with open(subtitle_file(path), 'w') as f:
+                    f.write(SUBTITLE_TEXT)
+            subprocess.check_call(generate_command(entry, path), stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        paths.append(path)
+    return paths
+
+
+def record_fixtures(paths):
+    """
+    Record the ffprobe output of each generated corpus file as a fixture
+
+    :param paths:
+    :return:
+    """
+    os.makedirs(FIXTURES_DIRECTORY, exist_ok=True)
+    for path in paths:
+        output = subprocess.check_output([
+            'ffprobe', '-hide_banner', '-loglevel', 'quiet', '-print_format', 'json', '-show_format',
+            '-show_streams', path,
+        ])
+        probe = json.loads(output)
+        # The fake ffprobe sets the path of the probed placeholder
+        probe.setdefault('format', {})['filename'] = os.path.basename(path)
+        fixture_file = os.path.join(FIXTURES_DIRECTORY, os.path.splitext(os.path.basename(path))[0] + '.json')
+        with open(fixture_file, 'w') as f:
+            json.dump(probe, f, indent=2)
+
+
+def create_placeholders(corpus_directory):
+    """
+    Create a placeholder file for each fixture. The fake ffprobe returns the fixture for the placeholder.
+    Each placeholder is sized to match the size recorded in its fixture, using a sparse file.
+
+    :param corpus_directory:
+    :return:
+    """
+    os.makedirs(corpus_directory, exist_ok=True)
+    paths = []
+    for entry in CORPUS:
+        fixture_file = os.path.join(FIXTURES_DIRECTORY, entry['name'] + '.json')
+        if not os.path.exists(fixture_file):
+            continue
+        with open(fixture_file) as f:
+            size = int(json.load(f).get('format', {}).get('size', 0))
+        path = os.path.join(corpus_directory, entry['name'] + '.mkv')
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        paths.append(path)
+    return paths
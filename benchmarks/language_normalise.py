@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.language_normalise
+
+    Measures the language matching of keep_streams_by_languages on files with many audio and subtitle tracks.
+
+    The stream tests of the plugin's file test and worker runners (stream classification by the compiled stream rules,
+    fail-safe check, 'needs processing' check and the worker's stream mapping) are run for each file of the corpus
+    with more than MIN_TRACKS audio/subtitle streams, with:
+        uncached    - every language tag is looked up with iso639 and the rules are compiled each time
+        cold        - the language caches are cleared before each file
+        warm        - the language caches are kept between files (the normal case in a library scan)
+
+    Requires the plugin's own requirements (python-iso639, peewee). No FFmpeg required, the recorded fixtures are
+    probed with the fake ffprobe in 'fake_bin'.
+
+    Usage:
+        python3 benchmarks/language_normalise.py [--iterations 20] [--json out.json]
+
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+import corpus  # noqa: E402
+import run_benchmarks  # noqa: E402
+
+PLUGIN_ID = 'keep_streams_by_languages'
+
+# Only files with at least this many audio + subtitle streams are benchmarked
+MIN_TRACKS = 30
+
+SETTINGS = {
+    "audio_languages":             'eng, fre, jpn',
+    "subtitle_languages":          'eng, ger, spa, chi',
+    "keep_undefined":              True,
+    "keep_commentary":             False,
+    "fail_safe":                   True,
+    "audio_fallback_languages":    'kor',
+    "subtitle_fallback_languages": 'eng',
+    "audio_max_per_language":      1,
+    "subtitle_max_per_language":   2,
+    "drop_codecs":                 'dts',
+}
+
+CACHED_FUNCTIONS = ['_match_language', '_compile_rules']
+
+
+def stream_tests(plugin, settings, probe, path):
+    """
+    Run the stream tests of the file test and worker runners for one file
+
+    :param plugin:
+    :param settings:
+    :param probe:
+    :param path:
+    :return:
+    """
+    probe_streams = probe.get_probe()['streams']
+    classified = plugin.ClassifiedStreams(plugin.LanguageRules.from_settings(settings), probe_streams, input_file=path)
+    classified.null_streams()
+    classified.streams_need_processing()
+
+    mapper = plugin.PluginStreamMapper()
+    plugin.map_kept_streams(mapper, classified)
+
+
+def measure(plugin, settings, probes, iterations, clear_caches):
+    durations = []
+    for _ in range(iterations):
+        for path, probe in probes.items():
+            if clear_caches:
+                for name in CACHED_FUNCTIONS:
+                    getattr(plugin, name).cache_clear()
+            start = time.perf_counter()
+            stream_tests(plugin, settings, probe, path)
+            durations.append(time.perf_counter() - start)
+    return {
+        'median_ms': statistics.median(durations) * 1000,
+        'max_ms':    max(durations) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the language matching of keep_streams_by_languages")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--json', dest='json_file', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    workspace = tempfile.mkdtemp(prefix='unmanic_language_normalise_')
+    os.environ['UNMANIC_BENCHMARK_PROFILE_ROOT'] = os.path.join(workspace, 'profiles')
+    os.environ['PATH'] = run_benchmarks.FAKE_BIN_DIRECTORY + os.pathsep + os.environ.get('PATH', '')
+    try:
+        paths = corpus.create_placeholders(os.path.join(workspace, 'corpus'))
+        run_benchmarks.create_import_path(workspace, [PLUGIN_ID])
+        plugin, error = run_benchmarks.import_plugin(PLUGIN_ID)
+        if plugin is None:
+            print("Unable to import {}: {}".format(PLUGIN_ID, error))
+            return 1
+        from unmanic.libs.unplugins import settings as settings_stub
+        settings_stub.configured_settings[PLUGIN_ID] = SETTINGS
+        settings = plugin.Settings()
+
+        probes = {}
+        for path in paths:
+            probe = plugin.Probe(plugin.logger, allowed_mimetypes=['video'])
+            if not probe.file(path):
+                continue
+            tracks = [s for s in probe.get_probe()['streams'] if s.get('codec_type') in ['audio', 'subtitle']]
+            if len(tracks) >= MIN_TRACKS:
+                probes[path] = probe
+        if not probes:
+            print("The corpus has no files with {} or more audio/subtitle tracks".format(MIN_TRACKS))
+            return 1
+
+        report = {'iterations': args.iterations, 'files': [os.path.basename(p) for p in probes], 'results': {}}
+        cached = {name: getattr(plugin, name) for name in CACHED_FUNCTIONS}
+        try:
+            for name, function in cached.items():
+                setattr(plugin, name, function.__wrapped__)
+            report['results']['uncached'] = measure(plugin, settings, probes, args.iterations, False)
+        finally:
+            for name, function in cached.items():
+                setattr(plugin, name, function)
+        report['results']['cold'] = measure(plugin, settings, probes, args.iterations, True)
+        report['results']['warm'] = measure(plugin, settings, probes, args.iterations, False)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print("files: {}".format(', '.join(report['files'])))
+    row = "{:<10} {:>10} {:>10}"
+    print(row.format('caches', 'median ms', 'max ms'))
+    for name, result in report['results'].items():
+        print(row.format(name, '{:.2f}'.format(result['median_ms']), '{:.2f}'.format(result['max_ms'])))
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.probe_budget
+
+    Measures the bytes read by ffprobe per file with and without the adaptive probe budgets of 'lib/ffmpeg/probe.py'.
+
+    Network mounts are simulated with a throttled HTTP server on the loopback interface. The server supports range
+    requests (so ffprobe can seek like it does on a file) and counts the bytes it sends for each probe.
+    Requires FFmpeg to generate the corpus (see 'corpus.py').
+
+    Usage:
+        python3 benchmarks/probe_budget.py [--rate-mbit 100] [--json out.json]
+
+"""
+import argparse
+import http.server
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+import corpus  # noqa: E402
+import run_benchmarks  # noqa: E402
+
+# Plugin whose copy of lib/ffmpeg is benchmarked. All copies are identical.
+PLUGIN_ID = 'convert_multichan_audio_to_stereo'
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ThrottledFileServer(http.server.ThreadingHTTPServer):
+    """Serves the files of a directory at a limited rate and counts the bytes sent"""
+
+    def __init__(self, directory, bytes_per_second):
+        self.directory = directory
+        self.bytes_per_second = bytes_per_second
+        self.bytes_sent = 0
+        self.requests = 0
+        self.counter_lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), ThrottledRequestHandler)
+
+    def reset_counters(self):
+        with self.counter_lock:
+            self.bytes_sent = 0
+            self.requests = 0
+
+
+class ThrottledRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def __send_headers(self):
+        path = os.path.join(self.server.directory, os.path.basename(self.path))
+        if not os.path.exists(path):
+            self.send_error(404)
+            return None, 0, 0
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[len('bytes='):].partition('-')
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{}'.format(size))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None, 0, 0
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        with self.server.counter_lock:
+            self.server.requests += 1
+        return path, start, end
+
+    def do_HEAD(self):
+        self.__send_headers()
+
+    def do_GET(self):
+        path, start, end = self.__send_headers()
+        if not path:
+            return
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    # ffprobe closes the connection once it has read enough
+                    break
+                remaining -= len(chunk)
+                with self.server.counter_lock:
+                    self.server.bytes_sent += len(chunk)
+                time.sleep(len(chunk) / self.server.bytes_per_second)
+
+
+def measure(probe, server, url, budgets):
+    server.reset_counters()
+    start = time.perf_counter()
+    try:
+        info = probe.ffprobe_file(url, budgets=budgets)
+        missing = probe.probe_missing_fields(info)
+    except probe.FFProbeError:
+        missing = ['probe failed']
+    return {
+        'seconds':    time.perf_counter() - start,
+        'bytes_read': server.bytes_sent,
+        'requests':   server.requests,
+        'missing':    missing,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bytes read by ffprobe per file")
+    parser.add_argument('--rate-mbit', type=float, default=100, help="Throughput of the simulated network mount")
+    parser.add_argument('--json', dest='json_file', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    workspace = tempfile.mkdtemp(prefix='unmanic_probe_budget_')
+    try:
+        paths = corpus.generate(os.path.join(workspace, 'corpus'))
+        run_benchmarks.create_import_path(workspace, [PLUGIN_ID])
+        probe = __import__('{}.lib.ffmpeg.probe'.format(PLUGIN_ID), fromlist=['probe'])
+
+        server = ThrottledFileServer(os.path.dirname(paths[0]), args.rate_mbit * 1000000 / 8)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        strategies = {
+            'ffprobe defaults': [None],
+            'adaptive budgets': list(probe.PROBE_BUDGETS),
+        }
+        report = {'rate_mbit': args.rate_mbit, 'files': {}}
+        for path in paths:
+            url = 'http://127.0.0.1:{}/{}'.format(server.server_address[1], os.path.basename(path))
+            report['files'][os.path.basename(path)] = {
+                name: measure(probe, server, url, budgets) for name, budgets in strategies.items()
+            }
+        server.shutdown()
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    row = "{:<32} {:<18} {:>12} {:>9} {:>9}  {}"
+    print(row.format('file', 'strategy', 'bytes read', 'requests', 'seconds', 'missing fields'))
+    for file_name, results in report['files'].items():
+        for name, result in results.items():
+            print(row.format(file_name, name, result['bytes_read'], result['requests'],
+                             '{:.2f}'.format(result['seconds']), ', '.join(result['missing']) or '-'))
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.run_benchmarks
+
+    End-to-end benchmark of every plugin's runner functions.
+
+    Each plugin in 'source/' is imported the same way Unmanic imports it (by plugin ID) against a stand-in
+    'unmanic' package from 'benchmarks/stubs'. Its 'on_library_management_file_test', 'on_worker_process' and
+    'on_postprocessor_task_results' runners are then called for every file in the corpus, and the following is
+    reported per hook:
+        - latency (median and max wall time of a call)
+        - subprocesses spawned per call (grouped by executable)
+        - allocations (peak traced memory and allocated blocks per call)
+
+    Modes:
+        fixtures    - (default) Probe the recorded fixtures with the fake ffprobe in 'fake_bin'. No FFmpeg required.
+        generate    - Generate the corpus with FFmpeg and benchmark against the real files.
+        record      - Generate the corpus, re-record the fixtures from it, then benchmark against the real files.
+
+    The report of the last run against the recorded fixtures is kept in 'results/fixtures.txt' (and '.json').
+
+    Usage:
+        python3 benchmarks/run_benchmarks.py [--mode fixtures] [--iterations 5] [--plugins id,id] [--json out.json]
+
+"""
+import argparse
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIRECTORY = os.path.join(os.path.dirname(BENCHMARKS_DIRECTORY), 'source')
+STUBS_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, 'stubs')
+FAKE_BIN_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, 'fake_bin')
+
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+import corpus  # noqa: E402
+
+HOOKS = [
+    'on_library_management_file_test',
+    'on_worker_process',
+    'on_postprocessor_task_results',
+]
+
+# Additional package names that plugins import their own libs by
+PLUGIN_ALIASES = {
+    'video-transcoder-plus': ['video_transcoder'],
+}
+
+
+class RunnerStore(object):
+    """Stand-in for the task data store passed to runners that accept a second argument"""
+
+    def __init__(self, source_path):
+        self.values = {
+            'emit_task_scheduled': {'source_size': os.path.getsize(source_path)},
+        }
+
+    def set_runner_value(self, key, value, runner=None):
+        self.values.setdefault(runner or 'default', {})[key] = value
+
+    def get_runner_value(self, key, default_value=None, runner=None):
+        return self.values.get(runner or 'default', {}).get(key, default_value)
+
+
+class SubprocessCounter(object):
+    """Counts every subprocess.Popen call made while installed, grouped by executable"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.__original_popen = subprocess.Popen
+
+    def __enter__(self):
+        counter = self
+        original_popen = self.__original_popen
+
+        class CountingPopen(original_popen):
+            def __init__(self, args, *popen_args, **popen_kwargs):
+                executable = args[0] if isinstance(args, (list, tuple)) else str(args).split(' ')[0]
+                counter.counts[os.path.basename(str(executable))] += 1
+                super().__init__(args, *popen_args, **popen_kwargs)
+
+        subprocess.Popen = CountingPopen
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.Popen = self.__original_popen
+        return False
+
+
+def list_plugins():
+    plugins = []
+    for plugin_id in sorted(os.listdir(SOURCE_DIRECTORY)):
+        if os.path.exists(os.path.join(SOURCE_DIRECTORY, plugin_id, 'plugin.py')):
+            plugins.append(plugin_id)
+    return plugins
+
+
+def create_import_path(workspace, plugin_ids):
+    """
+    Create a directory of symlinks so that each plugin can be imported by its plugin ID (and aliases)
+
+    :param workspace:
+    :param plugin_ids:
+    :return:
+    """
+    import_path = os.path.join(workspace, 'plugins')
+    os.makedirs(import_path, exist_ok=True)
+    for plugin_id in plugin_ids:
+        for name in [plugin_id] + PLUGIN_ALIASES.get(plugin_id, []):
+            link = os.path.join(import_path, name)
+            if not os.path.exists(link):
+                os.symlink(os.path.join(SOURCE_DIRECTORY, plugin_id), link)
+    sys.path.insert(0, import_path)
+    sys.path.insert(0, STUBS_DIRECTORY)
+
+
+def load_aliased_plugin(plugin_id, alias):
+    """
+    Load the plugin module of a plugin whose ID is not a valid Python package name (eg. 'video-transcoder-plus').
+
+    The module is loaded as '<alias>.plugin' with its imports of '<plugin_id>.' rewritten to '<alias>.'.
+
+    :param plugin_id:
+    :param alias:
+    :return:
+    """
+    module_name = '{}.plugin'.format(alias)
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    package = importlib.import_module(alias)
+    plugin_file = os.path.join(SOURCE_DIRECTORY, plugin_id, 'plugin.py')
+    with open(plugin_file) as f:
+        source = f.read()
+    source = source.replace('from {}.'.format(plugin_id), 'from {}.'.format(alias))
+    source = source.replace('import {}.'.format(plugin_id), 'import {}.'.format(alias))
+    spec = importlib.util.spec_from_loader(module_name, loader=None, origin=plugin_file)
+    module = importlib.util.module_from_spec(spec)
+    module.__file__ = plugin_file
+    sys.modules[module_name] = module
+    try:
+        exec(compile(source, plugin_file, 'exec'), module.__dict__)
+    except Exception:
+        del sys.modules[module_name]
+        raise
+    setattr(package, 'plugin', module)
+    return module
+
+
+def import_plugin(plugin_id):
+    """
+    Import a plugin module. Returns the module, or the reason it could not be imported.
+
+    :param plugin_id:
+    :return:
+    """
+    try:
+        if not plugin_id.isidentifier() and PLUGIN_ALIASES.get(plugin_id):
+            return load_aliased_plugin(plugin_id, PLUGIN_ALIASES[plugin_id][0]), None
+        return importlib.import_module('{}.plugin'.format(plugin_id)), None
+    except Exception as e:
+        return None, "{}: {}".format(type(e).__name__, e)
+
+
+def hook_data(hook, source_path, cache_directory):
+    """
+    Build the data object that Unmanic passes to a runner
+
+    :param hook:
+    :param source_path:
+    :param cache_directory:
+    :return:
+    """
+    file_out = os.path.join(cache_directory, os.path.basename(source_path))
+    if hook == 'on_library_management_file_test':
+        return {
+            'library_id':                1,
+            'path':                      source_path,
+            'issues':                    [],
+            'add_file_to_pending_tasks': False,
+            'priority_score':            0,
+            'shared_info':               {},
+        }
+    if hook == 'on_worker_process':
+        return {
+            'library_id':              1,
+            'task_id':                 1,
+            'worker_log':              [],
+            'exec_command':            [],
+            'command_progress_parser': None,
+            'file_in':                 source_path,
+            'file_out':                file_out,
+            'original_file_path':      source_path,
+            'repeat':                  False,
+        }
+    now = time.time()
+    return {
+        'library_id':                  1,
+        'task_id':                     1,
+        'task_type':                   'local',
+        'final_cache_path':            file_out,
+        'task_processing_success':     True,
+        'file_move_processes_success': True,
+        'destination_files':           [source_path],
+        'source_data':                 {'abspath': source_path, 'basename': os.path.basename(source_path)},
+        'start_time':                  now - 60,
+        'finish_time':                 now,
+    }
+
+
+def run_hook(function, hook, source_path, cache_directory):
+    """
+    Call a runner once and measure it
+
+    :param function:
+    :param hook:
+    :param source_path:
+    :param cache_directory:
+    :return:
+    """
+    data = hook_data(hook, source_path, cache_directory)
+    args = [data]
+    if len(inspect.signature(function).parameters) > 1:
+        args.append(RunnerStore(source_path))
+
+    tracemalloc.reset_peak()
+    start_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    start_memory, _ = tracemalloc.get_traced_memory()
+    error = None
+    with SubprocessCounter() as counter:
+        start = time.perf_counter()
+        try:
+            function(*args)
+        except Exception as e:
+            error = "{}: {}".format(type(e).__name__, e)
+        elapsed = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    end_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+
+    return {
+        'seconds':     elapsed,
+        'subprocess':  dict(counter.counts),
+        'peak_bytes':  max(0, peak_memory - start_memory),
+        'blocks':      end_blocks - start_blocks,
+        'error':       error,
+    }
+
+
+def benchmark_plugin(module, paths, cache_directory, iterations):
+    results = {}
+    for hook in HOOKS:
+        function = getattr(module, hook, None)
+        if function is None:
+            continue
+        samples = []
+        for path in paths:
+            for _ in range(iterations):
+                samples.append(run_hook(function, hook, path, cache_directory))
+        subprocess_totals = Counter()
+        for sample in samples:
+            subprocess_totals.update(sample['subprocess'])
+        errors = sorted(set(sample['error'] for sample in samples if sample['error']))
+        results[hook] = {
+            'calls':               len(samples),
+            'median_ms':           statistics.median(s['seconds'] for s in samples) * 1000,
+            'max_ms':              max(s['seconds'] for s in samples) * 1000,
+            'subprocess_per_call': {k: v / len(samples) for k, v in sorted(subprocess_totals.items())},
+            'peak_kib':            max(s['peak_bytes'] for s in samples) / 1024,
+            'blocks_per_call':     statistics.median(s['blocks'] for s in samples),
+            'errors':              errors,
+        }
+    return results
+
+
+def print_report(report):
+    row = "{:<36} {:<32} {:>10} {:>10} {:>10} {:>8}  {}"
+    print(row.format('plugin', 'hook', 'median ms', 'max ms', 'peak KiB', 'blocks', 'subprocesses/call'))
+    for plugin_id, result in report['plugins'].items():
+        if result.get('skipped'):
+            print("{:<36} skipped - {}".format(plugin_id, result['skipped']))
+            continue
+        for hook, stats in result['hooks'].items():
+            subprocesses = ', '.join('{} {:.1f}'.format(k, v) for k, v in stats['subprocess_per_call'].items())
+            print(row.format(plugin_id, hook, '{:.2f}'.format(stats['median_ms']), '{:.2f}'.format(stats['max_ms']),
+                             '{:.1f}'.format(stats['peak_kib']), stats['blocks_per_call'], subprocesses or '-'))
+            for error in stats['errors']:
+                print("{:<36} {:<32} error - {}".format('', '', error))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the runner functions of every plugin")
+    parser.add_argument('--mode', choices=['fixtures', 'generate', 'record'], default='fixtures')
+    parser.add_argument('--iterations', type=int, default=5, help="Calls per hook for each corpus file")
+    parser.add_argument('--plugins', default='', help="Comma separated list of plugin IDs (default: all)")
+    parser.add_argument('--json', dest='json_file', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    plugin_ids = list_plugins()
+    if args.plugins:
+        plugin_ids = [p for p in plugin_ids if p in args.plugins.split(',')]
+
+    workspace = tempfile.mkdtemp(prefix='unmanic_benchmark_')
+    os.environ['UNMANIC_BENCHMARK_PROFILE_ROOT'] = os.path.join(workspace, 'profiles')
+    corpus_directory = os.path.join(workspace, 'corpus')
+    cache_directory = os.path.join(workspace, 'cache')
+    os.makedirs(cache_directory)
+    try:
+        if args.mode == 'fixtures':
+            os.environ['PATH'] = FAKE_BIN_DIRECTORY + os.pathsep + os.environ.get('PATH', '')
+            paths = corpus.create_placeholders(corpus_directory)
+        else:
+            paths = corpus.generate(corpus_directory)
+            if args.mode == 'record':
+                corpus.record_fixtures(paths)
+
+        create_import_path(workspace, plugin_ids)
+        tracemalloc.start()
+        report = {'mode': args.mode, 'iterations': args.iterations, 'corpus': [os.path.basename(p) for p in paths],
+                  'plugins': {}}
+        for plugin_id in plugin_ids:
+            module, reason = import_plugin(plugin_id)
+            if module is None:
+                report['plugins'][plugin_id] = {'skipped': reason}
+                continue
+            report['plugins'][plugin_id] = {
+                'hooks': benchmark_plugin(module, paths, cache_directory, args.iterations),
+            }
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print_report(report)
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
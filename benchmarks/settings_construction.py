@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks.settings_construction
+
+    Measures the per-file cost of constructing the Settings object of video-transcoder-plus.
+
+    Every runner constructs Settings once per file. The form settings (which probe the available encoders and
+    devices) are only built when first requested, so the following are measured:
+        runner      - Settings() as the runners construct it
+        form        - Settings() followed by building the form settings (the settings page, and what every runner
+                      paid before the form was built lazily)
+
+    Requires the plugin's own requirements. No FFmpeg required, the fake executables in 'fake_bin' are used.
+
+    Usage:
+        python3 benchmarks/settings_construction.py [--iterations 200] [--json out.json]
+
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+import run_benchmarks  # noqa: E402
+
+PLUGIN_ID = 'video-transcoder-plus'
+
+
+def construct_for_runner(plugin):
+    plugin.Settings(library_id=1)
+
+
+def construct_for_form(plugin):
+    settings = plugin.Settings(library_id=1)
+    return settings.form_settings
+
+
+def measure(plugin, function, iterations):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function(plugin)
+        durations.append(time.perf_counter() - start)
+    return {
+        'median_us': statistics.median(durations) * 1000000,
+        'max_us':    max(durations) * 1000000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Settings construction of video-transcoder-plus")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--json', dest='json_file', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    workspace = tempfile.mkdtemp(prefix='unmanic_settings_construction_')
+    os.environ['UNMANIC_BENCHMARK_PROFILE_ROOT'] = os.path.join(workspace, 'profiles')
+    os.environ['PATH'] = run_benchmarks.FAKE_BIN_DIRECTORY + os.pathsep + os.environ.get('PATH', '')
+    try:
+        run_benchmarks.create_import_path(workspace, [PLUGIN_ID])
+        plugin, error = run_benchmarks.import_plugin(PLUGIN_ID)
+        if plugin is None:
+            print("Unable to import {}: {}".format(PLUGIN_ID, error))
+            return 1
+
+        report = {'iterations': args.iterations, 'results': {}}
+        # Warm up the module level caches so that only the per-file cost is measured
+        construct_for_form(plugin)
+        report['results']['runner'] = measure(plugin, construct_for_runner, args.iterations)
+        report['results']['form'] = measure(plugin, construct_for_form, args.iterations)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    row = "{:<10} {:>12} {:>12}"
+    print(row.format('settings', 'median us', 'max us'))
+    for name, result in report['results'].items():
+        print(row.format(name, '{:.1f}'.format(result['median_us']), '{:.1f}'.format(result['max_us'])))
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
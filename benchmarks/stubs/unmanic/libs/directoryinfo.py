@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    unmanic.libs.directoryinfo
+
+    Stand-in for Unmanic's UnmanicDirectoryInfo used by the benchmark harness.
+    Values are stored in a '.unmanic' INI file in the directory, like Unmanic does.
+
+"""
+import configparser
+import os
+
+
+class UnmanicDirectoryInfo(object):
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, '.unmanic')
+        self.config = configparser.ConfigParser(allow_no_value=True)
+        if os.path.exists(self.path):
+            self.config.read(self.path)
+
+    def get(self, section, option):
+        return self.config.get(section, option.lower())
+
+    def set(self, section, option, value):
+        if not self.config.has_section(section):
+            self.config.add_section(section)
+        self.config.set(section, option.lower(), str(value))
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            self.config.write(f)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    unmanic.libs.logs
+
+    Stand-in for Unmanic's UnmanicLogging used by the benchmark harness.
+
+"""
+import logging
+
+
+class UnmanicLogging(object):
+
+    @staticmethod
+    def get_logger(name=None):
+        return logging.getLogger(name)
+
+    @staticmethod
+    def data(data_type, *args, **kwargs):
+        pass
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    unmanic.libs.unplugins.settings
+
+    Stand-in for Unmanic's PluginSettings used by the benchmark harness.
+    Settings are held in memory. The harness sets the configured values of each plugin in 'configured_settings'.
+
+"""
+import os
+
+# Configured settings by plugin ID. These override the defaults declared by the plugin.
+configured_settings = {}
+
+# Directory that the plugin profile directories are created in
+profile_root = os.environ.get('UNMANIC_BENCHMARK_PROFILE_ROOT', os.path.join('/tmp', 'unmanic_benchmark_profiles'))
+
+
+class PluginSettings(object):
+    settings = {}
+    form_settings = {}
+
+    def __init__(self, *args, **kwargs):
+        self.library_id = kwargs.get('library_id')
+        self.__set_values = {}
+
+    def __plugin_id(self):
+        return type(self).__module__.split('.')[0]
+
+    def get_setting(self, key=None):
+        values = {
+            **self.settings,
+            **configured_settings.get(self.__plugin_id(), {}),
+            **self.__set_values,
+        }
+        if key is None:
+            return values
+        return values.get(key)
+
+    def set_setting(self, key, value):
+        self.__set_values[key] = value
+        return True
+
+    def get_profile_directory(self):
+        profile_directory = os.path.join(profile_root, self.__plugin_id())
+        os.makedirs(profile_directory, exist_ok=True)
+        return profile_directory
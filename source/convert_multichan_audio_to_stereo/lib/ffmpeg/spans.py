@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.spans.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (5:05 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+"""
+    Notes:
+        Timing spans for the hot paths of a plugin runner (probing, crop detection, settings, etc.).
+
+        A span is used as a context manager or a decorator:
+            with spans.span('detect_black_bars'):
+                ...
+
+            @spans.span('Probe.file')
+            def file(self, file_path):
+                ...
+
+        Span durations are added to a histogram for the runner (hook) they ran in. The runner itself is timed by
+        'hook_span', which 'runner.track_runner' wraps around every runner call.
+
+        Profiling of the slowest files is enabled with the environment variable 'UNMANIC_PLUGIN_PROFILE_SLOWEST'
+        set to the number of files to keep a profile of (per runner). Every runner call is then run under cProfile
+        (or pyinstrument if 'UNMANIC_PLUGIN_PROFILER=pyinstrument' and it is installed), and the profiles of the N
+        slowest calls are kept in 'UNMANIC_PLUGIN_PROFILE_DIR' (default: '<tmp>/unmanic_plugin_profiles').
+
+"""
+import bisect
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_SLOWEST_ENV = 'UNMANIC_PLUGIN_PROFILE_SLOWEST'
+PROFILER_ENV = 'UNMANIC_PLUGIN_PROFILER'
+PROFILE_DIR_ENV = 'UNMANIC_PLUGIN_PROFILE_DIR'
+
+# Upper bounds (in milliseconds) of the histogram buckets. The last bucket holds everything slower.
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_lock = threading.Lock()
+_context = threading.local()
+_histograms = {}
+_slowest = {}
+
+
+def _current_hook():
+    return getattr(_context, 'hook', None) or 'untracked'
+
+
+def _new_histogram():
+    return {
+        'count':    0,
+        'total_ns': 0,
+        'max_ns':   0,
+        'buckets':  [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+    }
+
+
+def record(name, duration_ns, hook=None):
+    """
+    Add a span duration to the histogram of the given (or current) runner
+
+    :param name:
+    :param duration_ns:
+    :param hook:
+    :return:
+    """
+    hook = hook or _current_hook()
+    bucket = bisect.bisect_left(HISTOGRAM_BUCKETS_MS, duration_ns / 1000000)
+    with _lock:
+        histogram = _histograms.setdefault(hook, {}).setdefault(name, _new_histogram())
+        histogram['count'] += 1
+        histogram['total_ns'] += duration_ns
+        histogram['max_ns'] = max(histogram['max_ns'], duration_ns)
+        histogram['buckets'][bucket] += 1
+    calls = getattr(_context, 'calls', None)
+    if calls is not None:
+        calls[name] = calls.get(name, 0) + duration_ns
+
+
+class span(object):
+    """
+    Times a block of code (context manager) or every call of a function (decorator)
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        starts = getattr(_context, 'starts', None)
+        if starts is None:
+            starts = _context.starts = []
+        starts.append(time.perf_counter_ns())
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter_ns() - _context.starts.pop())
+        return False
+
+    def __call__(self, function):
+        name = self.name
+
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        wrapper.__name__ = function.__name__
+        wrapper.__qualname__ = function.__qualname__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+        return wrapper
+
+
+class _Profiler(object):
+    """Profiles a runner call with pyinstrument (if requested and installed) or cProfile"""
+
+    def __init__(self):
+        self.profiler = None
+        self.extension = 'prof'
+        if os.environ.get(PROFILER_ENV) == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+                self.profiler = Profiler()
+                self.extension = 'html'
+            except ImportError:
+                pass
+        if self.profiler is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        try:
+            if self.extension == 'html':
+                self.profiler.start()
+            else:
+                self.profiler.enable()
+            return True
+        except (ValueError, RuntimeError):
+            # Another profiler is already active (eg. a runner of another worker thread)
+            return False
+
+    def stop(self):
+        if self.extension == 'html':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def save(self, path):
+        if self.extension == 'html':
+            with open(path, 'w') as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.dump_stats(path)
+
+
+def _profile_slowest():
+    try:
+        return max(0, int(os.environ.get(PROFILE_SLOWEST_ENV, 0)))
+    except ValueError:
+        return 0
+
+
+def _keep_profile(profiler, hook, path, duration_ns, keep):
+    """
+    Keep the profile of a runner call if it is one of the N slowest calls of that runner
+
+    :param profiler:
+    :param hook:
+    :param path:
+    :param duration_ns:
+    :param keep:
+    :return:
+    """
+    profile_directory = os.environ.get(PROFILE_DIR_ENV) or os.path.join(tempfile.gettempdir(),
+                                                                         'unmanic_plugin_profiles')
+    with _lock:
+        slowest = _slowest.setdefault(hook, [])
+        if len(slowest) >= keep and duration_ns <= slowest[0][0]:
+            return None
+        file_name = "{}-{}-{}.{}".format(hook, duration_ns // 1000000,
+                                         re.sub(r'[^\w.-]+', '_', os.path.basename(path or 'unknown')),
+                                         profiler.extension)
+        profile_file = os.path.join(profile_directory, file_name)
+        bisect.insort(slowest, (duration_ns, profile_file))
+        evicted = slowest[:-keep] if len(slowest) > keep else []
+        del slowest[:len(evicted)]
+    os.makedirs(profile_directory, exist_ok=True)
+    profiler.save(profile_file)
+    for _, evicted_file in evicted:
+        try:
+            os.remove(evicted_file)
+        except OSError:
+            pass
+    return profile_file
+
+
+@contextmanager
+def hook_span(hook, path=None):
+    """
+    Time a runner call. Spans entered during the call are recorded against this runner.
+    Yields a dict of the total time (ns) of each span name during the call.
+
+    :param hook:
+    :param path:
+    :return:
+    """
+    previous = (getattr(_context, 'hook', None), getattr(_context, 'calls', None))
+    _context.hook = hook
+    _context.calls = calls = {}
+    keep = _profile_slowest()
+    profiler = _Profiler() if keep else None
+    profiling = profiler.start() if profiler else False
+    start = time.perf_counter_ns()
+    try:
+        yield calls
+    finally:
+        duration_ns = time.perf_counter_ns() - start
+        if profiling:
+            profiler.stop()
+        record(hook, duration_ns, hook=hook)
+        _context.hook, _context.calls = previous
+        if profiling:
+            calls['profile'] = _keep_profile(profiler, hook, path, duration_ns, keep)
+
+
+def format_spans(calls):
+    """
+    Returns a one line summary of the spans of a runner call
+
+    :param calls:
+    :return:
+    """
+    durations = [(name, duration_ns) for name, duration_ns in calls.items() if name != 'profile']
+    return ', '.join(
+        "{} {:.1f}ms".format(name, duration_ns / 1000000)
+        for name, duration_ns in sorted(durations, key=lambda i: -i[1])
+    )
+
+
+def get_histograms():
+    """
+    Returns a copy of the span histograms of each runner.
+    Bucket 'n' counts spans that took up to HISTOGRAM_BUCKETS_MS[n] milliseconds (the last is everything slower).
+
+    :return:
+    """
+    with _lock:
+        return {
+            hook: {name: dict(histogram, buckets=list(histogram['buckets'])) for name, histogram in names.items()}
+            for hook, names in _histograms.items()
+        }
+
+
+def reset():
+    """
+    Clear all histograms
+
+    :return:
+    """
+    with _lock:
+        _histograms.clear()
+        _slowest.clear()
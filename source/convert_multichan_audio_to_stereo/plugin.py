@@ -24,9 +24,10 @@
 """
 
 import logging
+import os
 
 from unmanic.libs.unplugins.settings import PluginSettings
-from convert_multichan_audio_to_stereo.lib.ffmpeg import Probe, Parser
+from convert_multichan_audio_to_stereo.lib.ffmpeg import Probe, Parser, PreFilter, runner, spans
 
 # Configure plugin logger
 logger = logging.getLogger("Unmanic.Plugin.convert_multichan_audio_to_stereo")
@@ -55,6 +56,7 @@ class Settings(PluginSettings):
         'TP':                        '-1.5',
     }
 
+    @spans.span('Settings')
     def __init__(self, *args, **kwargs):
         super(Settings, self).__init__(*args, **kwargs)
         self.form_settings = {
@@ -140,19 +142,7 @@ def streams_to_stereo_encode(probe_streams):
     return streams
 
 
-def on_library_management_file_test(data):
-    abspath = data.get('path')
-    probe_data = Probe(logger, allowed_mimetypes=['audio', 'video'])
-
-    if probe_data.file(abspath):
-        probe_streams = probe_data.get_probe()["streams"]
-    else:
-        logger.debug("Probe data failed - Blocking everything.")
-        data['add_file_to_pending_tasks'] = False
-        return data
-
-    settings = Settings(library_id=data.get('library_id')) if data.get('library_id') else Settings()
-
+def file_requires_processing(settings, abspath, probe_streams):
     stereo_exists = has_stereo_track(probe_streams)
     encode_all_2_aac = settings.get_setting('encode_all_2_aac')
 
@@ -165,7 +155,38 @@ def on_library_management_file_test(data):
         for s in probe_streams
     )
 
-    if (not stereo_exists and mc_exists) or (encode_all_2_aac and non_aac_exists):
+    return (not stereo_exists and mc_exists) or (encode_all_2_aac and non_aac_exists)
+
+
+@runner.track_runner(logger)
+def on_library_management_file_test(data):
+    abspath = data.get('path')
+    settings = Settings(library_id=data.get('library_id')) if data.get('library_id') else Settings()
+
+    # Reject files by their name and size, or reuse the last verdict if the file has not changed, before probing it
+    file_prefilter = PreFilter('convert_multichan_audio_to_stereo', ['audio', 'video'], settings=settings,
+                               library_id=data.get('library_id'))
+    rejected, cached_verdict = file_prefilter.check(abspath)
+    if rejected:
+        logger.debug("File '%s' rejected by the pre-filter - Blocking everything.", abspath)
+        data['add_file_to_pending_tasks'] = False
+        return data
+
+    if cached_verdict is not None:
+        requires_processing = cached_verdict.needs_processing
+    else:
+        probe_data = Probe(logger, allowed_mimetypes=['audio', 'video'])
+        if probe_data.file(abspath):
+            probe_streams = probe_data.get_probe()["streams"]
+        else:
+            logger.debug("Probe data failed - Blocking everything.")
+            data['add_file_to_pending_tasks'] = False
+            return data
+
+        requires_processing = file_requires_processing(settings, abspath, probe_streams)
+        file_prefilter.store(abspath, requires_processing)
+
+    if requires_processing:
         data['add_file_to_pending_tasks'] = True
     else:
         logger.debug(f"do not add file '{abspath}' to task list - no relevant audio streams")
@@ -180,6 +201,7 @@ def audio_filtergraph(settings):
     return f'loudnorm=I={i}:LRA={lra}:TP={tp}'
 
 
+@runner.track_runner(logger)
 def on_worker_process(data):
     data['exec_command'] = []
     data['repeat'] = False
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.database.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (9:12 AM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def get_database_file(settings, name):
+    """
+    Returns the absolute path to a database file stored in the plugin's profile directory
+
+    :param settings:
+    :param name:
+    :return:
+    """
+    return os.path.abspath(os.path.join(settings.get_profile_directory(), name))
+
+
+def get_connection(db_file, schema=None):
+    """
+    Returns a SQLite connection for the given database file.
+    Unmanic runs library scans and workers in separate threads, so a connection is kept per thread.
+    The schema statements are executed the first time a thread opens the database.
+
+    :param db_file:
+    :param schema:
+    :return:
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(db_file)
+    if connection is None:
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        connection = sqlite3.connect(db_file, timeout=15.0)
+        connection.execute('PRAGMA journal_mode=wal')
+        connection.execute('PRAGMA synchronous=normal')
+        with connection:
+            for statement in (schema or []):
+                connection.execute(statement)
+        connections[db_file] = connection
+    return connection
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.decision_cache.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (9:20 AM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+"""
+    Notes:
+        Persistent store of library file test verdicts, kept in 'decision_cache.db' in the plugin's profile directory.
+        A verdict is only returned while the file (size and mtime), the plugin settings and the plugin version are all
+        unchanged. The plugin ID and version are read from the 'info.json' beside the module that declares the
+        plugin's Settings class.
+
+        Hits, misses, stores and evictions are counted per plugin (see 'get_stats()').
+
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from . import database
+
+logger = logging.getLogger("Unmanic.Plugin.ffmpeg_helpers")
+
+# Entries for files that no longer exist are evicted in batches of EVICTION_BATCH_SIZE paths of a library, at most
+# once every EVICTION_INTERVAL seconds. Each batch continues from where the last batch of that library stopped.
+EVICTION_INTERVAL = 60
+EVICTION_BATCH_SIZE = 200
+
+schema = [
+    """
+    CREATE TABLE IF NOT EXISTS file_decisions (
+        library_id       TEXT    NOT NULL,
+        path             TEXT    NOT NULL,
+        file_size        INTEGER NOT NULL,
+        file_mtime       INTEGER NOT NULL,
+        settings_hash    TEXT    NOT NULL,
+        plugin_version   TEXT    NOT NULL,
+        needs_processing INTEGER NOT NULL,
+        forced_encode    INTEGER NOT NULL,
+        checked_at       REAL    NOT NULL,
+        PRIMARY KEY (library_id, path)
+    )
+    """,
+]
+
+Verdict = namedtuple('Verdict', ['needs_processing', 'forced_encode'])
+
+_stats_lock = threading.Lock()
+_stats = {}
+# Time of the last eviction batch and the last path it checked, by (database file, library ID)
+_eviction_state = {}
+_plugin_info = {}
+
+
+def _count(plugin_id, key, value=1):
+    with _stats_lock:
+        counters = _stats.setdefault(plugin_id, {
+            "hits":      0,
+            "misses":    0,
+            "stores":    0,
+            "evictions": 0,
+        })
+        counters[key] += value
+
+
+def get_stats(plugin_id=None):
+    """
+    Returns a copy of the decision cache counters of a plugin (or of all plugins) in this process
+
+    :param plugin_id:
+    :return:
+    """
+    with _stats_lock:
+        if plugin_id is not None:
+            return dict(_stats.get(plugin_id, {}))
+        return {key: dict(value) for key, value in _stats.items()}
+
+
+def plugin_info(settings):
+    """
+    Returns the (plugin ID, version) of the plugin that the settings object belongs to, as declared in its info.json
+
+    :param settings:
+    :return:
+    """
+    try:
+        plugin_directory = os.path.dirname(os.path.abspath(inspect.getfile(type(settings))))
+    except TypeError:
+        plugin_directory = ''
+    info = _plugin_info.get(plugin_directory)
+    if info is None:
+        info = (os.path.basename(plugin_directory), 'unknown')
+        try:
+            with open(os.path.join(plugin_directory, 'info.json')) as f:
+                plugin_json = json.load(f)
+            info = (str(plugin_json.get('id', info[0])), str(plugin_json.get('version', 'unknown')))
+        except (OSError, ValueError):
+            pass
+        _plugin_info[plugin_directory] = info
+    return info
+
+
+def settings_fingerprint(settings):
+    """
+    Returns a hash of all configured plugin settings
+
+    :param settings:
+    :return:
+    """
+    configured = settings.get_setting()
+    serialised = json.dumps(configured, sort_keys=True, default=str)
+    return hashlib.sha1(serialised.encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    Returns a (size, mtime) tuple for the given file, or None if it does not exist
+
+    :param path:
+    :return:
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class DecisionCache(object):
+    """
+    DecisionCache
+
+    Usage in a file test runner:
+        cache = DecisionCache(settings, library_id=data.get('library_id'))
+        verdict = cache.get(abspath)
+        if verdict is None:
+            needs_processing = ...  # Probe and test the file
+            cache.set(abspath, needs_processing)
+    """
+
+    def __init__(self, settings, library_id=None):
+        self.db_file = database.get_database_file(settings, 'decision_cache.db')
+        self.library_id = str(library_id)
+        self.settings_hash = settings_fingerprint(settings)
+        self.plugin_id, self.plugin_version = plugin_info(settings)
+
+    def __connection(self):
+        return database.get_connection(self.db_file, schema=schema)
+
+    def get(self, path, fingerprint=None):
+        """
+        Returns the cached verdict for a file as a Verdict (needs_processing, forced_encode) tuple.
+        Returns None if there is no verdict for the current state of the file and settings.
+
+        :param path:
+        :param fingerprint: The (size, mtime) of the file if it has already been read
+        :return:
+        """
+        self.evict_missing()
+        if fingerprint is None:
+            fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            self.remove(path)
+            _count(self.plugin_id, 'misses')
+            return None
+        row = self.__connection().execute(
+            "SELECT file_size, file_mtime, settings_hash, plugin_version, needs_processing, forced_encode "
+            "FROM file_decisions WHERE library_id = ? AND path = ?",
+            (self.library_id, path)
+        ).fetchone()
+        if row and tuple(row[:4]) == (fingerprint[0], fingerprint[1], self.settings_hash, self.plugin_version):
+            _count(self.plugin_id, 'hits')
+            return Verdict(bool(row[4]), bool(row[5]))
+        _count(self.plugin_id, 'misses')
+        return None
+
+    def set(self, path, needs_processing, forced_encode=False, fingerprint=None):
+        """
+        Store the verdict for the current state of a file
+
+        :param path:
+        :param needs_processing:
+        :param forced_encode:
+        :param fingerprint: The (size, mtime) of the file when it was tested
+        :return:
+        """
+        if fingerprint is None:
+            fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            return
+        connection = self.__connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO file_decisions "
+                "(library_id, path, file_size, file_mtime, settings_hash, plugin_version, needs_processing, "
+                "forced_encode, checked_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.library_id, path, fingerprint[0], fingerprint[1], self.settings_hash, self.plugin_version,
+                 int(bool(needs_processing)), int(bool(forced_encode)), time.time())
+            )
+        _count(self.plugin_id, 'stores')
+
+    def remove(self, path):
+        """
+        Remove any verdicts stored for the given file
+
+        :param path:
+        :return:
+        """
+        connection = self.__connection()
+        with connection:
+            cursor = connection.execute("DELETE FROM file_decisions WHERE path = ?", (path,))
+        if cursor.rowcount:
+            _count(self.plugin_id, 'evictions', cursor.rowcount)
+
+    def evict_missing(self, force=False):
+        """
+        Remove entries for files that no longer exist, checking at most EVICTION_BATCH_SIZE paths of this library.
+        This only runs once every EVICTION_INTERVAL seconds unless forced.
+        Nothing is evicted while the library root (the common directory of its cached paths) does not exist, so
+        that an unmounted library does not clear its verdicts.
+
+        :param force:
+        :return:
+        """
+        state_key = (self.db_file, self.library_id)
+        now = time.time()
+        with _stats_lock:
+            last_eviction, last_path = _eviction_state.get(state_key, (0, ''))
+            if not force and (now - last_eviction) < EVICTION_INTERVAL:
+                return
+            _eviction_state[state_key] = (now, last_path)
+        connection = self.__connection()
+        first_path, final_path = connection.execute(
+            "SELECT MIN(path), MAX(path) FROM file_decisions WHERE library_id = ?", (self.library_id,)
+        ).fetchone()
+        if first_path is None:
+            return
+        library_root = os.path.commonpath([first_path, final_path])
+        if first_path == final_path:
+            library_root = os.path.dirname(first_path)
+        if not os.path.isdir(library_root):
+            logger.debug("Skipping decision cache eviction. Library root '%s' does not exist", library_root)
+            return
+        paths = [row[0] for row in connection.execute(
+            "SELECT path FROM file_decisions WHERE library_id = ? AND path > ? ORDER BY path LIMIT ?",
+            (self.library_id, last_path, EVICTION_BATCH_SIZE)
+        )]
+        # Start from the first path again once the end is reached
+        next_path = paths[-1] if len(paths) == EVICTION_BATCH_SIZE else ''
+        with _stats_lock:
+            _eviction_state[state_key] = (now, next_path)
+        missing = [(self.library_id, path) for path in paths if not os.path.exists(path)]
+        if missing:
+            with connection:
+                connection.executemany("DELETE FROM file_decisions WHERE library_id = ? AND path = ?", missing)
+            _count(self.plugin_id, 'evictions', len(missing))
+        logger.debug("Decision cache stats: %s", get_stats(self.plugin_id))
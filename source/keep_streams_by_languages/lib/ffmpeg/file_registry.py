@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.file_registry.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (10:04 AM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import configparser
+import hashlib
+import json
+import os
+import threading
+import time
+from logging import Logger
+
+from . import database
+
+# How long the entries of a directory are held in memory before they are read from the database again
+DIRECTORY_CACHE_TTL = 300
+# Number of bytes read from the start and end of a file to build its content fingerprint
+FINGERPRINT_CHUNK_SIZE = 65536
+
+schema = [
+    """
+    CREATE TABLE IF NOT EXISTS marked_files (
+        plugin_id           TEXT    NOT NULL,
+        path                TEXT    NOT NULL,
+        directory           TEXT    NOT NULL,
+        file_size           INTEGER NOT NULL,
+        content_fingerprint TEXT    NOT NULL,
+        value               TEXT    NOT NULL,
+        marked_at           REAL    NOT NULL,
+        PRIMARY KEY (plugin_id, path)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS marked_files_directory ON marked_files (plugin_id, directory)",
+    "CREATE INDEX IF NOT EXISTS marked_files_fingerprint ON marked_files (plugin_id, file_size, content_fingerprint)",
+    """
+    CREATE TABLE IF NOT EXISTS imported_directories (
+        plugin_id   TEXT NOT NULL,
+        directory   TEXT NOT NULL,
+        imported_at REAL NOT NULL,
+        PRIMARY KEY (plugin_id, directory)
+    )
+    """,
+]
+
+_directory_cache_lock = threading.Lock()
+_directory_cache = {}
+
+
+def content_fingerprint(path):
+    """
+    Returns a fingerprint of a file's content that does not depend on its name.
+    Only the file size and the first and last FINGERPRINT_CHUNK_SIZE bytes are read.
+
+    :param path:
+    :return:
+    """
+    file_size = os.path.getsize(path)
+    digest = hashlib.sha1(str(file_size).encode('utf-8'))
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_CHUNK_SIZE))
+        if file_size > FINGERPRINT_CHUNK_SIZE:
+            f.seek(max(FINGERPRINT_CHUNK_SIZE, file_size - FINGERPRINT_CHUNK_SIZE))
+            digest.update(f.read(FINGERPRINT_CHUNK_SIZE))
+    return digest.hexdigest()
+
+
+def read_directory_info_section(directory, section):
+    """
+    Read all entries in one section of a directory's '.unmanic' file.
+    Handles both the JSON format and the legacy INI format of the file.
+
+    :param directory:
+    :param section:
+    :return:
+    """
+    info_file = os.path.join(directory, '.unmanic')
+    if not os.path.exists(info_file):
+        return {}
+    with open(info_file, 'r', encoding='utf-8', errors='replace') as f:
+        contents = f.read()
+    try:
+        entries = json.loads(contents).get(section, {})
+        return {str(k): str(v) for k, v in entries.items()} if isinstance(entries, dict) else {}
+    except ValueError:
+        pass
+    config = configparser.ConfigParser(allow_no_value=True, interpolation=None)
+    config.optionxform = str
+    try:
+        config.read_string(contents)
+    except configparser.Error:
+        return {}
+    if not config.has_section(section):
+        return {}
+    return {k: (v or '') for k, v in config.items(section)}
+
+
+class FileRegistry(object):
+    """
+    FileRegistry
+
+    Indexed store of files that a plugin has marked (eg. as force transcoded).
+    Entries are looked up in batches per directory and matched on the file path,
+    falling back to a content fingerprint so that marks survive a file being renamed.
+    """
+
+    def __init__(self, settings, plugin_id, logger: Logger):
+        self.db_file = database.get_database_file(settings, 'file_registry.db')
+        self.plugin_id = plugin_id
+        self.logger = logger
+
+    def __connection(self):
+        return database.get_connection(self.db_file, schema=schema)
+
+    def __import_directory_info(self, directory):
+        """
+        One-time import of any entries for this plugin from the directory's '.unmanic' file
+
+        :param directory:
+        :return:
+        """
+        connection = self.__connection()
+        imported = connection.execute(
+            "SELECT 1 FROM imported_directories WHERE plugin_id = ? AND directory = ?",
+            (self.plugin_id, directory)
+        ).fetchone()
+        if imported:
+            return
+        try:
+            entries = read_directory_info_section(directory, self.plugin_id)
+            filenames = os.listdir(directory) if entries else []
+        except OSError as e:
+            self.logger.debug("Unable to read directory info for '%s' - %s", directory, e)
+            return
+        # UnmanicDirectoryInfo writes the file names in lower case. Match them to the real file names.
+        real_filenames = {}
+        for filename in filenames:
+            real_filenames.setdefault(filename.lower(), []).append(filename)
+        rows = []
+        for basename, value in entries.items():
+            if not value:
+                continue
+            for filename in real_filenames.get(basename.lower(), []):
+                path = os.path.join(directory, filename)
+                try:
+                    rows.append((self.plugin_id, path, directory, os.path.getsize(path), content_fingerprint(path),
+                                 value, time.time()))
+                except OSError:
+                    continue
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO marked_files "
+                "(plugin_id, path, directory, file_size, content_fingerprint, value, marked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO imported_directories (plugin_id, directory, imported_at) VALUES (?, ?, ?)",
+                (self.plugin_id, directory, time.time())
+            )
+        if rows:
+            self.logger.debug("Imported %s entries from the directory info file in '%s'", len(rows), directory)
+
+    def get_directory(self, directory):
+        """
+        Returns a dictionary of basename -> value for all marked files in a directory
+
+        :param directory:
+        :return:
+        """
+        directory = os.path.abspath(directory)
+        cache_key = (self.db_file, self.plugin_id, directory)
+        with _directory_cache_lock:
+            cached = _directory_cache.get(cache_key)
+        if cached and (time.time() - cached[0]) < DIRECTORY_CACHE_TTL:
+            return cached[1]
+        self.__import_directory_info(directory)
+        entries = {
+            os.path.basename(path): value for path, value in self.__connection().execute(
+                "SELECT path, value FROM marked_files WHERE plugin_id = ? AND directory = ?",
+                (self.plugin_id, directory)
+            )
+        }
+        with _directory_cache_lock:
+            _directory_cache[cache_key] = (time.time(), entries)
+        return entries
+
+    def get(self, path):
+        """
+        Returns the value a file was marked with, or an empty string if it is not marked
+
+        :param path:
+        :return:
+        """
+        path = os.path.abspath(path)
+        value = self.get_directory(os.path.dirname(path)).get(os.path.basename(path))
+        if value:
+            return value
+
+        # Check if this file was marked under a different name
+        try:
+            file_size = os.path.getsize(path)
+        except OSError:
+            return ''
+        connection = self.__connection()
+        candidate = connection.execute(
+            "SELECT 1 FROM marked_files WHERE plugin_id = ? AND file_size = ? LIMIT 1",
+            (self.plugin_id, file_size)
+        ).fetchone()
+        if not candidate:
+            return ''
+        try:
+            fingerprint = content_fingerprint(path)
+        except OSError:
+            return ''
+        row = connection.execute(
+            "SELECT value FROM marked_files WHERE plugin_id = ? AND file_size = ? AND content_fingerprint = ? LIMIT 1",
+            (self.plugin_id, file_size, fingerprint)
+        ).fetchone()
+        if not row:
+            return ''
+        self.logger.debug("File '%s' matched a renamed entry in the file registry", path)
+        self.mark(path, row[0], fingerprint=fingerprint)
+        return row[0]
+
+    def mark(self, path, value, fingerprint=None):
+        """
+        Mark a file with the given value
+
+        :param path:
+        :param value:
+        :param fingerprint:
+        :return:
+        """
+        path = os.path.abspath(path)
+        directory = os.path.dirname(path)
+        if fingerprint is None:
+            fingerprint = content_fingerprint(path)
+        connection = self.__connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO marked_files "
+                "(plugin_id, path, directory, file_size, content_fingerprint, value, marked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.plugin_id, path, directory, os.path.getsize(path), fingerprint, value, time.time())
+            )
+        with _directory_cache_lock:
+            _directory_cache.pop((self.db_file, self.plugin_id, directory), None)
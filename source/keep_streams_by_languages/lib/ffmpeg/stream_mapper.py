@@ -22,9 +22,9 @@
 
 """
 import os
-import shutil
 from logging import Logger
 
+from . import runner
 from .probe import Probe
 
 
@@ -64,7 +64,7 @@ class StreamMapper(object):
 
     def __init__(self, logger: Logger, processing_stream_type: list):
         # Ensure ffmpeg is installed
-        if shutil.which('ffmpeg') is None:
+        if runner.which('ffmpeg') is None:
             raise Exception("Unable to find executable 'ffmpeg'. Please ensure that FFmpeg is installed correctly.")
 
         self.logger = logger
@@ -90,6 +90,25 @@ class StreamMapper(object):
             '-max_muxing_queue_size', '4096',
         ]
 
+    def __custom_options_encode(self, codec_type):
+        """
+        Check if the advanced mode 'custom_options' of the plugin settings encode streams of the given codec type.
+        Streams of this type that are not being processed are then mapped without being copied.
+        Plugins without these settings always copy them.
+
+        :param codec_type:
+        :return:
+        """
+        settings = getattr(self, 'settings', None)
+        if settings is None or settings.get_setting('mode') != 'advanced':
+            return False
+        custom_options = (settings.get_setting('custom_options') or '').split()
+        if '-c:{}'.format(codec_type) not in custom_options:
+            self.logger.debug("-c:%s not detected in custom mappings: '%s'", codec_type, custom_options)
+            return False
+        self.logger.debug("-c:%s detected in custom mappings: '%s'", codec_type, custom_options)
+        return True
+
     def __copy_stream_mapping(self, codec_type, stream_id):
         """
         Create stream mapping to simply copy the stream without encoding.
@@ -233,7 +252,10 @@ class StreamMapper(object):
                         self.audio_stream_count += 1
                         continue
                 else:
-                    self.__copy_stream_mapping('a', self.audio_stream_count)
+                    if self.__custom_options_encode('a'):
+                        self.stream_mapping += ['-map', '0:{}:{}'.format('a', self.audio_stream_count)]
+                    else:
+                        self.__copy_stream_mapping('a', self.audio_stream_count)
                     self.audio_stream_count += 1
                     continue
 
@@ -255,7 +277,10 @@ class StreamMapper(object):
                         self.subtitle_stream_count += 1
                         continue
                 else:
-                    self.__copy_stream_mapping('s', self.subtitle_stream_count)
+                    if self.__custom_options_encode('s'):
+                        self.stream_mapping += ['-map', '0:{}:{}'.format('s', self.subtitle_stream_count)]
+                    else:
+                        self.__copy_stream_mapping('s', self.subtitle_stream_count)
                     self.subtitle_stream_count += 1
                     continue
 
@@ -21,15 +21,15 @@
         If not, see <https://www.gnu.org/licenses/>.
 
 """
+import functools
 import logging
 import os
-from configparser import NoSectionError, NoOptionError
+import re
 import iso639
 
 from unmanic.libs.unplugins.settings import PluginSettings
-from unmanic.libs.directoryinfo import UnmanicDirectoryInfo
 
-from keep_streams_by_languages.lib.ffmpeg import StreamMapper, Probe, Parser
+from keep_streams_by_languages.lib.ffmpeg import FileRegistry, StreamMapper, Probe, Parser, PreFilter, runner, spans
 
 # Configure plugin logger
 logger = logging.getLogger("Unmanic.Plugin.keep_streams_by_languages")
@@ -42,9 +42,15 @@ class Settings(PluginSettings):
         "keep_undefined":        True,
         "keep_commentary":       False,
         "fail_safe":             True,
+        "audio_fallback_languages":    '',
+        "subtitle_fallback_languages": '',
+        "audio_max_per_language":      0,
+        "subtitle_max_per_language":   0,
+        "drop_codecs":                 '',
     }
 
 
+    @spans.span('Settings')
     def __init__(self, *args, **kwargs):
         super(Settings, self).__init__(*args, **kwargs)
         self.form_settings = {
@@ -62,7 +68,32 @@ class Settings(PluginSettings):
             },
             "fail_safe":   {
                 "label": "check to include fail safe check to prevent unintentional deletion of all audio &/or all subtitle streams",
-            }
+            },
+            "audio_fallback_languages": {
+                "label": "Enter comma delimited list of audio languages to keep if none of the above are found",
+            },
+            "subtitle_fallback_languages": {
+                "label": "Enter comma delimited list of subtitle languages to keep if none of the above are found",
+            },
+            "audio_max_per_language": {
+                "label":          "Keep only the first N audio streams of each language (0 keeps all)",
+                "input_type":     "slider",
+                "slider_options": {
+                    "min": 0,
+                    "max": 10,
+                },
+            },
+            "subtitle_max_per_language": {
+                "label":          "Keep only the first N subtitle streams of each language (0 keeps all)",
+                "input_type":     "slider",
+                "slider_options": {
+                    "min": 0,
+                    "max": 10,
+                },
+            },
+            "drop_codecs": {
+                "label": "Enter comma delimited list of audio/subtitle codecs to remove regardless of language (eg. 'dts, hdmv_pgs_subtitle')",
+            },
         }
 
 class PluginStreamMapper(StreamMapper):
@@ -70,90 +101,20 @@ class PluginStreamMapper(StreamMapper):
         super(PluginStreamMapper, self).__init__(logger, ['audio','subtitle'])
         self._out_idx = {'a': -1, 's': -1}  # track output type-relative index per codec
         self.settings = None
+        self.classified = None
 
     def set_settings(self, settings):
         self.settings = settings
 
-    def null_streams(self, streams):
-        alcl, audio_streams_list = streams_list(self.settings.get_setting('audio_languages'), streams, 'audio')
-        slcl, subtitle_streams_list = streams_list(self.settings.get_setting('subtitle_languages'), streams, 'subtitle')
-        if (any(l in audio_streams_list for l in alcl) or alcl == ['*'] or audio_streams_list == []) and (any(l in subtitle_streams_list for l in slcl) or slcl == ['*'] or subtitle_streams_list == []):
-            return True
-        logger.info("One of the lists of languages does not contain a language matching any streams in the file - the entire stream type would be removed if processed, aborting.\n alcl: '{}', audio streams in file: '{}';\n slcl: '{}', subtitle streams in file: '{}'".format(alcl, audio_streams_list, slcl, subtitle_streams_list))
-        return False
-
-    def same_streams_or_no_work(self, streams, keep_undefined):
-        alcl, audio_streams_list = streams_list(self.settings.get_setting('audio_languages'), streams, 'audio')
-        slcl, subtitle_streams_list = streams_list(self.settings.get_setting('subtitle_languages'), streams, 'subtitle')
-#        if not audio_streams_list or not subtitle_streams_list:
-#            return False
-        untagged_streams = [i for i in range(len(streams)) if "codec_type" in streams[i] and streams[i]["codec_type"] in ["audio", "subtitle"] and ("tags" not in streams[i] or ("tags" in streams[i] and "language" not in streams[i]["tags"]))]
-
-        # if subtitle or audio _streams_list is empty the "all" statements will not test properly so the if statements work around this
-        # and then we set the audio/subtitle_in a/slcl to True so no_work_to_do is properly determined.
-        if subtitle_streams_list and slcl != ['*']:
-            subs_in_slcl = all(l in slcl for l in subtitle_streams_list)
-        else:
-            subs_in_slcl = True
-        if audio_streams_list and alcl != ['*']:
-            audio_in_alcl = all(l in alcl for l in audio_streams_list)
-        else:
-            audio_in_alcl = True
-        no_work_to_do = (subs_in_slcl and audio_in_alcl and (keep_undefined == True or (keep_undefined == False and untagged_streams == [])))
-        logger.debug("audio config list: '{}', audio streams in file: '{}'".format(alcl, audio_streams_list))
-        logger.debug("subtitle config list: '{}', subtitle streams in file: '{}'".format(slcl, subtitle_streams_list))
-        logger.debug("untagged streams: '{}'".format(untagged_streams))
-        logger.debug("subs in slcl: '{}'; audio in alcl: '{}'".format(subs_in_slcl, audio_in_alcl))
-        logger.debug("no work to do: '{}'".format(no_work_to_do))
-        if ((alcl == audio_streams_list or alcl == ['*'])  and (slcl == subtitle_streams_list or slcl == ['*'])) or no_work_to_do:
-            return True
-        else:
-            return False
-
-    def test_tags_for_search_string(self, codec_type, stream_tags, stream_id):
-        keep_undefined  = self.settings.get_setting('keep_undefined')
-        # TODO: Check if we need to add 'title' tags
-        if stream_tags and True in list(k.lower() in ['language'] for k in stream_tags):
-            # check codec and get appropriate language list
-            if codec_type == 'audio':
-                language_list = self.settings.get_setting('audio_languages')
-            else:
-                language_list = self.settings.get_setting('subtitle_languages')
-            languages = list(filter(None, language_list.split(',')))
-            languages = [languages[i].strip() for i in range(len(languages))]
-            if '*' not in languages and languages:
-                try:
-                    languages = [iso639.Language.match(languages[i]).part1 if iso639.Language.match(languages[i]).part1 is not None and languages[i] in iso639.Language.match(languages[i]).part1 else
-                                 iso639.Language.match(languages[i]).part2b if iso639.Language.match(languages[i]).part2b is not None and languages[i] in iso639.Language.match(languages[i]).part2b else
-                                 iso639.Language.match(languages[i]).part2t if iso639.Language.match(languages[i]).part2t is not None and languages[i] in iso639.Language.match(languages[i]).part2t else
-                                 iso639.Language.match(languages[i]).part3 if languages[i] in iso639.Language.match(languages[i]).part3 else "" for i in range(len(languages))]
-                except iso639.language.LanguageNotFoundError:
-                    raise iso639.language.LanguageNotFoundError("config list: ", languages)
-
-            for language in languages:
-                language = language.strip()
-                try:
-                    stream_tag_language = iso639.Language.match(stream_tags.get('language', '').lower()).part1 if iso639.Language.match(stream_tags.get('language', '').lower()).part1 is not None and stream_tags.get('language', '').lower() in iso639.Language.match(stream_tags.get('language', '').lower()).part1 else \
-                                          iso639.Language.match(stream_tags.get('language', '').lower()).part2b if iso639.Language.match(stream_tags.get('language', '').lower()).part2b is not None and stream_tags.get('language', '').lower() in iso639.Language.match(stream_tags.get('language', '').lower()).part2b else \
-                                          iso639.Language.match(stream_tags.get('language', '').lower()).part2t if iso639.Language.match(stream_tags.get('language', '').lower()).part2t is not None and stream_tags.get('language', '').lower() in iso639.Language.match(stream_tags.get('language', '').lower()).part2t else \
-                                          iso639.Language.match(stream_tags.get('language', '').lower()).part3 if iso639.Language.match(stream_tags.get('language', '').lower()).part3 is not None and stream_tags.get('language', '').lower() in iso639.Language.match(stream_tags.get('language', '').lower()).part3 else ""
-                except iso639.language.LanguageNotFoundError:
-                    raise iso639.language.LanguageNotFoundError("stream tag language: ", stream_tags.get('language', '').lower())
-                if language and (language.lower() in stream_tag_language or language.lower() == '*'):
-                    return True
-        elif keep_undefined:
-            logger.warning(
-                "Stream '{}' in file '{}' has no language tag, but keep_undefined is checked. add to queue".format(stream_id, self.input_file))
-            return True
-
-        else:
-            logger.warning(
-                "Stream '{}' in file '{}' has no language tag. Ignoring".format(stream_id, self.input_file))
-        return False
+    def set_classified_streams(self, classified):
+        self.classified = classified
 
     def test_stream_needs_processing(self, stream_info: dict):
-        """Only add streams that have language task that match our list"""
-        return self.test_tags_for_search_string(stream_info.get('codec_type', '').lower(), stream_info.get('tags'), stream_info.get('index'))
+        """Remove the streams that the stream rules do not keep"""
+        if self.classified is None:
+            self.classified = ClassifiedStreams(LanguageRules.from_settings(self.settings),
+                                                self.probe.get('streams', []), input_file=self.input_file)
+        return stream_info.get('index') in self.classified.dropped
 
     def custom_stream_mapping(self, stream_info: dict, stream_id: int):
         """Remove this stream"""
@@ -162,35 +123,234 @@ class PluginStreamMapper(StreamMapper):
             'stream_encoding': [],
         }
 
-def streams_list(languages, streams, stream_type):
-    language_config_list = languages
-    lcl = list(language_config_list.split(','))
-    lcl = [lcl[i].strip() for i in range(0,len(lcl))]
-    lcl.sort()
-    if lcl == ['']: lcl = []
-    if '*' not in lcl and lcl:
-        try:
-            lcl = [iso639.Language.match(lcl[i]).part1 if iso639.Language.match(lcl[i]).part1 is not None and lcl[i] in iso639.Language.match(lcl[i]).part1 else
-                   iso639.Language.match(lcl[i]).part2b if iso639.Language.match(lcl[i]).part2b is not None and lcl[i] in iso639.Language.match(lcl[i]).part2b else
-                   iso639.Language.match(lcl[i]).part2t if iso639.Language.match(lcl[i]).part2t is not None and lcl[i] in iso639.Language.match(lcl[i]).part2t else
-                   iso639.Language.match(lcl[i]).part3 if lcl[i] in iso639.Language.match(lcl[i]).part3 else "" for i in range(len(lcl))]
-        except iso639.language.LanguageNotFoundError:
-            raise iso639.language.LanguageNotFoundError("config list: ", lcl)
+@functools.lru_cache(maxsize=4096)
+def _match_language(tag):
+    """
+    Returns the ISO 639 codes (part1, part2b, part2t, part3) of a language tag, or None if it is not a language.
+    Cached, as the same few tags are looked up for every stream of every file.
+
+    :param tag:
+    :return:
+    """
     try:
-        streams_list = [streams[i]["tags"]["language"] for i in range(0, len(streams)) if "codec_type" in streams[i] and streams[i]["codec_type"] == stream_type]
-        streams_list.sort() 
-    except KeyError:
-        streams_list = []
-        logger.info("no '{}' tags in file".format(stream_type))
-    if streams_list:
+        language = iso639.Language.match(tag)
+    except iso639.language.LanguageNotFoundError:
+        return None
+    return language.part1, language.part2b, language.part2t, language.part3
+
+
+def canonical_language(tag):
+    """
+    Returns the shortest ISO 639 code of a language tag (eg. 'fre' -> 'fr').
+    Raises LanguageNotFoundError if the tag is not a language.
+
+    :param tag:
+    :return:
+    """
+    codes = _match_language(tag)
+    if codes is None:
+        raise iso639.language.LanguageNotFoundError("'{}' isn't an ISO language code or name".format(tag))
+    return next((code for code in codes if code), "")
+
+
+def compile_languages(language_list):
+    """
+    Returns the frozenset of canonical codes of a comma delimited list of languages, or None if it contains '*'.
+
+    :param language_list:
+    :return:
+    """
+    languages = [x.strip().lower() for x in (language_list or '').split(',') if x.strip()]
+    if '*' in languages:
+        return None
+    try:
+        return frozenset(canonical_language(language) for language in languages)
+    except iso639.language.LanguageNotFoundError:
+        raise iso639.language.LanguageNotFoundError("config list: ", languages)
+
+
+# The settings that the stream rules are compiled from
+RULE_SETTINGS = [
+    'audio_languages',
+    'subtitle_languages',
+    'keep_undefined',
+    'keep_commentary',
+    'audio_fallback_languages',
+    'subtitle_fallback_languages',
+    'audio_max_per_language',
+    'subtitle_max_per_language',
+    'drop_codecs',
+]
+
+COMMENTARY_PATTERN = re.compile(r'commentary', re.IGNORECASE)
+
+
+class LanguageRules(object):
+    """
+    The stream rules of the plugin settings, compiled once for each set of setting values (see 'from_settings()').
+
+    For each stream type ('audio', 'subtitle'):
+        languages           - Languages to keep (None keeps all languages)
+        fallback_languages  - Languages to keep if the file has no stream in 'languages' (None keeps all)
+        max_per_language    - Keep only the first N streams of each language (0 keeps all)
+    And for both types:
+        drop_codecs         - Streams with these codecs are removed
+        keep_undefined      - Keep streams without a (known) language tag
+        keep_commentary     - Keep audio streams that are titled or flagged as commentary
+    """
+
+    def __init__(self, audio_languages='', subtitle_languages='', keep_undefined=True, keep_commentary=False,
+                 audio_fallback_languages='', subtitle_fallback_languages='', audio_max_per_language=0,
+                 subtitle_max_per_language=0, drop_codecs=''):
+        # An empty list of languages keeps all languages of that type
+        self.languages = {
+            'audio':    compile_languages(audio_languages) or None,
+            'subtitle': compile_languages(subtitle_languages) or None,
+        }
+        self.fallback_languages = {
+            'audio':    compile_languages(audio_fallback_languages),
+            'subtitle': compile_languages(subtitle_fallback_languages),
+        }
+        self.max_per_language = {
+            'audio':    int(audio_max_per_language or 0),
+            'subtitle': int(subtitle_max_per_language or 0),
+        }
+        self.drop_codecs = frozenset(x.strip().lower() for x in (drop_codecs or '').split(',') if x.strip())
+        self.keep_undefined = bool(keep_undefined)
+        self.keep_commentary = bool(keep_commentary)
+
+    @staticmethod
+    def from_settings(settings):
+        return _compile_rules(tuple(settings.get_setting(key) for key in RULE_SETTINGS))
+
+    @staticmethod
+    def stream_language(stream_info):
+        """
+        Returns the canonical language code of a stream, or None if it is untagged or not a known language.
+
+        :param stream_info:
+        :return:
+        """
+        language = ((stream_info.get('tags') or {}).get('language') or '').strip().lower()
+        if not language:
+            return None
         try:
-            streams_list = [iso639.Language.match(streams_list[i]).part1 if iso639.Language.match(streams_list[i]).part1 is not None and streams_list[i] in iso639.Language.match(streams_list[i]).part1 else
-                            iso639.Language.match(streams_list[i]).part2b if iso639.Language.match(streams_list[i]).part2b is not None and streams_list[i] in iso639.Language.match(streams_list[i]).part2b else
-                            iso639.Language.match(streams_list[i]).part2t if iso639.Language.match(streams_list[i]).part2t is not None and streams_list[i] in iso639.Language.match(streams_list[i]).part2t else
-                            iso639.Language.match(streams_list[i]).part3 if streams_list[i] in iso639.Language.match(streams_list[i]).part3 else "" for i in range(len(streams_list))]
+            return canonical_language(language)
         except iso639.language.LanguageNotFoundError:
-            raise iso639.language.LanguageNotFoundError("streams list: ", streams_list)
-    return lcl,streams_list
+            return None
+
+    @staticmethod
+    def is_commentary(stream_info):
+        if (stream_info.get('disposition') or {}).get('comment') == 1:
+            return True
+        return bool(COMMENTARY_PATTERN.search((stream_info.get('tags') or {}).get('title') or ''))
+
+
+@functools.lru_cache(maxsize=16)
+def _compile_rules(values):
+    return LanguageRules(**dict(zip(RULE_SETTINGS, values)))
+
+
+class ClassifiedStreams(object):
+    """
+    The audio and subtitle streams of a file, classified by the stream rules in a single pass over the probe streams.
+
+    For each stream type ('audio', 'subtitle') this holds:
+        streams     - The (type index, stream) of each stream, in input order
+        kept        - The (type index, stream) of each stream that is kept, in input order
+    And for all streams:
+        dropped     - The probe indexes of the audio/subtitle streams that are removed (a frozenset, so that the stream
+                      mapper's test of each stream is a constant time lookup)
+        dropped_in_order - The same probe indexes in input order, for logging
+        untagged    - The probe index of audio/subtitle streams without a known language tag
+        commentary  - The type index of commentary audio streams
+
+    The file test and worker runners are both answered from this, so a file is only queued if the worker will
+    remove a stream from it.
+    """
+
+    def __init__(self, rules, streams, input_file=None):
+        self.rules = rules
+        self.input_file = input_file
+        self.streams = {'audio': [], 'subtitle': []}
+        self.kept = {'audio': [], 'subtitle': []}
+        self.dropped_in_order = []
+        self.untagged = []
+        self.commentary = set()
+
+        matched = {'audio': [], 'subtitle': []}
+        fallback = {'audio': [], 'subtitle': []}
+        for stream_info in streams:
+            codec_type = stream_info.get('codec_type')
+            if codec_type not in self.streams:
+                continue
+            type_index = len(self.streams[codec_type])
+            entry = (type_index, stream_info)
+            self.streams[codec_type].append(entry)
+
+            language = rules.stream_language(stream_info)
+            if language is None:
+                self.untagged.append(stream_info.get('index'))
+            if codec_type == 'audio' and rules.is_commentary(stream_info):
+                self.commentary.add(type_index)
+                if not rules.keep_commentary:
+                    continue
+
+            if (stream_info.get('codec_name') or '').lower() in rules.drop_codecs:
+                continue
+            if language is None:
+                if rules.keep_undefined:
+                    matched[codec_type].append((entry, None))
+                continue
+            languages = rules.languages[codec_type]
+            if languages is None or language in languages:
+                matched[codec_type].append((entry, language))
+                continue
+            fallback_languages = rules.fallback_languages[codec_type]
+            if fallback_languages is None or language in fallback_languages:
+                fallback[codec_type].append((entry, language))
+
+        for codec_type in ['audio', 'subtitle']:
+            candidates = matched[codec_type]
+            if not any(language for _, language in candidates):
+                # None of the configured languages were found. Keep the fallback languages (in input order).
+                candidates = sorted(candidates + fallback[codec_type], key=lambda candidate: candidate[0][0])
+            max_per_language = self.rules.max_per_language[codec_type]
+            counts = {}
+            for entry, language in candidates:
+                if language is not None and max_per_language:
+                    counts[language] = counts.get(language, 0) + 1
+                    if counts[language] > max_per_language:
+                        continue
+                self.kept[codec_type].append(entry)
+            kept = set(type_index for type_index, _ in self.kept[codec_type])
+            self.dropped_in_order += [
+                s.get('index') for type_index, s in self.streams[codec_type] if type_index not in kept
+            ]
+        self.dropped = frozenset(self.dropped_in_order)
+
+    def null_streams(self):
+        """
+        Fail-safe check. Returns False if processing would remove every stream of a type.
+
+        :return:
+        """
+        for codec_type in ['audio', 'subtitle']:
+            if self.streams[codec_type] and not self.kept[codec_type]:
+                logger.info("No {} stream of file '{}' matches the configured languages - the entire stream type would be removed if processed, aborting.".format(codec_type, self.input_file))
+                return False
+        return True
+
+    def streams_need_processing(self):
+        """
+        Returns True if any audio or subtitle stream would be removed.
+
+        :return:
+        """
+        logger.debug("untagged streams: '{}'".format(self.untagged))
+        logger.debug("streams to remove: '{}'".format(self.dropped_in_order))
+        return bool(self.dropped)
+
 
 def kept_streams(settings):
     al = settings.get_setting('audio_languages')
@@ -211,15 +371,12 @@ def kept_streams(settings):
 
     return 'kept_streams=audio_languages={}:subtitle_languages={}:keep_undefined={}:keep_commentary={}:fail_safe={}'.format(al, sl, ku, kc, fs)
 
+@spans.span('file_streams_already_kept')
 def file_streams_already_kept(settings, path):
-    directory_info = UnmanicDirectoryInfo(os.path.dirname(path))
+    registry = FileRegistry(settings, 'keep_streams_by_languages', logger)
 
     try:
-        streams_already_kept = directory_info.get('keep_streams_by_languages', os.path.basename(path))
-    except NoSectionError as e:
-        streams_already_kept = ''
-    except NoOptionError as e:
-        streams_already_kept = ''
+        streams_already_kept = registry.get(path)
     except Exception as e:
         logger.debug("Unknown exception {}.".format(e))
         streams_already_kept = ''
@@ -231,6 +388,7 @@ def file_streams_already_kept(settings, path):
     # Default to...
     return False
 
+@runner.track_runner(logger)
 def on_library_management_file_test(data):
     """
     Runner function - enables additional actions during the library management file tests.
@@ -258,130 +416,81 @@ def on_library_management_file_test(data):
     # Get the path to the file
     abspath = data.get('path')
 
+    # Reject files by their name and size, or reuse the last verdict if the file has not changed, before probing it
+    file_prefilter = PreFilter('keep_streams_by_languages', ['video'], settings=settings,
+                               library_id=data.get('library_id'))
+    rejected, cached_verdict = file_prefilter.check(abspath)
+    if rejected:
+        logger.debug("File '{}' rejected by the pre-filter.".format(abspath))
+        return data
+
+    if cached_verdict is not None:
+        requires_processing = cached_verdict.needs_processing
+    else:
+        requires_processing = file_requires_processing(settings, abspath)
+        if requires_processing is None:
+            # File probe failed, skip the rest of this test
+            return data
+        file_prefilter.store(abspath, requires_processing)
+
+    if requires_processing:
+        # Mark this file to be added to the pending tasks
+        data['add_file_to_pending_tasks'] = True
+        logger.debug("File '{}' should be added to task list. Probe found streams require processing.".format(abspath))
+
+    return data
+
+
+def file_requires_processing(settings, abspath):
+    """
+    Probe a file and check if it has streams that require processing.
+    Returns None if the file could not be probed.
+
+    :param settings:
+    :param abspath:
+    :return:
+    """
     # Get file probe
     probe = Probe(logger, allowed_mimetypes=['video'])
     if not probe.file(abspath):
-        # File probe failed, skip the rest of this test
-        return data
+        return None
 
     # get all streams
     probe_streams=probe.get_probe()["streams"]
 
-    # Get stream mapper
-    mapper = PluginStreamMapper()
-    mapper.set_settings(settings)
-    mapper.set_probe(probe)
-
-    # Set the input file
-    mapper.set_input_file(abspath)
-
     # Get fail-safe setting
     fail_safe = settings.get_setting('fail_safe')
-    keep_undefined = settings.get_setting('keep_undefined')
 
+    requires_processing = False
     if not file_streams_already_kept(settings, abspath):
         logger.debug("File '{}' has not previously had streams kept by keep_streams_by_languages plugin".format(abspath))
+        # Classify the streams once with the compiled stream rules. All checks below are answered from this.
+        classified = ClassifiedStreams(LanguageRules.from_settings(settings), probe_streams, input_file=abspath)
         if fail_safe:
-            if not mapper.null_streams(probe_streams):
+            if not classified.null_streams():
                 logger.debug("File '{}' does not contain streams matching any of the configured languages - if * was configured or the file has no streams of a given type, this check will not prevent the plugin from running for that strem type.".format(abspath))
-                return data
-        if mapper.same_streams_or_no_work(probe_streams, keep_undefined):
-            logger.debug("File '{}' only has same streams as keep configuration specifies OR otherwise does not require any work to keep ony specified streams - so, does not contain streams that require processing.".format(abspath))
-        elif mapper.streams_need_processing():
-            # Mark this file to be added to the pending tasks
-            data['add_file_to_pending_tasks'] = True
-            logger.debug("File '{}' should be added to task list. Probe found streams require processing.".format(abspath))
+                return False
+        if classified.streams_need_processing():
+            requires_processing = True
         else:
             logger.debug("File '{}' does not contain streams that require processing.".format(abspath))
 
-    del mapper
+    return requires_processing
 
-    return data
-
-def keep_languages(mapper, ct, language_list, streams, keep_undefined, keep_commentary):
-    codec_type_name = ct[0].lower()  # 'a' or 's'
-    # normalise configured languages
-    languages = [x.strip().lower() for x in filter(None, language_list.split(','))]
-    if languages and '*' not in languages:
-        try:
-            languages = [(
-                iso639.Language.match(L).part1 or
-                iso639.Language.match(L).part2b or
-                iso639.Language.match(L).part2t or
-                iso639.Language.match(L).part3 or ""
-            ) for L in languages]
-        except iso639.language.LanguageNotFoundError:
-            raise iso639.language.LanguageNotFoundError("config list: ", languages)
-
-    # walk actual input streams of this type with their correct input type-index
-    for in_type_idx, s in iter_type_streams(streams, ct):
-        tags = s.get('tags', {})
-        lang = (tags.get('language') or '').lower().strip()
-
-        # commentary filter for audio
-        if codec_type_name == 'a' and not keep_commentary:
-            title = (tags.get('title') or '').lower()
-            if 'commentary' in title:
-                continue
 
-        # undefined language handling
-        if not lang:
-            if keep_undefined:
-                mapadder(mapper, in_type_idx, codec_type_name, s)
-            continue
-
-        # normalise stream language
-        try:
-            norm_lang = (
-                iso639.Language.match(lang).part1 or
-                iso639.Language.match(lang).part2b or
-                iso639.Language.match(lang).part2t or
-                iso639.Language.match(lang).part3 or ""
-            )
-        except iso639.language.LanguageNotFoundError:
-            # if unknown language tag, treat as undefined if configured
-            if keep_undefined:
-                mapadder(mapper, in_type_idx, codec_type_name, s)
-            continue
-
-        # keep if matches config (or config is '*')
-        if not languages or languages == ['*'] or norm_lang in languages:
-            mapadder(mapper, in_type_idx, codec_type_name, s)
-
-
-def keep_undefined(mapper, streams, keep_commentary):
-    # Audio: respect commentary preference
-    for in_type_idx, s in iter_type_streams(streams, 'audio'):
-        tags = s.get('tags', {})
-        lang = (tags.get('language') or '').strip().lower()
-        if lang:
-            continue
-        if not keep_commentary:
-            title = (tags.get('title') or '').lower()
-            if 'commentary' in title:
-                continue
-        mapadder(mapper, in_type_idx, 'a', s)
+def map_kept_streams(mapper, classified):
+    """
+    Map the audio and subtitle streams that the stream rules keep, in input order
 
-    # Subtitles: keep truly untagged
-    for in_type_idx, s in iter_type_streams(streams, 'subtitle'):
-        lang = (s.get('tags', {}) .get('language') or '').strip().lower()
-        if not lang:
-            mapadder(mapper, in_type_idx, 's', s)
+    :param mapper:
+    :param classified:
+    :return:
+    """
+    for codec_type, codec in [('audio', 'a'), ('subtitle', 's')]:
+        for in_type_idx, stream_info in classified.kept[codec_type]:
+            mapadder(mapper, in_type_idx, codec, stream_info)
 
 
-def iter_type_streams(streams, ct):
-    """
-    Yields (in_type_index, stream_dict) for each stream of codec_type == ct ('audio' or 'subtitle'),
-    where in_type_index is the type-relative index (0,1,2...) in the *input*.
-    """
-    want = ct.lower()
-    type_idx = 0
-    for s in streams:
-        if s.get('codec_type') == want:
-            yield type_idx, s
-            type_idx += 1
-
-                
 def mapadder(mapper, in_type_index, codec, stream_info):
     """
     Map one stream and preserve its original disposition flags by applying them
@@ -407,6 +516,7 @@ def mapadder(mapper, in_type_index, codec, stream_info):
         mapper.stream_encoding += [f'-disposition:{codec}:{out_idx}', '+'.join(active_flags)]
 
 
+@runner.track_runner(logger)
 def on_worker_process(data):
     """
     Runner function - enables additional configured processing jobs during the worker stages of a task.
@@ -444,9 +554,6 @@ def on_worker_process(data):
     else:
         settings = Settings()
 
-    keep_undefined_lang_tags = settings.get_setting('keep_undefined')
-    keep_commentary = settings.get_setting('keep_commentary')
-
     if not file_streams_already_kept(settings, data.get('file_in')):
         # Get stream mapper
         mapper = PluginStreamMapper()
@@ -459,14 +566,16 @@ def on_worker_process(data):
         # Get fail-safe setting
         fail_safe = settings.get_setting('fail_safe')
 
+        # Classify the streams once with the compiled stream rules. All checks and the stream mapping below are answered from this.
+        classified = ClassifiedStreams(LanguageRules.from_settings(settings), probe_streams, input_file=abspath)
+        mapper.set_classified_streams(classified)
+
         # Test for null intersection of configured languages and actual languages
         if fail_safe:
-            if not mapper.null_streams(probe_streams):
+            if not classified.null_streams():
                 logger.info("File '{}' does not contain streams matching any of the configured languages - if * was configured or the file has no streams of a given type, this check will not prevent the plugin from running for that strem type.".format(abspath))
                 return data
-        if mapper.same_streams_or_no_work(probe_streams, keep_undefined_lang_tags):
-            logger.debug("File '{}' only has same streams as keep configuration specifies OR otherwise does not require any work to keep ony specified streams - so, does not contain streams that require processing.".format(abspath))
-        elif mapper.streams_need_processing():
+        if classified.streams_need_processing():
             logger.debug("File '{}' Proceeding with worker - probe found streams require processing.".format(abspath))
             # Set the output file
             mapper.set_output_file(data.get('file_out'))
@@ -475,14 +584,8 @@ def on_worker_process(data):
             mapper.stream_mapping = ['-map', '0:v']
             mapper.stream_encoding = []
 
-            # keep specific language streams if present
-            keep_languages(mapper, 'audio', settings.get_setting('audio_languages'), probe_streams, keep_undefined_lang_tags, keep_commentary)
-            if settings.get_setting('subtitle_languages') != '*':
-                keep_languages(mapper, 'subtitle', settings.get_setting('subtitle_languages'), probe_streams, keep_undefined_lang_tags, keep_commentary)
-
-            # keep undefined language streams if present
-            if keep_undefined_lang_tags:
-                keep_undefined(mapper, probe_streams, keep_commentary)
+            # keep the audio and subtitle streams selected by the stream rules
+            map_kept_streams(mapper, classified)
 
             # All mapping must go through mapadder so dispositions are reset/reapplied.
             # (i.e., do NOT append a blanket '-map 0:s?' here.)
@@ -504,6 +607,7 @@ def on_worker_process(data):
             logger.debug("Worker will not process file '{}'; it does not contain streams that require processing.".format(abspath))
     return data
 
+@runner.track_runner(logger)
 def on_postprocessor_task_results(data):
     """
     Runner function - provides a means for additional postprocessor functions based on the task success.
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.device_scheduler.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (4:02 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+"""
+Notes:
+    - Leases are stored in a JSON file in the plugin's profile directory.
+      The file is only read and written while holding an exclusive lock on a lock file beside it (flock, or
+      msvcrt.locking on Windows), so leases are shared between all worker threads and processes on the host.
+    - A lease is held from the time a worker builds its FFmpeg command until the task's post-processor runs.
+      Leases that are never released (eg. Unmanic was restarted) expire after LEASE_SECONDS.
+"""
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from video_transcoder.lib.encoders.nvenc import NvencEncoder, list_available_cuda_devices
+from video_transcoder.lib.encoders.vaapi import VaapiEncoder, list_available_vaapi_devices
+from video_transcoder.lib.ffmpeg import runner
+from video_transcoder.lib.tools import SettingsOverrides
+
+logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
+
+# Device selection settings values
+DEVICE_AUTO = 'auto'
+DEVICE_ROUND_ROBIN = 'round-robin'
+SCHEDULED_DEVICE_OPTIONS = [DEVICE_AUTO, DEVICE_ROUND_ROBIN]
+
+# Time after which an unreleased lease is ignored
+LEASE_SECONDS = 24 * 3600
+
+# Used if the host has no file locking (leases are then only shared between the threads of this process)
+_thread_lock = threading.Lock()
+
+
+def _lock(lock):
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        lock.seek(0)
+        while True:
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after 10 seconds
+                continue
+    else:
+        _thread_lock.acquire()
+
+
+def _unlock(lock):
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        _thread_lock.release()
+
+
+def get_nvenc_session_counts():
+    """
+    Returns the number of active NVENC sessions of each NVIDIA device, or an empty dict if they can not be read
+
+    :return:
+    """
+    try:
+        output = runner.check_output(
+            ['nvidia-smi', '--query-gpu=index,encoder.stats.sessionCount', '--format=csv,noheader,nounits'],
+            timeout=10)
+    except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return {}
+    return parse_nvenc_session_counts(output)
+
+
+def parse_nvenc_session_counts(output):
+    """
+    Parse the output of 'nvidia-smi --query-gpu=index,encoder.stats.sessionCount --format=csv,noheader,nounits'
+
+    :param output:
+    :return:
+    """
+    session_counts = {}
+    for line in (output or '').splitlines():
+        fields = [f.strip() for f in line.split(',')]
+        if len(fields) == 2 and fields[0].isdigit() and fields[1].isdigit():
+            session_counts[fields[0]] = int(fields[1])
+    return session_counts
+
+
+class DeviceScheduler(object):
+    """
+    DeviceScheduler
+
+    Leases hardware devices to tasks so that concurrent workers are spread across all devices
+    """
+
+    def __init__(self, settings, device_type):
+        self.device_type = device_type
+        lease_directory = os.path.join(settings.get_profile_directory(), 'device_leases')
+        self.lease_file = os.path.join(lease_directory, '{}.json'.format(device_type))
+        self.lock_file = os.path.join(lease_directory, '{}.lock'.format(device_type))
+
+    @contextmanager
+    def __locked_state(self):
+        """
+        Hold the lock and yield the lease state. Any changes made to the state are saved when the lock is released.
+
+        :return:
+        """
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        with open(self.lock_file, 'a+') as lock:
+            _lock(lock)
+            try:
+                try:
+                    with open(self.lease_file) as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                state.setdefault('leases', {})
+                state.setdefault('last_device', None)
+                # Drop expired leases
+                now = time.time()
+                state['leases'] = {k: v for k, v in state['leases'].items() if now - v.get('time', 0) < LEASE_SECONDS}
+                yield state
+                with open(self.lease_file + '.tmp', 'w') as f:
+                    json.dump(state, f)
+                os.replace(self.lease_file + '.tmp', self.lease_file)
+            finally:
+                _unlock(lock)
+
+    def acquire(self, lease_id, device_ids, method=DEVICE_AUTO, session_counts=None):
+        """
+        Lease a device for a task and return its ID.
+        If the task already holds a lease, the same device is returned.
+            - 'auto' picks the device with the fewest leases (or active encoder sessions, if known)
+            - 'round-robin' picks the device after the last one that was leased
+
+        :param lease_id: Unique ID of the task (eg. its cache directory)
+        :param device_ids: IDs of the available devices
+        :param method:
+        :param session_counts: Optional dict of device ID -> active encoder sessions
+        :return:
+        """
+        device_ids = [str(d) for d in device_ids]
+        if not device_ids:
+            return None
+        with self.__locked_state() as state:
+            lease = state['leases'].get(lease_id)
+            if lease and lease.get('device') in device_ids:
+                return lease['device']
+
+            if method == DEVICE_ROUND_ROBIN:
+                last_device = state.get('last_device')
+                next_index = (device_ids.index(last_device) + 1) if last_device in device_ids else 0
+                device = device_ids[next_index % len(device_ids)]
+            else:
+                loads = {d: 0 for d in device_ids}
+                for other_lease in state['leases'].values():
+                    if other_lease.get('device') in loads:
+                        loads[other_lease['device']] += 1
+                # Encoder sessions include those started by this plugin, so do not add them to the lease count
+                for device_id, sessions in (session_counts or {}).items():
+                    if device_id in loads:
+                        loads[device_id] = max(loads[device_id], sessions)
+                # Ties go to the device that was leased least recently
+                last_device = state.get('last_device')
+                device = min(device_ids, key=lambda d: (loads[d], d == last_device, device_ids.index(d)))
+
+            state['leases'][lease_id] = {"device": device, "time": time.time()}
+            state['last_device'] = device
+        logger.debug("Leased %s device '%s' to '%s'", self.device_type, device, lease_id)
+        return device
+
+    def release(self, lease_id):
+        """
+        Release the lease held by a task
+
+        :param lease_id:
+        :return:
+        """
+        with self.__locked_state() as state:
+            lease = state['leases'].pop(lease_id, None)
+        if lease:
+            logger.debug("Released %s device '%s' from '%s'", self.device_type, lease.get('device'), lease_id)
+
+
+def _scheduled_device_setting(settings):
+    """
+    Returns the device type and setting key of the configured encoder if its device is selected by the scheduler
+
+    :param settings:
+    :return:
+    """
+    encoder_name = settings.get_setting('video_encoder')
+    if encoder_name in NvencEncoder(settings).provides():
+        device_type, setting_key = 'nvenc', 'nvenc_device'
+    elif encoder_name in VaapiEncoder(settings).provides():
+        device_type, setting_key = 'vaapi', 'vaapi_device'
+    else:
+        return None, None
+    if settings.get_setting(setting_key) not in SCHEDULED_DEVICE_OPTIONS:
+        return None, None
+    return device_type, setting_key
+
+
+def lease_scheduled_device(settings, lease_id):
+    """
+    If the encoder's device is set to 'auto' or 'round-robin', lease a device to the task.
+    Returns the settings to build the task's FFmpeg command with.
+
+    :param settings:
+    :param lease_id:
+    :return:
+    """
+    device_type, setting_key = _scheduled_device_setting(settings)
+    if not device_type:
+        return settings
+    method = settings.get_setting(setting_key)
+    session_counts = None
+    if device_type == 'nvenc':
+        device_ids = [d.get('hwaccel_device') for d in list_available_cuda_devices()]
+        if method == DEVICE_AUTO:
+            session_counts = get_nvenc_session_counts()
+    else:
+        device_ids = [d.get('hwaccel_device') for d in list_available_vaapi_devices()]
+    device = DeviceScheduler(settings, device_type).acquire(lease_id, device_ids, method=method,
+                                                            session_counts=session_counts)
+    if device is None:
+        return settings
+    return SettingsOverrides(settings, {setting_key: device})
+
+
+def release_scheduled_device(settings, lease_id):
+    """
+    Release any device leased to the task
+
+    :param settings:
+    :param lease_id:
+    :return:
+    """
+    device_type, _ = _scheduled_device_setting(settings)
+    if device_type:
+        DeviceScheduler(settings, device_type).release(lease_id)
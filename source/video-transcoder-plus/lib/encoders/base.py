@@ -23,6 +23,9 @@
 """
 import logging
 
+from video_transcoder.lib import quality_model
+from video_transcoder.lib.encoders import decode_support
+
 logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
 
 
@@ -30,6 +33,8 @@ class Encoder:
     def __init__(self, settings=None, probe=None):
         self.settings = settings
         self.probe = probe
+        self.encode_pass = None
+        self.passlogfile = None
 
     def set_probe(self, probe=None, probe_info=None):
         if isinstance(probe_info, dict):
@@ -38,6 +43,62 @@ class Encoder:
             probe.set_probe(probe_info)
         self.probe = probe
 
+    def set_encode_pass(self, encode_pass=None, passlogfile=None):
+        """
+        Configure the pass number and stats file prefix for multi-pass encoders.
+        Set the pass to None for a single pass encode.
+
+        :param encode_pass:
+        :param passlogfile:
+        :return:
+        """
+        self.encode_pass = encode_pass
+        self.passlogfile = passlogfile
+
+    def _basic_mode_quality(self, stream_info: dict, encoder_name: str, default_quality):
+        """
+        Returns the quality value (CRF/global_quality) to use in basic mode for the given stream.
+        The default quality is relaxed for sources with a low bitrate for their resolution and frame rate.
+
+        :param stream_info:
+        :param encoder_name:
+        :param default_quality:
+        :return:
+        """
+        target_codec = self.provides().get(encoder_name, {}).get('codec')
+        prediction = quality_model.predict(self.probe.get_probe(), stream_info, encoder_name, target_codec)
+        if not prediction:
+            return default_quality
+        return int(default_quality) + prediction.get('quality_offset', 0)
+
+    def _decoding_method_for_source(self, decoding_method, hwaccel, get_decode_matrix):
+        """
+        Returns the decoding method to use for the source file.
+        Falls back to 'cpu' if FFmpeg was not built with the hwaccel or if the source video stream's codec,
+        chroma subsampling or bit depth is known to not be supported by the hardware decoder.
+        If the capabilities can not be read, the configured decoding method is used.
+
+        :param decoding_method: The configured decoding method
+        :param hwaccel: The FFmpeg hwaccel used by the decoding method
+        :param get_decode_matrix: Function that returns the decode capability matrix of the device
+        :return:
+        """
+        if not decoding_method or decoding_method == 'cpu' or not self.probe:
+            return decoding_method
+        hwaccels = decode_support.get_ffmpeg_hwaccels()
+        if hwaccels is not None and hwaccel not in hwaccels:
+            logger.info("FFmpeg does not support the '%s' hwaccel. Falling back to CPU decoding.", hwaccel)
+            return 'cpu'
+        for stream in self.probe.get('streams', []):
+            if stream.get('codec_type') != 'video' or stream.get('disposition', {}).get('attached_pic'):
+                continue
+            if decode_support.stream_decode_supported(get_decode_matrix(), stream) is False:
+                logger.info("The '%s' decoder does not support %s %s video. Falling back to CPU decoding.",
+                            hwaccel, stream.get('codec_name'), stream.get('pix_fmt'))
+                return 'cpu'
+            break
+        return decoding_method
+
     def _target_pix_fmt_for_encoder(self, encoder_name: str) -> str:
         """
         Determines the target pixel format for a given encoder based on the source pixel format.
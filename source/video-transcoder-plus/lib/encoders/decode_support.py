@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.decode_support.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (2:52 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+"""
+Notes:
+    - A decode capability matrix maps a source codec and chroma subsampling to the highest bit depth that the
+      hardware decoder supports. Eg. {"hevc": {"420": 12, "444": 12}}
+    - VAAPI (and QSV, which uses the same driver on Linux) matrices are read from 'vainfo'.
+    - NVDEC does not have a tool that lists its decode capabilities, so a static table is used.
+    - Listing the hwaccels FFmpeg was built with:
+        ffmpeg -hide_banner -hwaccels
+"""
+import re
+import subprocess
+import threading
+
+from video_transcoder.lib.ffmpeg import runner
+
+# NVDEC support common to Turing and newer GPUs.
+#   REF: https://developer.nvidia.com/video-encode-and-decode-gpu-support-matrix-new
+NVDEC_DECODE_MATRIX = {
+    "av1":        {"420": 10},
+    "h264":       {"420": 8},
+    "hevc":       {"420": 12, "444": 12},
+    "mjpeg":      {"420": 8},
+    "mpeg1video": {"420": 8},
+    "mpeg2video": {"420": 8},
+    "mpeg4":      {"420": 8},
+    "vc1":        {"420": 8},
+    "vp8":        {"420": 8},
+    "vp9":        {"420": 12},
+}
+
+# VA-API decode profiles mapped to (codec, chroma, bit depth)
+VA_PROFILES = {
+    "VAProfileAV1Profile0":             ("av1", "420", 10),
+    "VAProfileH264ConstrainedBaseline": ("h264", "420", 8),
+    "VAProfileH264High":                ("h264", "420", 8),
+    "VAProfileH264Main":                ("h264", "420", 8),
+    "VAProfileHEVCMain":                ("hevc", "420", 8),
+    "VAProfileHEVCMain10":              ("hevc", "420", 10),
+    "VAProfileHEVCMain12":              ("hevc", "420", 12),
+    "VAProfileHEVCMain422_10":          ("hevc", "422", 10),
+    "VAProfileHEVCMain422_12":          ("hevc", "422", 12),
+    "VAProfileHEVCMain444":             ("hevc", "444", 8),
+    "VAProfileHEVCMain444_10":          ("hevc", "444", 10),
+    "VAProfileHEVCMain444_12":          ("hevc", "444", 12),
+    "VAProfileJPEGBaseline":            ("mjpeg", "420", 8),
+    "VAProfileMPEG2Main":               ("mpeg2video", "420", 8),
+    "VAProfileMPEG2Simple":             ("mpeg2video", "420", 8),
+    "VAProfileVC1Advanced":             ("vc1", "420", 8),
+    "VAProfileVC1Main":                 ("vc1", "420", 8),
+    "VAProfileVC1Simple":               ("vc1", "420", 8),
+    "VAProfileVP8Version0_3":           ("vp8", "420", 8),
+    "VAProfileVP9Profile0":             ("vp9", "420", 8),
+    "VAProfileVP9Profile1":             ("vp9", "444", 8),
+    "VAProfileVP9Profile2":             ("vp9", "420", 10),
+    "VAProfileVP9Profile3":             ("vp9", "444", 10),
+}
+
+_cache_lock = threading.Lock()
+_cache = {}
+
+
+def _cached(key, function):
+    """
+    Run a capability query once per process and cache the result
+
+    :param key:
+    :param function:
+    :return:
+    """
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    result = function()
+    with _cache_lock:
+        _cache[key] = result
+    return result
+
+
+def _run(args):
+    """
+    Returns the output of a tool, or None if it is not installed or fails
+
+    :param args:
+    :return:
+    """
+    try:
+        return runner.check_output(args, timeout=30)
+    except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return None
+
+
+def parse_hwaccels(output):
+    """
+    Parse the output of 'ffmpeg -hwaccels' into a list of hwaccel names
+
+    :param output:
+    :return:
+    """
+    hwaccels = []
+    listing = False
+    for line in (output or '').splitlines():
+        line = line.strip()
+        if line.startswith('Hardware acceleration methods'):
+            listing = True
+            continue
+        if listing and line:
+            hwaccels.append(line)
+    return hwaccels
+
+
+def parse_vainfo(output):
+    """
+    Parse the output of 'vainfo' into a decode capability matrix.
+    Only profiles with a 'VAEntrypointVLD' (decode) entrypoint are included.
+
+    :param output:
+    :return:
+    """
+    matrix = {}
+    for profile, entrypoint in re.findall(r'(VAProfile\w+)\s*:\s*(VAEntrypoint\w+)', output or ''):
+        if entrypoint != 'VAEntrypointVLD' or profile not in VA_PROFILES:
+            continue
+        codec, chroma, bit_depth = VA_PROFILES[profile]
+        chroma_depths = matrix.setdefault(codec, {})
+        chroma_depths[chroma] = max(chroma_depths.get(chroma, 0), bit_depth)
+    return matrix
+
+
+def get_ffmpeg_hwaccels():
+    """
+    Returns the list of hwaccels FFmpeg was built with, or None if it could not be read
+
+    :return:
+    """
+
+    def query():
+        output = _run(['ffmpeg', '-hide_banner', '-hwaccels'])
+        return parse_hwaccels(output) if output is not None else None
+
+    return _cached(('hwaccels',), query)
+
+
+def get_vaapi_decode_matrix(device_path):
+    """
+    Returns the decode capability matrix of a VA-API render device, or None if it could not be read
+
+    :param device_path:
+    :return:
+    """
+
+    def query():
+        output = _run(['vainfo', '--display', 'drm', '--device', device_path])
+        return parse_vainfo(output) if output is not None else None
+
+    return _cached(('vainfo', device_path), query)
+
+
+def get_nvdec_decode_matrix():
+    """
+    Returns the decode capability matrix of NVDEC, or None if there is no NVIDIA device
+
+    :return:
+    """
+
+    def query():
+        if _run(['nvidia-smi', '-L']) is None:
+            return None
+        return NVDEC_DECODE_MATRIX
+
+    return _cached(('nvdec',), query)
+
+
+def pix_fmt_chroma(pix_fmt):
+    """
+    Returns the chroma subsampling ('420', '422' or '444') of a pixel format
+
+    :param pix_fmt:
+    :return:
+    """
+    pix_fmt = (pix_fmt or '').lower()
+    for chroma in ('444', '422'):
+        if chroma in pix_fmt:
+            return chroma
+    if pix_fmt.startswith(('gbr', 'rgb', 'bgr')):
+        return '444'
+    return '420'
+
+
+def pix_fmt_bit_depth(pix_fmt):
+    """
+    Returns the bit depth of a pixel format (eg. 10 for 'yuv420p10le' or 'p010le')
+
+    :param pix_fmt:
+    :return:
+    """
+    pix_fmt = (pix_fmt or '').lower()
+    match = re.search(r'p(\d{2})(le|be)?$', pix_fmt) or re.search(r'^p0(\d{2})', pix_fmt)
+    if match:
+        return int(match.group(1))
+    return 8
+
+
+def stream_decode_supported(matrix, stream_info):
+    """
+    Check a video stream against a decode capability matrix.
+    Returns True if the stream can be decoded, False if it can not, or None if the matrix is not known.
+
+    :param matrix:
+    :param stream_info:
+    :return:
+    """
+    if matrix is None:
+        return None
+    codec = (stream_info.get('codec_name') or '').lower()
+    pix_fmt = stream_info.get('pix_fmt')
+    max_bit_depth = matrix.get(codec, {}).get(pix_fmt_chroma(pix_fmt))
+    if not max_bit_depth:
+        return False
+    return pix_fmt_bit_depth(pix_fmt) <= max_bit_depth
@@ -99,7 +99,9 @@ class LibsvtAv1Encoder(Encoder):
         provides = self.provides()
         return provides.get(encoder, {})
 
-    def stream_args(self, stream_id):
+    def stream_args(self, stream_info, stream_id, encoder_name):
+        generic_kwargs = {}
+        advanced_kwargs = {}
         stream_encoding = []
 
         # Use defaults for basic mode
@@ -108,12 +110,18 @@ class LibsvtAv1Encoder(Encoder):
             stream_encoding += [
                 '-preset', str(defaults.get('preset')),
             ]
-            # TODO: Calculate best crf based on source bitrate
             default_crf = defaults.get('constant_quality_scale')
             if self.settings.get_setting('video_encoder') in ['libsvtav1']:
                 default_crf = 23
+            # Relax the CRF for sources with a low bitrate
+            default_crf = self._basic_mode_quality(stream_info, encoder_name, default_crf)
             stream_encoding += ['-crf', str(default_crf)]
-            return stream_encoding
+            return {
+                "generic_kwargs":  generic_kwargs,
+                "advanced_kwargs": advanced_kwargs,
+                "encoder_args":    stream_encoding,
+                "stream_args":     [],
+            }
 
         stav1_params = ["enable-stat-report=1"]
         stav1_params += ['tune=' + str(self.settings.get_setting('tune_stvav1'))]
@@ -152,7 +160,12 @@ class LibsvtAv1Encoder(Encoder):
             # Set the pixel format
             stream_encoding += ['-pix_fmt', str(self.settings.get_setting('video_pix_fmt'))]
 
-        return stream_encoding
+        return {
+            "generic_kwargs":  generic_kwargs,
+            "advanced_kwargs": advanced_kwargs,
+            "encoder_args":    stream_encoding,
+            "stream_args":     [],
+        }
 
     def __set_default_option(self, select_options, key, default_option=None):
         """
@@ -152,12 +152,13 @@ class LibxEncoder(Encoder):
             stream_args += [
                 '-preset', str(defaults.get('preset')),
             ]
-            # TODO: Calculate best crf based on source bitrate
             default_crf = defaults.get('constant_quality_scale')
             if self.settings.get_setting('video_encoder') in ['libx265']:
                 default_crf = 28
             elif self.settings.get_setting('video_encoder') in ['libx264']:
                 default_crf = 23
+            # Relax the CRF for sources with a low bitrate
+            default_crf = self._basic_mode_quality(stream_info, encoder_name, default_crf)
             stream_args += ['-crf', str(default_crf)]
             return {
                 "generic_kwargs":  generic_kwargs,
@@ -176,6 +177,10 @@ class LibxEncoder(Encoder):
             encoder_args += [
                 '-crf', str(self.settings.get_setting('constant_quality_scale')),
             ]
+        elif self.settings.get_setting('encoder_ratecontrol_method') in ['2PASS']:
+            # Set the target average bitrate and the pass args (if a pass has been configured)
+            encoder_args += [f'-b:v:{stream_id}', f"{self.settings.get_setting('average_bitrate')}M"]
+            encoder_args = self.__two_pass_args(encoder_args, encoder_name)
 
         # Add configured stream args
         if self.settings.get_setting('profile') and self.settings.get_setting('profile') not in ('auto', 'disabled'):
@@ -188,6 +193,32 @@ class LibxEncoder(Encoder):
             "stream_args":     stream_args,
         }
 
+    def __two_pass_args(self, encoder_args, encoder_name):
+        """
+        Add the args for the configured pass of a two-pass encode.
+        The first pass uses the encoder's fast first pass settings as it only needs to generate the stats file.
+
+        :param encoder_args:
+        :param encoder_name:
+        :return:
+        """
+        if not self.encode_pass or not self.passlogfile:
+            return encoder_args
+        if encoder_name in ['libx265']:
+            # libx265 does not read the generic -pass/-passlogfile options. Pass them via the x265 params
+            x265_params = [f"pass={self.encode_pass}", f"stats={self.passlogfile}.log"]
+            if self.encode_pass == 1:
+                x265_params.append("slow-firstpass=0")
+            if '-x265-params' in encoder_args:
+                params_pos = encoder_args.index('-x265-params') + 1
+                encoder_args[params_pos] = ":".join([encoder_args[params_pos]] + x265_params)
+            else:
+                encoder_args += ['-x265-params', ":".join(x265_params)]
+            return encoder_args
+        # libx264 applies its fast first pass settings automatically (see the 'fastfirstpass' option)
+        encoder_args += ['-pass', str(self.encode_pass), '-passlogfile', self.passlogfile]
+        return encoder_args
+
     def __set_default_option(self, select_options, key, default_option=None):
         """
         Sets the default option if the currently set option is not available
@@ -421,7 +452,6 @@ class LibxEncoder(Encoder):
         return values
 
     def get_encoder_ratecontrol_method_form_settings(self):
-        # TODO: Add Two-Pass
         values = {
             "label":          "Encoder ratecontrol method",
             "sub_setting":    True,
@@ -431,6 +461,10 @@ class LibxEncoder(Encoder):
                     "value": "CRF",
                     "label": "CRF - Constant Rate Factor",
                 },
+                {
+                    "value": "2PASS",
+                    "label": "2-Pass - Bitrate based mode using a two-pass average bitrate encode",
+                },
             ]
         }
         self.__set_default_option(values['select_options'], 'encoder_ratecontrol_method', default_option='CRF')
@@ -473,6 +507,6 @@ class LibxEncoder(Encoder):
         }
         if self.settings.get_setting('mode') not in ['standard']:
             values["display"] = "hidden"
-        if self.settings.get_setting('encoder_ratecontrol_method') not in ['VBR', 'LA', 'CBR']:
+        if self.settings.get_setting('encoder_ratecontrol_method') not in ['VBR', 'LA', 'CBR', '2PASS']:
             values["display"] = "hidden"
         return values
@@ -31,10 +31,26 @@ import logging
 import re
 import subprocess
 
+from video_transcoder.lib.encoders import decode_support
 from video_transcoder.lib.encoders.base import Encoder
+from video_transcoder.lib.ffmpeg import runner
 
 logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
 
+# CUVID decoders by source codec. These decoders support cropping and resizing during decode.
+cuvid_decoders = {
+    "av1":        "av1_cuvid",
+    "h264":       "h264_cuvid",
+    "hevc":       "hevc_cuvid",
+    "mjpeg":      "mjpeg_cuvid",
+    "mpeg1video": "mpeg1_cuvid",
+    "mpeg2video": "mpeg2_cuvid",
+    "mpeg4":      "mpeg4_cuvid",
+    "vc1":        "vc1_cuvid",
+    "vp8":        "vp8_cuvid",
+    "vp9":        "vp9_cuvid",
+}
+
 
 def list_available_cuda_devices():
     """
@@ -43,7 +59,7 @@ def list_available_cuda_devices():
     gpu_dicts = []
     try:
         # Run the nvidia-smi command
-        result = subprocess.check_output(['nvidia-smi', '-L'], encoding='utf-8')
+        result = runner.check_output(['nvidia-smi', '-L'])
         # Use regular expression to find device IDs, names, and UUIDs
         gpu_info = re.findall(r'GPU (\d+): (.+) \(UUID: (.+)\)', result)
         # Populate the list of dictionaries for each GPU
@@ -82,7 +98,8 @@ def get_configured_device(settings):
             if settings.get_setting('nvenc_device') == hw_device.get('hwaccel_device'):
                 hardware_device = hw_device
                 break
-    # If no matching hardware device is set, then select the first one
+    # If no matching hardware device is set, then select the first one.
+    # Workers replace 'auto' and 'round-robin' with a device leased from the device scheduler.
     if not hardware_device:
         hardware_device = hardware_devices[0]
     return hardware_device
@@ -137,18 +154,43 @@ class NvencEncoder(Encoder):
         generic_kwargs = {}
         advanced_kwargs = {}
         # Check if we are using a HW accelerated decoder also
-        if self.settings.get_setting('nvenc_decoding_method') in ['cuda', 'nvdec', 'cuvid']:
+        decoding_method = self.decoding_method()
+        if decoding_method in ['cuda', 'nvdec', 'cuvid']:
             generic_kwargs = {
                 "-hwaccel_device":   hardware_device.get('hwaccel_device'),
-                "-hwaccel":          self.settings.get_setting('nvenc_decoding_method'),
+                "-hwaccel":          decoding_method,
                 "-init_hw_device":   "cuda=hw",
                 "-filter_hw_device": "hw",
             }
-            if self.settings.get_setting('nvenc_decoding_method') in ['cuda', 'nvdec']:
+            if decoding_method in ['cuda', 'nvdec']:
                 generic_kwargs["-hwaccel_output_format"] = "cuda"
 
         return generic_kwargs, advanced_kwargs
 
+    def decoding_method(self):
+        """
+        Returns the decoding method to use for the source file.
+        This is the configured method unless NVDEC is unable to decode the source.
+
+        :return:
+        """
+        decoding_method = (self.settings.get_setting('nvenc_decoding_method') or '').lower()
+        if decoding_method == 'cuvid' and self.probe and not self.__cuvid_decoder():
+            logger.info("No CUVID decoder is available for the source video codec. Falling back to CPU decoding.")
+            return 'cpu'
+        return self._decoding_method_for_source(decoding_method, 'cuda', decode_support.get_nvdec_decode_matrix)
+
+    def __cuvid_decoder(self):
+        """
+        Returns the name of the CUVID decoder for the source video codec, or None if there is not one
+
+        :return:
+        """
+        for stream in self.probe.get('streams', []):
+            if stream.get('codec_type') == 'video':
+                return cuvid_decoders.get(stream.get('codec_name'))
+        return None
+
     def generate_filtergraphs(self, current_filter_args, smart_filters, encoder_name):
         """
         Generate the required filter for enabling NVENC/CUDA HW acceleration.
@@ -160,21 +202,31 @@ class NvencEncoder(Encoder):
         start_filter_args = []
         end_filter_args = []
 
+        # Check for HW accelerated decode mode
+        # All decode methods ('cuda', 'nvdec', 'cuvid') are handled by the same
+        # filtergraph logic and output CUDA frames. The main FFmpeg command handles the specific decoder.
+        decoding_method = self.decoding_method()
+        hw_decode = decoding_method in ('cuda', 'nvdec', 'cuvid')
+
         # Loop over any HW smart filters to be applied and add them as required.
         hw_smart_filters = []
         remaining_smart_filters = []
         for sf in smart_filters:
             if sf.get("scale"):
-                w = sf["scale"]["values"]["width"]
-                hw_smart_filters.append(f"scale_cuda={w}:-1")
+                w, h = sf["scale"]["values"]["width"], sf["scale"]["values"]["height"]
+                hw_smart_filters.append(f"scale_cuda={w}:{h}")
+            elif sf.get("crop") and decoding_method == 'cuvid' and self.__cuvid_decoder():
+                # Crop in the CUVID decoder so the frames never leave the GPU.
+                # There is no CUDA crop filter, so the 'cuda'/'nvdec' methods still crop in software.
+                c = sf["crop"]["values"]
+                crop_bars = [c['y'], c['source_height'] - c['height'] - c['y'],
+                             c['x'], c['source_width'] - c['width'] - c['x']]
+                # The CUVID decoder itself is selected per stream by 'stream_args()'
+                generic_kwargs['-crop'] = "x".join(str(v) for v in crop_bars)
+                generic_kwargs['-hwaccel_output_format'] = "cuda"
             else:
                 remaining_smart_filters.append(sf)
 
-        # Check for HW accelerated decode mode
-        # All decode methods ('cuda', 'nvdec', 'cuvid') are handled by the same
-        # filtergraph logic and output CUDA frames. The main FFmpeg command handles the specific decoder.
-        hw_decode = (self.settings.get_setting('nvenc_decoding_method') or '').lower() in ('cuda', 'nvdec', 'cuvid')
-
         # Check software format to use
         target_fmt = self._target_pix_fmt_for_encoder(encoder_name)
 
@@ -248,6 +300,11 @@ class NvencEncoder(Encoder):
             # Force Main10 profile
             stream_args += [f'-profile:v:{stream_id}', 'main10']
 
+        # If CUVID is enabled, return generic_kwargs
+        if self.decoding_method() in ['cuvid']:
+            in_codec = stream_info.get('codec_name', 'unknown_codec_name')
+            generic_kwargs = {f'-c:v:{stream_id}': f'{in_codec}_cuvid'}
+
         # Use defaults for basic mode
         if self.settings.get_setting('mode') in ['basic']:
             # Read defaults
@@ -291,11 +348,6 @@ class NvencEncoder(Encoder):
         if self.settings.get_setting('nvenc_enable_temporal_aq'):
             stream_args += ['-temporal-aq', '1']
 
-        # If CUVID is enabled, return generic_kwargs
-        if (self.settings.get_setting('nvenc_decoding_method') or '').lower() in ['cuvid']:
-            in_codec = stream_info.get('codec_name', 'unknown_codec_name')
-            generic_kwargs = {f'-c:v:{stream_id}': f'{in_codec}_cuvid'}
-
         # Add stream color args
         if enc_supports_hdr and target_color_config.get('apply_color_params'):
             # Add HDR color tags to the encoder output stream
@@ -349,6 +401,18 @@ class NvencEncoder(Encoder):
                     "value": hw_device.get('hwaccel_device', 'none'),
                     "label": "NVIDIA device '{}'".format(hw_device.get('hwaccel_device_name', 'not found')),
                 })
+            if len(hardware_devices) > 1:
+                # Let the device scheduler spread tasks across all devices
+                values['select_options'] += [
+                    {
+                        "value": "auto",
+                        "label": "Automatic - the least busy NVIDIA device",
+                    },
+                    {
+                        "value": "round-robin",
+                        "label": "Round-robin - each task uses the next NVIDIA device",
+                    },
+                ]
         if not default_option:
             default_option = 'none'
 
@@ -360,7 +424,7 @@ class NvencEncoder(Encoder):
     def get_nvenc_decoding_method_form_settings(self):
         values = {
             "label":          "Enable HW Decoding",
-            "description":    "Warning: Ensure your device supports decoding the source video codec or it will fail.\n"
+            "description":    "Files that the device is known to be unable to decode (codec, chroma or bit depth) are decoded on the CPU.\n"
                               "This enables full hardware transcode with NVDEC and NVENC, using only GPU memory for the entire video transcode.\n"
                               "If filters are configured in the plugin, decoder will output NV12 software surfaces which are slightly slower.\n"
                               "Note: It is recommended that you disable this option for 10-bit encodes.",
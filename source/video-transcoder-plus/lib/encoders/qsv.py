@@ -31,7 +31,9 @@ Notes:
         https://gist.github.com/jackleaks/776d2de2688d238c95ed7eafb3d5bae8
 """
 
+from video_transcoder.lib.encoders import decode_support
 from video_transcoder.lib.encoders.base import Encoder
+from video_transcoder.lib.encoders.vaapi import list_available_vaapi_devices
 
 
 class QsvEncoder(Encoder):
@@ -84,13 +86,33 @@ class QsvEncoder(Encoder):
         }
         advanced_kwargs = {}
         # Check if we are using a HW accelerated decoder> Modify args as required
-        if self.settings.get_setting('qsv_decoding_method') in ['qsv']:
+        if self.decoding_method() in ['qsv']:
             generic_kwargs.update({
                 "-hwaccel":               "qsv",
                 "-hwaccel_output_format": "qsv",
             })
         return generic_kwargs, advanced_kwargs
 
+    def decoding_method(self):
+        """
+        Returns the decoding method to use for the source file.
+        This is the configured method unless the QSV device is unable to decode the source.
+        On Linux, QSV decodes through the VA-API driver of the first render device.
+
+        :return:
+        """
+        decoding_method = self.settings.get_setting('qsv_decoding_method')
+        if decoding_method not in ['qsv']:
+            return decoding_method
+
+        def get_decode_matrix():
+            hardware_devices = list_available_vaapi_devices()
+            if not hardware_devices:
+                return None
+            return decode_support.get_vaapi_decode_matrix(hardware_devices[0].get('hwaccel_device_path'))
+
+        return self._decoding_method_for_source(decoding_method, 'qsv', get_decode_matrix)
+
     def generate_filtergraphs(self, current_filter_args, smart_filters, encoder_name):
         """
         Generate the required filter for enabling QSV HW acceleration
@@ -102,18 +124,22 @@ class QsvEncoder(Encoder):
         start_filter_args = []
         end_filter_args = []
 
+        # Check if we are decoding with QSV
+        hw_decode = self.decoding_method() in ['qsv']
+
         # Loop over any HW smart filters to be applied and add them as required.
         hw_smart_filters = []
         remaining_smart_filters = []
         for sf in smart_filters:
             if sf.get("scale"):
-                w = sf["scale"]["values"]["width"]
-                hw_smart_filters.append(f"scale_qsv=w={w}:h=-1")
+                w, h = sf["scale"]["values"]["width"], sf["scale"]["values"]["height"]
+                hw_smart_filters.append(f"scale_qsv=w={w}:h={h}")
+            elif sf.get("crop") and hw_decode:
+                # Crop the QSV frames with VPP. SW decoded frames are cheaper to crop before they are uploaded.
+                c = sf["crop"]["values"]
+                hw_smart_filters.append(f"vpp_qsv=cx={c['x']}:cy={c['y']}:cw={c['width']}:ch={c['height']}")
             else:
                 remaining_smart_filters.append(sf)
-
-        # Check if we are decoding with QSV
-        hw_decode = self.settings.get_setting('qsv_decoding_method') in ['qsv']
         # Check software format to use
         target_fmt = self._target_pix_fmt_for_encoder(encoder_name)
 
@@ -197,9 +223,11 @@ class QsvEncoder(Encoder):
                 for k, v in target_color_config.get('stream_color_params', {}).items():
                     stream_args += [k, v]
 
-            # Use default LA_ICQ mode
+            # Use default LA_ICQ mode. Relax the quality for sources with a low bitrate
+            global_quality = self._basic_mode_quality(stream_info, encoder_name,
+                                                      defaults.get('qsv_constant_quality_scale'))
             encoder_args += [
-                '-global_quality', str(defaults.get('qsv_constant_quality_scale')),
+                '-global_quality', str(global_quality),
                 '-look_ahead_depth', '100', '-extbrc', '1',
             ]
             if encoder_name in ["h264_qsv"]:
@@ -277,7 +305,7 @@ class QsvEncoder(Encoder):
     def get_qsv_decoding_method_form_settings(self):
         values = {
             "label":          "Enable HW Accelerated Decoding",
-            "description":    "Warning: Ensure your device supports decoding the source video codec or it will fail.\n"
+            "description":    "Files that the device is known to be unable to decode (codec, chroma or bit depth) are decoded on the CPU.\n"
                               "This enables full hardware transcode with QSV, using only GPU memory for the entire video transcode.\n"
                               "If filters are configured in the plugin, decoder will output NV12 or P010LE software surfaces to\n"
                               "those filters which will be slightly slower.",
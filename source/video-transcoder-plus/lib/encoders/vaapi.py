@@ -23,6 +23,7 @@
 """
 import os
 
+from video_transcoder.lib.encoders import decode_support
 from video_transcoder.lib.encoders.base import Encoder
 
 
@@ -48,6 +49,33 @@ def list_available_vaapi_devices():
     return decoders
 
 
+def get_configured_device(settings):
+    """
+    Returns the currently configured device
+    Checks to ensure that the configured device exists and otherwise will return the first device available
+    :param settings:
+    :return:
+    """
+    hardware_device = None
+    # Set the hardware device
+    hardware_devices = list_available_vaapi_devices()
+    if not hardware_devices:
+        # Return no options. No hardware device was found
+        raise Exception("No VAAPI device found")
+    # If we have configured a hardware device
+    if settings.get_setting('vaapi_device') not in ['none']:
+        # Attempt to match to that configured hardware device
+        for hw_device in hardware_devices:
+            if settings.get_setting('vaapi_device') == hw_device.get('hwaccel_device'):
+                hardware_device = hw_device
+                break
+    # If no matching hardware device is set, then select the first one.
+    # Workers replace 'auto' and 'round-robin' with a device leased from the device scheduler.
+    if not hardware_device:
+        hardware_device = hardware_devices[0]
+    return hardware_device
+
+
 class VaapiEncoder(Encoder):
     def __init__(self, settings=None, probe=None):
         super().__init__(settings=settings, probe=probe)
@@ -101,26 +129,10 @@ class VaapiEncoder(Encoder):
 
         :return:
         """
-        # Set the hardware device
-        hardware_devices = list_available_vaapi_devices()
-        if not hardware_devices:
-            # Return no options. No hardware device was found
-            raise Exception("No VAAPI device found")
-
-        hardware_device = None
-        # If we have configured a hardware device
-        if self.settings.get_setting('vaapi_device') not in ['none']:
-            # Attempt to match to that configured hardware device
-            for hw_device in hardware_devices:
-                if self.settings.get_setting('vaapi_device') == hw_device.get('hwaccel_device'):
-                    hardware_device = hw_device
-                    break
-        # If no matching hardware device is set, then select the first one
-        if not hardware_device:
-            hardware_device = hardware_devices[0]
+        hardware_device = get_configured_device(self.settings)
 
         # Check if we are using a VAAPI decoder also...
-        if self.settings.get_setting('vaapi_decoding_method') in ['vaapi']:
+        if self.decoding_method(hardware_device) in ['vaapi']:
             # Set a named global device that can be used with various params
             dev_id = 'vaapi0'
             # Configure args such that when the input may or may not be able to be decoded with hardware we can do:
@@ -143,6 +155,23 @@ class VaapiEncoder(Encoder):
 
         return generic_kwargs, advanced_kwargs
 
+    def decoding_method(self, hardware_device=None):
+        """
+        Returns the decoding method to use for the source file.
+        This is the configured method unless the VAAPI device is unable to decode the source.
+
+        :param hardware_device:
+        :return:
+        """
+        decoding_method = self.settings.get_setting('vaapi_decoding_method')
+        if decoding_method not in ['vaapi']:
+            return decoding_method
+        if hardware_device is None:
+            hardware_device = get_configured_device(self.settings)
+        device_path = hardware_device.get('hwaccel_device_path')
+        return self._decoding_method_for_source(decoding_method, 'vaapi',
+                                                lambda: decode_support.get_vaapi_decode_matrix(device_path))
+
     def generate_filtergraphs(self, current_filter_args, smart_filters, encoder_name):
         """
         Generate the required filter for enabling VAAPI HW acceleration
@@ -154,18 +183,28 @@ class VaapiEncoder(Encoder):
         start_filter_args = []
         end_filter_args = []
 
+        # Check if we are decoding with VAAPI
+        hw_decode = self.decoding_method() in ['vaapi']
+
         # Loop over any HW smart filters to be applied and add them as required.
         hw_smart_filters = []
         remaining_smart_filters = []
+        hw_crop = None
         for sf in smart_filters:
             if sf.get("scale"):
-                w = sf["scale"]["values"]["width"]
-                hw_smart_filters.append(f"scale_vaapi=w={w}:h=-1")
+                w, h = sf["scale"]["values"]["width"], sf["scale"]["values"]["height"]
+                if hw_crop:
+                    # The scale will apply the pending crop
+                    hw_crop = None
+                hw_smart_filters.append(f"scale_vaapi=w={w}:h={h}")
+            elif sf.get("crop") and hw_decode:
+                # A crop of VAAPI frames only sets the crop area of the frame. It is applied by the next scale_vaapi.
+                hw_crop = sf["crop"]["values"]
+                hw_smart_filters.append(sf["crop"]["filter"])
             else:
                 remaining_smart_filters.append(sf)
-
-        # Check if we are decoding with VAAPI
-        hw_decode = self.settings.get_setting('vaapi_decoding_method') in ['vaapi']
+        if hw_crop:
+            hw_smart_filters.append(f"scale_vaapi=w={hw_crop['width']}:h={hw_crop['height']}")
         # Check software format to use
         target_fmt = self._target_pix_fmt_for_encoder(encoder_name)
 
@@ -341,6 +380,18 @@ class VaapiEncoder(Encoder):
                     "value": hw_device.get('hwaccel_device', 'none'),
                     "label": "VAAPI device '{}'".format(hw_device.get('hwaccel_device_path', 'not found')),
                 })
+            if len(hardware_devices) > 1:
+                # Let the device scheduler spread tasks across all devices
+                values['select_options'] += [
+                    {
+                        "value": "auto",
+                        "label": "Automatic - the least busy VAAPI device",
+                    },
+                    {
+                        "value": "round-robin",
+                        "label": "Round-robin - each task uses the next VAAPI device",
+                    },
+                ]
         if not default_option:
             default_option = 'none'
 
@@ -352,7 +403,7 @@ class VaapiEncoder(Encoder):
     def get_vaapi_decoding_method_form_settings(self):
         values = {
             "label":          "Enable HW Accelerated Decoding",
-            "description":    "Warning: Ensure your device supports decoding the source video codec or it will fail.\n"
+            "description":    "Files that the device is known to be unable to decode (codec, chroma or bit depth) are decoded on the CPU.\n"
                               "This enables full hardware transcode with VAAPI, using only GPU memory for the entire video transcode.\n"
                               "If filters are configured in the plugin, decoder will output NV12 or P010LE software surfaces to\n"
                               "those filters which will be slightly slower.",
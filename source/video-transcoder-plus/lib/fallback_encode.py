@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.fallback_encode.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (3:31 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+    Runs the FFmpeg command of each fallback tier in turn until one of them succeeds.
+
+    This module is executed by the worker as a standalone script:
+        python3 fallback_encode.py /path/to/manifest.json
+
+    It must only import from the standard library.
+
+"""
+import json
+import os
+import subprocess
+import sys
+
+
+def write_manifest(path, manifest):
+    """
+    Write a fallback encode manifest to disk
+
+    :param path:
+    :param manifest:
+    :return:
+    """
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_result(path):
+    """
+    Read the result written by this script. Returns None if no tier succeeded.
+
+    :param path:
+    :return:
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _print(message):
+    print("[HW fallback] {}".format(message), flush=True)
+
+
+def run_tier(command):
+    """
+    Run the FFmpeg command of a tier.
+    The FFmpeg output is passed through unchanged so that the worker can parse its progress.
+
+    :param command:
+    :return:
+    """
+    pipe = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    for chunk in iter(lambda: pipe.stdout.read1(4096), b''):
+        sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    return pipe.wait()
+
+
+def main(manifest_file):
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    output_file = manifest['output_file']
+    for tier in manifest.get('tiers', []):
+        _print("Running tier '{}'".format(tier['name']))
+        returncode = run_tier(tier['command'])
+        if returncode == 0 and os.path.exists(output_file):
+            with open(manifest['result_file'], 'w') as f:
+                json.dump({"tier": tier['name'], "source_key": manifest.get('source_key')}, f)
+            return 0
+        _print("Tier '{}' failed with exit code {}".format(tier['name'], returncode))
+        if os.path.exists(output_file):
+            os.remove(output_file)
+    _print("ERROR: All tiers failed")
+    return 1
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: {} /path/to/manifest.json".format(sys.argv[0]))
+        sys.exit(2)
+    sys.exit(main(sys.argv[1]))
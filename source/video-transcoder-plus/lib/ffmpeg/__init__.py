@@ -23,16 +23,72 @@
 """
 
 from __future__ import absolute_import
+import sys
 import warnings
 
-from .parser import Parser
-from .probe import Probe
-from .stream_mapper import StreamMapper
-
 __author__ = 'Josh.5 (jsunnex@gmail.com)'
+__version__ = '1.8.1'
 
 __all__ = (
+    'DecisionCache',
+    'FileRegistry',
+    'KeyframeIndex',
     'Parser',
+    'PreFilter',
     'Probe',
     'StreamMapper',
+    'async_ffprobe_file',
+    'database',
+    'decision_cache',
+    'ffprobe_files',
+    'file_registry',
+    'get_keyframe_index',
+    'prefilter',
+    'runner',
+    'spans',
 )
+
+# Name that this package is shared under with every plugin in the same Unmanic process.
+# Each plugin ships its own copy of this package. The first copy imported registers itself under this name. Copies
+# imported by other plugins then use the registered package if it is the same version or newer, so that the probe,
+# keyframe and mimetype caches and the subprocess counters are shared by all plugins.
+SHARED_PACKAGE_NAME = 'unmanic_plugin_helpers_ffmpeg'
+
+
+def _version_tuple(version):
+    try:
+        return tuple(int(part) for part in str(version).split('.'))
+    except ValueError:
+        return ()
+
+
+_shared = sys.modules.get(SHARED_PACKAGE_NAME)
+if _shared is not None and _version_tuple(getattr(_shared, '__version__', '')) >= _version_tuple(__version__):
+    DecisionCache = _shared.DecisionCache
+    FileRegistry = _shared.FileRegistry
+    KeyframeIndex = _shared.KeyframeIndex
+    Parser = _shared.Parser
+    PreFilter = _shared.PreFilter
+    Probe = _shared.Probe
+    StreamMapper = _shared.StreamMapper
+    async_ffprobe_file = _shared.async_ffprobe_file
+    database = _shared.database
+    decision_cache = _shared.decision_cache
+    ffprobe_files = _shared.ffprobe_files
+    file_registry = _shared.file_registry
+    get_keyframe_index = _shared.get_keyframe_index
+    prefilter = _shared.prefilter
+    runner = _shared.runner
+    spans = _shared.spans
+else:
+    from . import database, decision_cache, file_registry, prefilter, runner, spans
+    from .decision_cache import DecisionCache
+    from .file_registry import FileRegistry
+    from .keyframes import KeyframeIndex, get_keyframe_index
+    from .parser import Parser
+    from .prefilter import PreFilter
+    from .probe import Probe, async_ffprobe_file, ffprobe_files
+    from .stream_mapper import StreamMapper
+
+    if _shared is None:
+        sys.modules[SHARED_PACKAGE_NAME] = sys.modules[__name__]
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.keyframes.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (1:15 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import bisect
+import hashlib
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from . import runner
+
+# Number of keyframe indexes held in memory
+MEMORY_CACHE_SIZE = 32
+
+# Limits of each cache directory on disk. Index files not used for DISK_CACHE_MAX_AGE seconds are removed, then the
+# least recently used files are removed until the directory holds at most DISK_CACHE_MAX_BYTES.
+# A directory is pruned at most once every DISK_CACHE_PRUNE_INTERVAL seconds, after a new index has been written.
+DISK_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DISK_CACHE_MAX_AGE = 30 * 24 * 3600
+DISK_CACHE_PRUNE_INTERVAL = 3600
+
+_cache_lock = threading.Lock()
+_memory_cache = OrderedDict()
+# Time that each cache directory was last pruned
+_last_prune = {}
+
+
+class KeyframeIndex(object):
+    """
+    KeyframeIndex
+
+    Sorted keyframe timestamps (in seconds) of a video stream
+    """
+
+    def __init__(self, timestamps=None):
+        self.timestamps = timestamps if timestamps is not None else array('d')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def floor(self, position):
+        """
+        Returns the last keyframe at or before the given position, or None if there is none
+
+        :param position:
+        :return:
+        """
+        i = bisect.bisect_right(self.timestamps, position)
+        return self.timestamps[i - 1] if i else None
+
+    def ceil(self, position):
+        """
+        Returns the first keyframe at or after the given position, or None if there is none
+
+        :param position:
+        :return:
+        """
+        i = bisect.bisect_left(self.timestamps, position)
+        return self.timestamps[i] if i < len(self.timestamps) else None
+
+    def nearest(self, position):
+        """
+        Returns the keyframe closest to the given position, or None if the index is empty
+
+        :param position:
+        :return:
+        """
+        candidates = [t for t in (self.floor(position), self.ceil(position)) if t is not None]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda t: abs(t - position))
+
+
+def extract_keyframes(path, stream='v:0', read_intervals=None):
+    """
+    Read the keyframe timestamps of a stream with ffprobe.
+    The ffprobe output is parsed line by line as it is read, so the packet list is never held in memory.
+
+    :param path:
+    :param stream:
+    :param read_intervals:  Optional ffprobe '-read_intervals' value to only read parts of the file
+    :return:
+    """
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', stream,
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+    ]
+    if read_intervals:
+        command += ['-read_intervals', read_intervals]
+    command += [path]
+
+    timestamps = array('d')
+    is_sorted = True
+    pipe = runner.StreamingCommand(command)
+    for line in pipe:
+        fields = line.decode('utf-8', errors='replace').strip().split(',')
+        if len(fields) < 2 or not fields[1].startswith('K'):
+            continue
+        try:
+            pts_time = float(fields[0])
+        except ValueError:
+            # Packets without a timestamp are reported as 'N/A'
+            continue
+        if timestamps and pts_time < timestamps[-1]:
+            is_sorted = False
+        timestamps.append(pts_time)
+    if pipe.wait() != 0:
+        return None
+    if not is_sorted:
+        timestamps = array('d', sorted(set(timestamps)))
+    return timestamps
+
+
+def _cache_key(path, stream, read_intervals):
+    stat = os.stat(path)
+    return "{}|{}|{}|{}|{}".format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stream, read_intervals or '')
+
+
+def prune_cache_directory(cache_directory, max_bytes=DISK_CACHE_MAX_BYTES, max_age=DISK_CACHE_MAX_AGE):
+    """
+    Remove keyframe index files from a cache directory that have not been used for 'max_age' seconds, then remove the
+    least recently used files until the directory holds at most 'max_bytes'.
+    Returns the number of files removed.
+
+    :param cache_directory:
+    :param max_bytes:
+    :param max_age:
+    :return:
+    """
+    cache_files = []
+    try:
+        with os.scandir(cache_directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.kfi'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                cache_files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return 0
+
+    # Oldest first
+    cache_files.sort()
+    expire_before = time.time() - max_age
+    total_bytes = sum(size for _, size, _ in cache_files)
+    removed = 0
+    for mtime, size, cache_file in cache_files:
+        if mtime >= expire_before and total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(cache_file)
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+    return removed
+
+
+def _maybe_prune_cache_directory(cache_directory):
+    now = time.time()
+    with _cache_lock:
+        if (now - _last_prune.get(cache_directory, 0)) < DISK_CACHE_PRUNE_INTERVAL:
+            return
+        _last_prune[cache_directory] = now
+    prune_cache_directory(cache_directory)
+
+
+def get_keyframe_index(path, stream='v:0', read_intervals=None, cache_directory=None):
+    """
+    Returns a KeyframeIndex for a stream of the given file.
+    Indexes are cached in memory and, if a cache directory is given, on disk.
+    Cached indexes are invalidated when the file size or modification time changes.
+    The cache directory is kept within DISK_CACHE_MAX_BYTES and DISK_CACHE_MAX_AGE (see prune_cache_directory()).
+    Returns None if the keyframes could not be read.
+
+    :param path:
+    :param stream:
+    :param read_intervals:
+    :param cache_directory:
+    :return:
+    """
+    try:
+        key = _cache_key(path, stream, read_intervals)
+    except OSError:
+        return None
+
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    cache_file = None
+    timestamps = None
+    if cache_directory:
+        cache_file = os.path.join(cache_directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.kfi')
+        if os.path.exists(cache_file):
+            try:
+                timestamps = array('d')
+                with open(cache_file, 'rb') as f:
+                    timestamps.frombytes(f.read())
+            except (OSError, ValueError):
+                timestamps = None
+            else:
+                # Mark the index as recently used
+                try:
+                    os.utime(cache_file)
+                except OSError:
+                    pass
+
+    if timestamps is None:
+        timestamps = extract_keyframes(path, stream=stream, read_intervals=read_intervals)
+        if timestamps is None:
+            return None
+        if cache_file:
+            try:
+                os.makedirs(cache_directory, exist_ok=True)
+                with open(cache_file + '.tmp', 'wb') as f:
+                    timestamps.tofile(f)
+                os.replace(cache_file + '.tmp', cache_file)
+            except OSError:
+                pass
+            _maybe_prune_cache_directory(cache_directory)
+
+    index = KeyframeIndex(timestamps)
+    with _cache_lock:
+        _memory_cache[key] = index
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return index
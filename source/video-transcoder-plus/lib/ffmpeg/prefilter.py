@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.prefilter.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (7:40 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+"""
+    Notes:
+        A cheap pre-filter for library file tests that runs before a file is probed.
+        It only uses the file name and a single stat() of the file:
+            - extension     - The extension must map to an allowed mimetype (including the MimetypeOverrides)
+            - size          - The file must be at least 'min_size' bytes
+            - unchanged     - If the plugin settings are given, the verdict stored in the plugin's DecisionCache is
+                              reused while the file, settings and plugin version are unchanged
+
+        The number of files rejected by each stage is counted per plugin (see 'get_stats()'). Stored verdicts are
+        counted by the DecisionCache (see 'decision_cache.get_stats()').
+
+"""
+import mimetypes
+import os
+import threading
+
+from .decision_cache import DecisionCache
+from .probe import _init_mimetypes
+
+# Files smaller than this can not contain anything worth probing (eg. placeholders or interrupted copies)
+MIN_FILE_SIZE = 65536
+
+_lock = threading.Lock()
+_stats = {}
+_extension_cache = {}
+
+
+def _count(plugin_id, key):
+    with _lock:
+        counters = _stats.setdefault(plugin_id, {
+            'rejected_extension': 0,
+            'rejected_size':      0,
+        })
+        counters[key] += 1
+
+
+def get_stats(plugin_id=None):
+    """
+    Returns a copy of the pre-filter counters of a plugin (or of all plugins) in this process
+
+    :param plugin_id:
+    :return:
+    """
+    with _lock:
+        if plugin_id is not None:
+            return dict(_stats.get(plugin_id, {}))
+        return {key: dict(value) for key, value in _stats.items()}
+
+
+def extension_allowed(path, allowed_mimetypes):
+    """
+    Check if the extension of a file maps to one of the allowed mimetype categories (eg. 'video')
+
+    :param path:
+    :param allowed_mimetypes:
+    :return:
+    """
+    extension = os.path.splitext(path)[1].lower()
+    key = (extension, tuple(allowed_mimetypes))
+    allowed = _extension_cache.get(key)
+    if allowed is None:
+        _init_mimetypes()
+        file_type = mimetypes.guess_type('file' + extension)[0] if extension else None
+        allowed = bool(file_type) and file_type.split('/')[0] in allowed_mimetypes
+        _extension_cache[key] = allowed
+    return allowed
+
+
+class PreFilter(object):
+    """
+    PreFilter
+
+    Usage in a file test runner:
+        prefilter = PreFilter('my_plugin_id', ['video'], settings=settings, library_id=data.get('library_id'))
+        rejected, verdict = prefilter.check(abspath)
+        if rejected:
+            return
+        if verdict is None:
+            needs_processing = ...  # Probe and test the file
+            prefilter.store(abspath, needs_processing)
+        else:
+            needs_processing = verdict.needs_processing
+    """
+
+    def __init__(self, plugin_id, allowed_mimetypes, min_size=MIN_FILE_SIZE, settings=None, library_id=None):
+        self.plugin_id = plugin_id
+        self.allowed_mimetypes = allowed_mimetypes
+        self.min_size = min_size
+        self.cache = DecisionCache(settings, library_id=library_id) if settings is not None else None
+        self.__fingerprint = None
+
+    def check(self, path):
+        """
+        Run the pre-filter stages for a file.
+        Returns a (rejected, verdict) tuple:
+            rejected    - True if the file can not be something this plugin processes. Do not probe it.
+            verdict     - The stored Verdict if the file is unchanged since it was last tested, otherwise None.
+
+        :param path:
+        :return:
+        """
+        self.__fingerprint = None
+        if not extension_allowed(path, self.allowed_mimetypes):
+            _count(self.plugin_id, 'rejected_extension')
+            return True, None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            _count(self.plugin_id, 'rejected_size')
+            return True, None
+        if stat.st_size < self.min_size:
+            _count(self.plugin_id, 'rejected_size')
+            return True, None
+        self.__fingerprint = (stat.st_size, stat.st_mtime_ns)
+
+        if self.cache is None:
+            return False, None
+        return False, self.cache.get(path, fingerprint=self.__fingerprint)
+
+    def store(self, path, needs_processing, forced_encode=False):
+        """
+        Store the verdict of a file test for the state of the file when it was checked
+
+        :param path:
+        :param needs_processing:
+        :param forced_encode:
+        :return:
+        """
+        if self.cache is None or self.__fingerprint is None:
+            return
+        self.cache.set(path, needs_processing, forced_encode=forced_encode, fingerprint=self.__fingerprint)
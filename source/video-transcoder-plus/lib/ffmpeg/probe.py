@@ -21,15 +21,38 @@
         If not, see <https://www.gnu.org/licenses/>.
 
 """
+import asyncio
 import json
 import mimetypes
 import os
-import shutil
-import subprocess
+import threading
+from collections import OrderedDict
 from logging import Logger
 
+from . import runner, spans
 from .mimetype_overrides import MimetypeOverrides
 
+# Number of probe results held in memory. These are shared by every plugin that uses this package.
+PROBE_CACHE_SIZE = 64
+
+# Transfer characteristics of HDR video (PQ and HLG)
+HDR_COLOR_TRANSFERS = ['smpte2084', 'arib-std-b67']
+
+# Probe budgets tried by 'ffprobe_file()', smallest first. Files on network mounts are often much slower to read
+# than to decode, so most files are probed with a small budget and only escalated when required fields are missing.
+#   probesize:       Maximum bytes read to detect the streams
+#   analyzeduration: Maximum duration (microseconds) of the stream analysed to fill in the stream info
+PROBE_BUDGETS = (
+    {'probesize': 1000000, 'analyzeduration': 1000000},
+    # FFprobe's defaults
+    {'probesize': 5000000, 'analyzeduration': 5000000},
+    {'probesize': 50000000, 'analyzeduration': 30000000},
+)
+
+_lock = threading.Lock()
+_probe_cache = OrderedDict()
+_mimetypes_initialised = False
+
 
 class FFProbeError(Exception):
     """
@@ -43,18 +66,15 @@ class FFProbeError(Exception):
         self.info = info
 
 
-def ffprobe_cmd(params):
+def _read_ffprobe_output(command, returncode, out):
     """
-    Execute a ffprobe command subprocess and read the output
+    Check the output of a ffprobe command and return it as text
 
-    :param params:
+    :param command:
+    :param returncode:
+    :param out:
     :return:
     """
-    command = ["ffprobe"] + params
-
-    pipe = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    out, err = pipe.communicate()
-
     # Check for results
     try:
         raw_output = out.decode("utf-8")
@@ -66,7 +86,7 @@ def ffprobe_cmd(params):
             info = json.loads(raw_output)
         except Exception as e:
             raise FFProbeError(command, raw_output)
-    if pipe.returncode == 1:
+    if returncode == 1:
         raise FFProbeError(command, raw_output)
     if not raw_output:
         raise FFProbeError(command, 'No info found')
@@ -74,18 +94,47 @@ def ffprobe_cmd(params):
     return raw_output
 
 
-def ffprobe_file(vid_file_path):
+def ffprobe_cmd(params):
     """
-    Returns a dictionary result from ffprobe command line prove of a file
+    Execute a ffprobe command subprocess and read the output
 
-    :param vid_file_path: The absolute (full) path of the video file, string.
+    :param params:
     :return:
     """
+    command = ["ffprobe"] + params
+
+    returncode, out = runner.run(command)
+    return _read_ffprobe_output(command, returncode, out)
+
+
+async def async_ffprobe_cmd(params):
+    """
+    Asyncio version of 'ffprobe_cmd()'
+
+    :param params:
+    :return:
+    """
+    command = ["ffprobe"] + params
+
+    returncode, out = await runner.run_async(command)
+    return _read_ffprobe_output(command, returncode, out)
+
+
+def _ffprobe_file_params(vid_file_path, budget=None, read_intervals=None):
     if type(vid_file_path) != str:
         raise Exception('Give ffprobe a full file path of the video')
 
     params = [
         "-loglevel", "quiet",
+    ]
+    if budget:
+        params += [
+            "-probesize", str(budget['probesize']),
+            "-analyzeduration", str(budget['analyzeduration']),
+        ]
+    if read_intervals:
+        params += ["-read_intervals", read_intervals]
+    return params + [
         "-print_format", "json",
         "-show_format",
         "-show_streams",
@@ -94,16 +143,163 @@ def ffprobe_file(vid_file_path):
         vid_file_path
     ]
 
-    # Check result
-    results = ffprobe_cmd(params)
+
+def probe_missing_fields(info):
+    """
+    Returns a list of the fields that a probe is missing and that a bigger probe budget may find.
+    An empty list means that the probe is complete.
+
+    :param info:
+    :return:
+    """
+    missing = []
+    probe_format = info.get('format', {})
+    streams = info.get('streams', [])
+    format_name = probe_format.get('format_name', '')
+    # Still images do not have a duration
+    if not probe_format.get('duration') and 'image2' not in format_name and not format_name.endswith('_pipe'):
+        missing.append('format.duration')
+    if probe_format.get('nb_streams') is not None and int(probe_format.get('nb_streams')) > len(streams):
+        missing.append('streams')
+    for stream in streams:
+        codec_type = stream.get('codec_type')
+        if codec_type == 'video' and not stream.get('disposition', {}).get('attached_pic'):
+            required = ('pix_fmt', 'width', 'height')
+        elif codec_type == 'audio':
+            required = ('channels', 'sample_rate')
+        else:
+            required = ()
+        for field in required:
+            if not stream.get(field) or stream.get(field) == '0':
+                missing.append('streams.{}.{}'.format(stream.get('index'), field))
+    return missing
+
+
+def _get_cached_probe(vid_file_path):
+    """
+    Returns the cache key of a file and its cached ffprobe output (if the file has not changed since it was probed)
+
+    :param vid_file_path:
+    :return:
+    """
+    try:
+        stat = os.stat(vid_file_path)
+        cache_key = (vid_file_path, stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None, None
+    with _lock:
+        results = _probe_cache.get(cache_key)
+        if results is not None:
+            _probe_cache.move_to_end(cache_key)
+    return cache_key, results
+
+
+def _parse_probe_results(vid_file_path, results):
     try:
-        info = json.loads(results)
+        return json.loads(results)
     except Exception as e:
         raise FFProbeError(vid_file_path, str(e))
 
+
+def _cache_probe(cache_key, results):
+    if not cache_key:
+        return
+    with _lock:
+        _probe_cache[cache_key] = results
+        _probe_cache.move_to_end(cache_key)
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+
+
+def ffprobe_file(vid_file_path, budgets=None, read_intervals=None):
+    """
+    Returns a dictionary result from ffprobe command line prove of a file
+
+    The file is first probed with the smallest of the given probe budgets (default: PROBE_BUDGETS). Bigger budgets
+    are only tried if the result is missing required fields (see 'probe_missing_fields()').
+
+    :param vid_file_path: The absolute (full) path of the video file, string.
+    :param budgets: List of probe budgets ({'probesize': bytes, 'analyzeduration': microseconds}) to try in order.
+    :param read_intervals: Optional '-read_intervals' value. Limits the packets/frames read by ffprobe.
+    :return:
+    """
+    budgets = PROBE_BUDGETS if budgets is None else budgets
+
+    # Use the cached result if the file has not changed since it was probed
+    cache_key, results = _get_cached_probe(vid_file_path)
+    if results is not None:
+        return _parse_probe_results(vid_file_path, results)
+
+    for budget in (budgets or [None]):
+        results = ffprobe_cmd(_ffprobe_file_params(vid_file_path, budget, read_intervals))
+        info = _parse_probe_results(vid_file_path, results)
+        if not probe_missing_fields(info):
+            break
+    _cache_probe(cache_key, results)
+    return info
+
+
+async def async_ffprobe_file(vid_file_path, budgets=None, read_intervals=None):
+    """
+    Asyncio version of 'ffprobe_file()'
+
+    :param vid_file_path: The absolute (full) path of the video file, string.
+    :param budgets:
+    :param read_intervals:
+    :return:
+    """
+    budgets = PROBE_BUDGETS if budgets is None else budgets
+
+    cache_key, results = _get_cached_probe(vid_file_path)
+    if results is not None:
+        return _parse_probe_results(vid_file_path, results)
+
+    for budget in (budgets or [None]):
+        results = await async_ffprobe_cmd(_ffprobe_file_params(vid_file_path, budget, read_intervals))
+        info = _parse_probe_results(vid_file_path, results)
+        if not probe_missing_fields(info):
+            break
+    _cache_probe(cache_key, results)
     return info
 
 
+def ffprobe_files(file_paths):
+    """
+    Probe a list of files concurrently.
+    Returns a dictionary of the probe of each file (None for files that could not be probed).
+
+    :param file_paths:
+    :return:
+    """
+
+    async def probe_all():
+        results = await asyncio.gather(*[async_ffprobe_file(path) for path in file_paths], return_exceptions=True)
+        return {
+            path: (None if isinstance(result, Exception) else result) for path, result in zip(file_paths, results)
+        }
+
+    return runner.run_coroutine(probe_all())
+
+
+def _init_mimetypes():
+    """
+    Init (reset) the mimetype list and add the mimetype overrides to it (replacing any existing entries).
+    This is only done once per process.
+
+    :return:
+    """
+    global _mimetypes_initialised
+    with _lock:
+        if _mimetypes_initialised:
+            return
+        mimetypes.init()
+        mimetype_overrides = MimetypeOverrides()
+        all_mimetype_overrides = mimetype_overrides.get_all()
+        for extension in all_mimetype_overrides:
+            mimetypes.add_type(all_mimetype_overrides.get(extension), extension)
+        _mimetypes_initialised = True
+
+
 class Probe(object):
     """
     Probe
@@ -111,24 +307,19 @@ class Probe(object):
 
     probe_info = {}
 
-    def __init__(self, logger: Logger, allowed_mimetypes=None):
+    def __init__(self, logger: Logger, allowed_mimetypes=None, budgets=None):
         # Ensure ffprobe is installed
-        if shutil.which('ffprobe') is None:
+        if runner.which('ffprobe') is None:
             raise Exception("Unable to find executable 'ffprobe'. Please ensure that FFmpeg is installed correctly.")
 
         self.logger = logger
         if allowed_mimetypes is None:
             allowed_mimetypes = ['audio', 'video', 'image']
         self.allowed_mimetypes = allowed_mimetypes
+        self.budgets = budgets
 
-        # Init (reset) our mimetype list
-        mimetypes.init()
-
-        # Add mimetype overrides to mimetype dictionary (replaces any existing entries)
-        mimetype_overrides = MimetypeOverrides()
-        all_mimetype_overrides = mimetype_overrides.get_all()
-        for extension in all_mimetype_overrides:
-            mimetypes.add_type(all_mimetype_overrides.get(extension), extension)
+        # Add the mimetype overrides to the mimetype list
+        _init_mimetypes()
 
     def __test_valid_mimetype(self, file_path):
         """
@@ -187,6 +378,7 @@ class Probe(object):
         data['shared_info']['ffprobe'] = probe.get_probe()
         return probe
 
+    @spans.span('Probe.file')
     def file(self, file_path):
         """
         Sets the 'probe' dict by probing the given file path.
@@ -207,7 +399,7 @@ class Probe(object):
 
         try:
             # Get the file probe info
-            self.probe_info = ffprobe_file(file_path)
+            self.probe_info = ffprobe_file(file_path, budgets=self.budgets)
             return True
         except FFProbeError:
             # This will only happen if it was not a file that could be probed.
@@ -233,3 +425,69 @@ class Probe(object):
     def get(self, key, default=None):
         """Return the value of the given key from the probe dictionary"""
         return self.probe_info.get(key, default)
+
+    def get_video_stream_pix_fmt(self, default=None):
+        """Return the pixel format of the first video stream (ignoring cover art)"""
+        for stream in self.probe_info.get('streams', []):
+            if stream.get('codec_type') != 'video' or stream.get('disposition', {}).get('attached_pic'):
+                continue
+            if stream.get('pix_fmt'):
+                return stream.get('pix_fmt')
+        return default
+
+    def __first_video_stream(self):
+        for stream in self.probe_info.get('streams', []):
+            if stream.get('codec_type') == 'video' and not stream.get('disposition', {}).get('attached_pic'):
+                return stream
+        return {}
+
+    def is_hdr_source(self):
+        """Return True if the first video stream (ignoring cover art) is HDR (PQ or HLG transfer)"""
+        return self.__first_video_stream().get('color_transfer') in HDR_COLOR_TRANSFERS
+
+    def get_color_tags(self):
+        """
+        Return the colour tags of the first video stream (ignoring cover art) as FFmpeg option names.
+        Tags that are not set on the stream are left out.
+        """
+        stream = self.__first_video_stream()
+        color_tags = {}
+        for option, key in [('color_primaries', 'color_primaries'), ('color_trc', 'color_transfer'),
+                            ('colorspace', 'color_space'), ('color_range', 'color_range')]:
+            value = stream.get(key)
+            if value and value != 'unknown':
+                color_tags[option] = value
+        return color_tags
+
+    def get_hdr_static_metadata(self):
+        """
+        Return the static HDR metadata of the first video stream (ignoring cover art) in the form used by x265.
+            master_display  - 'G(x,y)B(x,y)R(x,y)WP(x,y)L(max,min)' (chromaticity in 0.00002, luminance in 0.0001)
+            max_cll         - (MaxCLL, MaxFALL)
+        Metadata that is not present in the stream side data is left out.
+        """
+
+        def rational(value):
+            numerator, _, denominator = str(value).partition('/')
+            return float(numerator) / float(denominator or 1)
+
+        metadata = {}
+        for side_data in self.__first_video_stream().get('side_data_list', []):
+            side_data_type = side_data.get('side_data_type')
+            try:
+                if side_data_type == 'Mastering display metadata':
+                    chromaticity = ''.join(
+                        '{}({},{})'.format(name, round(rational(side_data['{}_x'.format(key)]) * 50000),
+                                           round(rational(side_data['{}_y'.format(key)]) * 50000))
+                        for name, key in [('G', 'green'), ('B', 'blue'), ('R', 'red'), ('WP', 'white_point')]
+                    )
+                    metadata['master_display'] = '{}L({},{})'.format(
+                        chromaticity,
+                        round(rational(side_data['max_luminance']) * 10000),
+                        round(rational(side_data['min_luminance']) * 10000),
+                    )
+                elif side_data_type == 'Content light level metadata':
+                    metadata['max_cll'] = (int(side_data['max_content']), int(side_data['max_average']))
+            except (KeyError, ValueError, ZeroDivisionError):
+                self.logger.debug("Ignoring incomplete '{}' side data".format(side_data_type))
+        return metadata
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.runner.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (4:10 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+"""
+    Notes:
+        Every ffmpeg/ffprobe/nvidia-smi subprocess started by a plugin goes through this module.
+        For each command family it records the number of runs, the wall time, the CPU time of the child process,
+        the exit codes and the number of output bytes. The counters are grouped by the runner (hook) and the file
+        that the subprocess was started for (see 'track_runner').
+
+        The CPU time is read from 'resource.getrusage(RUSAGE_CHILDREN)'. This covers all children of the Unmanic
+        process, so subprocesses started at the same time by other workers may be counted against each other.
+
+        Commands can also be run with asyncio ('run_async'/'gather'), so that I/O bound commands (eg. probing files
+        on a network mount) overlap. At most MAX_CONCURRENT_COMMANDS of these run at once in each event loop.
+        'run_coroutine' runs a coroutine from a (synchronous) runner function.
+
+        Set the environment variable 'UNMANIC_PLUGIN_SUBPROCESS_STATS' to a file path to have the counters (and the
+        timing span histograms and pre-filter counters) written to that path as JSON after every runner call.
+
+"""
+import asyncio
+import functools
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from . import spans
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+STATS_FILE_ENV = 'UNMANIC_PLUGIN_SUBPROCESS_STATS'
+
+# Number of commands run at once by 'gather' (per event loop)
+MAX_CONCURRENT_COMMANDS = 4
+
+# Number of files that counters are kept for. The oldest files are dropped first. Per-hook totals are always kept.
+MAX_TRACKED_FILES = 500
+
+_lock = threading.Lock()
+_context = threading.local()
+_executables = {}
+_semaphores = weakref.WeakKeyDictionary()
+_hook_totals = {}
+_file_stats = OrderedDict()
+
+
+def which(executable):
+    """
+    Returns the path of an executable like shutil.which(). Found executables are remembered for the process.
+
+    :param executable:
+    :return:
+    """
+    path = _executables.get(executable)
+    if path is None:
+        path = shutil.which(executable)
+        if path is not None:
+            _executables[executable] = path
+    return path
+
+
+def _child_cpu_seconds():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def command_family(command):
+    """
+    Returns the name a command is counted under. Python scripts are counted by the script name.
+
+    :param command:
+    :return:
+    """
+    if not command:
+        return 'unknown'
+    family = os.path.basename(str(command[0]))
+    if family.startswith('python') and len(command) > 1:
+        family = os.path.basename(str(command[1]))
+    return family
+
+
+def _new_counter():
+    return {
+        'runs':          0,
+        'wall_seconds':  0.0,
+        'cpu_seconds':   0.0,
+        'output_bytes':  0,
+        'failures':      0,
+        'exit_codes':    {},
+    }
+
+
+def _add(counters, family, wall_seconds, cpu_seconds, returncode, output_bytes):
+    counter = counters.setdefault(family, _new_counter())
+    counter['runs'] += 1
+    counter['wall_seconds'] += wall_seconds
+    counter['cpu_seconds'] += cpu_seconds
+    counter['output_bytes'] += output_bytes
+    if returncode != 0:
+        counter['failures'] += 1
+    code = str(returncode)
+    counter['exit_codes'][code] = counter['exit_codes'].get(code, 0) + 1
+
+
+def _record(command, wall_seconds, cpu_seconds, returncode, output_bytes):
+    family = command_family(command)
+    hook = getattr(_context, 'hook', None) or 'untracked'
+    path = getattr(_context, 'path', None)
+    with _lock:
+        _add(_hook_totals.setdefault(hook, {}), family, wall_seconds, cpu_seconds, returncode, output_bytes)
+        if path:
+            if path not in _file_stats:
+                _file_stats[path] = {}
+                while len(_file_stats) > MAX_TRACKED_FILES:
+                    _file_stats.popitem(last=False)
+            _add(_file_stats[path].setdefault(hook, {}), family, wall_seconds, cpu_seconds, returncode,
+                 output_bytes)
+    calls = getattr(_context, 'calls', None)
+    if calls is not None:
+        _add(calls, family, wall_seconds, cpu_seconds, returncode, output_bytes)
+
+
+def run(command, stderr=subprocess.STDOUT, timeout=None):
+    """
+    Run a command to completion and return its exit code and output (bytes).
+    Raises FileNotFoundError if the executable is not installed and subprocess.TimeoutExpired on timeout.
+
+    :param command:
+    :param stderr:
+    :param timeout:
+    :return:
+    """
+    start_cpu = _child_cpu_seconds()
+    start = time.perf_counter()
+    pipe = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+    try:
+        out, _ = pipe.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        pipe.kill()
+        pipe.communicate()
+        _record(command, time.perf_counter() - start, _child_cpu_seconds() - start_cpu, pipe.returncode, 0)
+        raise
+    _record(command, time.perf_counter() - start, _child_cpu_seconds() - start_cpu, pipe.returncode, len(out))
+    return pipe.returncode, out
+
+
+def check_output(command, timeout=None):
+    """
+    Run a command and return its output decoded as text (stderr included).
+    Raises subprocess.CalledProcessError if it exits with an error, like subprocess.check_output().
+
+    :param command:
+    :param timeout:
+    :return:
+    """
+    returncode, out = run(command, timeout=timeout)
+    output = out.decode('utf-8', errors='replace')
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command, output=output)
+    return output
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENT_COMMANDS)
+    return semaphore
+
+
+async def run_async(command, stderr=subprocess.STDOUT, timeout=None):
+    """
+    Asyncio version of 'run()'. Waits for a free slot if MAX_CONCURRENT_COMMANDS are already running.
+
+    :param command:
+    :param stderr:
+    :param timeout:
+    :return:
+    """
+    async with _semaphore():
+        start_cpu = _child_cpu_seconds()
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            out, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.communicate()
+            _record(command, time.perf_counter() - start, _child_cpu_seconds() - start_cpu, process.returncode, 0)
+            raise subprocess.TimeoutExpired(command, timeout)
+        _record(command, time.perf_counter() - start, _child_cpu_seconds() - start_cpu, process.returncode, len(out))
+        return process.returncode, out
+
+
+async def gather(commands, stderr=subprocess.STDOUT, timeout=None):
+    """
+    Run a list of commands concurrently. Returns the (exit code, output) of each command in the same order.
+
+    :param commands:
+    :param stderr:
+    :param timeout:
+    :return:
+    """
+    return await asyncio.gather(*[run_async(command, stderr=stderr, timeout=timeout) for command in commands])
+
+
+def run_coroutine(coroutine):
+    """
+    Run a coroutine to completion from synchronous code and return its result.
+    If this thread is already running an event loop, the coroutine is run in a new thread with its own loop.
+
+    :param coroutine:
+    :return:
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_with_context(coroutine, _context_values()))
+
+    result = {}
+    context_values = _context_values()
+
+    def target():
+        try:
+            result['value'] = asyncio.run(_with_context(coroutine, context_values))
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
+
+
+def _context_values():
+    return {name: getattr(_context, name, None) for name in ('hook', 'path', 'calls')}
+
+
+async def _with_context(coroutine, context_values):
+    # Keep counting subprocesses against the calling runner if the coroutine is run in another thread
+    for name, value in context_values.items():
+        setattr(_context, name, value)
+    return await coroutine
+
+
+class StreamingCommand(object):
+    """
+    A command whose output is read line by line while it runs.
+    The run is recorded when 'wait()' is called.
+    """
+
+    def __init__(self, command, stderr=subprocess.DEVNULL):
+        self.command = command
+        self.returncode = None
+        self.__output_bytes = 0
+        self.__start_cpu = _child_cpu_seconds()
+        self.__start = time.perf_counter()
+        self.__pipe = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+
+    def __iter__(self):
+        for line in self.__pipe.stdout:
+            self.__output_bytes += len(line)
+            yield line
+
+    def wait(self):
+        self.returncode = self.__pipe.wait()
+        _record(self.command, time.perf_counter() - self.__start, _child_cpu_seconds() - self.__start_cpu,
+                self.returncode, self.__output_bytes)
+        return self.returncode
+
+
+def _runner_path(data):
+    if not isinstance(data, dict):
+        return None
+    return data.get('path') or data.get('file_in') or data.get('source_data', {}).get('abspath')
+
+
+def format_counters(counters):
+    """
+    Returns a one line summary of a set of counters
+
+    :param counters:
+    :return:
+    """
+    if not counters:
+        return 'no subprocesses'
+    return ', '.join(
+        "{} x{} ({:.3f}s wall, {:.3f}s cpu, {} bytes, {} failed)".format(
+            family, c['runs'], c['wall_seconds'], c['cpu_seconds'], c['output_bytes'], c['failures'])
+        for family, c in sorted(counters.items())
+    )
+
+
+def track_runner(logger):
+    """
+    Decorator for plugin runner functions.
+    Counts the subprocesses started during the call against the runner and the file it was called for, and times
+    the call and its spans. Then logs a summary of them to the plugin logger (debug).
+
+    :param logger:
+    :return:
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(data, *args, **kwargs):
+            previous = (getattr(_context, 'hook', None), getattr(_context, 'path', None),
+                        getattr(_context, 'calls', None))
+            path = _runner_path(data)
+            _context.hook = function.__name__
+            _context.path = path
+            _context.calls = {}
+            span_calls = {}
+            try:
+                with spans.hook_span(function.__name__, path) as span_calls:
+                    return function(data, *args, **kwargs)
+            finally:
+                calls = _context.calls
+                _context.hook, _context.path, _context.calls = previous
+                if calls:
+                    logger.debug("Subprocesses run by %s for '%s': %s", function.__name__, path,
+                                 format_counters(calls))
+                logger.debug("Spans of %s for '%s': %s", function.__name__, path, spans.format_spans(span_calls))
+                if span_calls.get('profile'):
+                    logger.debug("Saved a profile of %s for '%s' to '%s'", function.__name__, path,
+                                 span_calls['profile'])
+                stats_file = os.environ.get(STATS_FILE_ENV)
+                if stats_file:
+                    dump_json(stats_file)
+
+        return wrapper
+
+    return decorator
+
+
+def get_stats():
+    """
+    Returns a copy of all counters:
+        hooks   - counters per runner
+        files   - counters per file, then per runner
+
+    :return:
+    """
+    with _lock:
+        return json.loads(json.dumps({'hooks': _hook_totals, 'files': _file_stats}))
+
+
+def dump_json(path):
+    """
+    Write all counters and span histograms to a JSON file
+
+    :param path:
+    :return:
+    """
+    stats = get_stats()
+    from . import decision_cache, prefilter
+    stats['spans'] = spans.get_histograms()
+    stats['prefilter'] = prefilter.get_stats()
+    stats['decision_cache'] = decision_cache.get_stats()
+    stats['pid'] = os.getpid()
+    tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def reset():
+    """
+    Clear all counters
+
+    :return:
+    """
+    with _lock:
+        _hook_totals.clear()
+        _file_stats.clear()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.filtergraph.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (2:05 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# Filters that never change the pixel format or the colour params of a frame.
+# A format/setparams node that follows one of these filters still sees the frame as the previous node left it.
+FORMAT_PRESERVING_FILTERS = (
+    'crop',
+    'fps',
+    'null',
+    'setdar',
+    'setpts',
+    'setsar',
+    'settb',
+)
+
+# Hardware frame formats. Frames in these formats are not in the source pixel format.
+HW_PIX_FMTS = ('cuda', 'qsv', 'vaapi')
+
+
+def normalise_pix_fmt(pix_fmt):
+    """
+    Returns a pixel format name that can be compared with another.
+    FFmpeg accepts both 'yuv420p10' and 'yuv420p10le' for the native little-endian formats.
+
+    :param pix_fmt:
+    :return:
+    """
+    pix_fmt = (pix_fmt or '').strip().lower()
+    if pix_fmt.endswith('le'):
+        pix_fmt = pix_fmt[:-2]
+    return pix_fmt
+
+
+def _parse_size_args(args, keys):
+    """
+    Read the width and height from the positional or named args of a crop/scale filter.
+    Returns None for any value that is not a plain integer (eg. an expression).
+
+    :param args:
+    :param keys:
+    :return:
+    """
+    values = {}
+    for position, arg in enumerate(args.split(':')):
+        key, sep, value = arg.partition('=')
+        if not sep:
+            key, value = (keys[position] if position < len(keys) else None), arg
+        values[key] = value
+    size = []
+    for key in keys[:2]:
+        try:
+            size.append(int(values.get(key)))
+        except (TypeError, ValueError):
+            size.append(None)
+    return size
+
+
+def _even(value):
+    """Round a dimension to the nearest even number (required by 4:2:0 pixel formats)"""
+    return max(2, int(round(value / 2.0)) * 2)
+
+
+def plan_crop_and_scale(source_width, source_height, crop_value=None, target_width=None, target_height=None):
+    """
+    Work out the exact geometry of the crop and scale smart filters.
+
+    Returns a tuple of (crop, scale):
+        crop    - (width, height, x, y) or None if no crop is needed
+        scale   - (width, height) or None if no scale is needed
+
+    The scale size is computed from the cropped size, so the scaler is given both dimensions and never has to
+    derive (possibly odd) dimensions itself. A crop that keeps the full frame is dropped. A scale is only kept if
+    the cropped frame is still larger than the target width (or target height).
+
+    :param source_width:
+    :param source_height:
+    :param crop_value:      FFmpeg crop value 'w:h:x:y'
+    :param target_width:
+    :param target_height:
+    :return:
+    """
+    width, height = int(source_width), int(source_height)
+    crop = None
+    if crop_value:
+        crop_w, crop_h, crop_x, crop_y = [int(v) for v in str(crop_value).split(':')]
+        if (crop_w, crop_h) != (width, height):
+            crop = (crop_w, crop_h, crop_x, crop_y)
+            width, height = crop_w, crop_h
+
+    scale = None
+    target_width = int(target_width or 0)
+    target_height = int(target_height or 0)
+    if target_width and width > target_width:
+        scale = (target_width, _even(height * target_width / width))
+    elif target_height and height > target_height:
+        scale = (_even(width * target_height / height), target_height)
+    return crop, scale
+
+
+def split_filter_chain(chain):
+    """
+    Split a filter chain string on the commas that separate its filters.
+    Commas that are quoted or escaped belong to a filter's args and are not split on.
+
+    :param chain:
+    :return:
+    """
+    filters = []
+    current = ''
+    quoted = False
+    escaped = False
+    for char in chain:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == '\\':
+            current += char
+            escaped = True
+        elif char == "'":
+            current += char
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            filters.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        filters.append(current.strip())
+    return [f for f in filters if f]
+
+
+class FilterNode(object):
+    """
+    FilterNode
+
+    A single filter in a chain. Eg. 'format=nv12' has the name 'format' and the args 'nv12'.
+    A node is opaque if it can not be safely merged into a linear chain (eg. it contains its own pads or chains).
+    """
+
+    def __init__(self, filter_string):
+        self.filter_string = filter_string.strip()
+        name, _, args = self.filter_string.partition('=')
+        self.name = name.strip()
+        self.args = args
+        self.opaque = any(c in self.filter_string for c in '[];')
+
+    def output_size(self, input_size):
+        """
+        Returns the frame size after this filter for the given input size.
+        Returns None if the size can not be determined.
+
+        :param input_size:
+        :return:
+        """
+        if self.name in FORMAT_PRESERVING_FILTERS and self.name != 'crop':
+            return input_size
+        if self.name == 'crop':
+            width, height = _parse_size_args(self.args, ['w', 'h'])
+            if width and height:
+                return width, height
+            return None
+        if self.name == 'scale' and input_size:
+            width, height = _parse_size_args(self.args, ['w', 'h'])
+            src_width, src_height = input_size
+            if width and width > 0 and height and height > 0:
+                return width, height
+            if width and width > 0 and height in (-1, -2):
+                return width, int(src_height * width / src_width)
+            if height and height > 0 and width in (-1, -2):
+                return int(src_width * height / src_height), height
+        return None
+
+    def __eq__(self, other):
+        return isinstance(other, FilterNode) and self.filter_string == other.filter_string
+
+    def __hash__(self):
+        return hash(self.filter_string)
+
+    def __repr__(self):
+        return "FilterNode({})".format(self.filter_string)
+
+
+class FilterGraph(object):
+    """
+    FilterGraph
+
+    A linear filtergraph for one video stream.
+    Filters are added as nodes, redundant format/setparams nodes are removed and the graph is rendered to a single
+    filter chain for '-filter_complex'.
+    """
+
+    def __init__(self, input_label, source_pix_fmt=None, source_size=None):
+        self.input_label = input_label
+        # Pixel format and size of the frames entering the graph (if known)
+        self.source_pix_fmt = source_pix_fmt
+        self.source_size = source_size
+        self.nodes = []
+
+    def add(self, filter_chain):
+        """
+        Add a filter or a comma separated chain of filters to the end of the graph
+
+        :param filter_chain:
+        :return:
+        """
+        if any(c in filter_chain for c in '[];'):
+            # Keep chains with their own pads or multiple chains whole
+            self.nodes.append(FilterNode(filter_chain))
+            return
+        for filter_string in split_filter_chain(filter_chain):
+            self.nodes.append(FilterNode(filter_string))
+
+    def __move_format_conversions(self):
+        """
+        Move software pixel format conversions to the point in the chain with the fewest pixels.
+        A 'format' node is moved past any crop that follows it, and past a scale that does not increase the
+        number of pixels. Placed after a scale, the conversion is also done by the scale itself in a single pass.
+        A scale that upscales keeps the conversion ahead of it, where the frames are still smaller.
+
+        :return:
+        """
+        nodes = list(self.nodes)
+        size = self.source_size
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            if node.opaque:
+                size = None
+            elif node.name == 'format' and '|' not in node.args:
+                position = i
+                current_size = size
+                while position + 1 < len(nodes):
+                    next_node = nodes[position + 1]
+                    if next_node.opaque or next_node.name not in ('crop', 'scale'):
+                        break
+                    next_size = next_node.output_size(current_size)
+                    if next_node.name == 'scale':
+                        if not current_size or not next_size:
+                            break
+                        if next_size[0] * next_size[1] > current_size[0] * current_size[1]:
+                            break
+                    current_size = next_size
+                    position += 1
+                if position != i:
+                    nodes.insert(position, nodes.pop(i))
+                    size = current_size
+                    i = position + 1
+                    continue
+            else:
+                size = node.output_size(size)
+            i += 1
+        self.nodes = nodes
+
+    def __remove_redundant_nodes(self):
+        """
+        Remove format and setparams nodes that have no effect.
+            - A 'format' node is removed if the frames are already in that format (including the source format).
+            - A 'setparams' node is removed if the same params have already been set.
+        The state is only tracked across filters that are known to preserve the format and colour params.
+
+        :return:
+        """
+        optimised = []
+        current_format = normalise_pix_fmt(self.source_pix_fmt) or None
+        current_params = set()
+        for node in self.nodes:
+            if node.opaque:
+                current_format = None
+                current_params = set()
+            elif node.name == 'format':
+                if normalise_pix_fmt(node.args) == current_format:
+                    continue
+                current_format = normalise_pix_fmt(node.args)
+            elif node.name == 'setparams':
+                if node.args in current_params:
+                    continue
+                current_params.add(node.args)
+            elif node.name not in FORMAT_PRESERVING_FILTERS:
+                current_format = None
+                current_params = set()
+            optimised.append(node)
+        self.nodes = optimised
+
+    def optimise(self):
+        """
+        Remove redundant format/setparams nodes and move the remaining pixel format conversions to the cheapest
+        point in the chain.
+
+        :return:
+        """
+        self.__remove_redundant_nodes()
+        self.__move_format_conversions()
+        # Moving a conversion may leave it next to another one of the same format
+        self.__remove_redundant_nodes()
+        return self
+
+    def render(self, stream_id):
+        """
+        Render the graph to a filtergraph string.
+        Returns the label of the final output pad and the filtergraph.
+
+        :param stream_id:
+        :return:
+        """
+        chains = []
+        filter_id = self.input_label
+        count = 1
+        pending = []
+
+        def close_chain(filters):
+            nonlocal filter_id, count
+            output_id = '0:vf:{}-{}'.format(stream_id, count)
+            chains.append('[{}]{}[{}]'.format(filter_id, ','.join(filters), output_id))
+            filter_id = output_id
+            count += 1
+
+        for node in self.nodes:
+            if node.opaque:
+                if pending:
+                    close_chain(pending)
+                    pending = []
+                close_chain([node.filter_string])
+            else:
+                pending.append(node.filter_string)
+        if pending:
+            close_chain(pending)
+        return filter_id, ';'.join(chains)
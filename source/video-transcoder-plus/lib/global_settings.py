@@ -79,6 +79,18 @@ class GlobalSettings:
                 "apply_custom_filters":     False,
                 "custom_software_filters":  "",
             },
+            "segmented_settings":     {
+                "enable_segmented_encode":      False,
+                "segmented_encode_parallelism": 2,
+            },
+            "preflight_settings":     {
+                "enable_preflight_check":        False,
+                "preflight_min_savings_percent": 10,
+                "preflight_quality_metric":      "none",
+            },
+            "fallback_settings":      {
+                "enable_hw_fallback": False,
+            },
         }
 
     def __set_default_option(self, select_options, key, default_option=None):
@@ -382,3 +394,98 @@ class GlobalSettings:
         if self.settings.get_setting('mode') not in ['standard']:
             values["display"] = 'hidden'
         return values
+
+    def get_enable_segmented_encode_form_settings(self):
+        values = {
+            "label":       "Encode the video in segments concurrently",
+            "description": "Splits the video stream on keyframes and encodes the segments in parallel.\n"
+                           "The encoded segments are then joined and muxed with the other streams of the source.\n"
+                           "Only available for the CPU encoders.",
+        }
+        if self.settings.get_setting('mode') not in ['basic', 'standard']:
+            values["display"] = 'hidden'
+        if self.settings.get_setting('video_encoder') not in ['libx264', 'libx265', 'libsvtav1']:
+            values["display"] = 'hidden'
+        return values
+
+    def get_segmented_encode_parallelism_form_settings(self):
+        values = {
+            "label":          "Number of segments to encode at the same time",
+            "sub_setting":    True,
+            "input_type":     "slider",
+            "slider_options": {
+                "min": 1,
+                "max": 16,
+            },
+        }
+        if not self.settings.get_setting('enable_segmented_encode'):
+            values["display"] = 'hidden'
+        if self.settings.get_setting('mode') not in ['basic', 'standard']:
+            values["display"] = 'hidden'
+        if self.settings.get_setting('video_encoder') not in ['libx264', 'libx265', 'libsvtav1']:
+            values["display"] = 'hidden'
+        return values
+
+    def get_enable_preflight_check_form_settings(self):
+        values = {
+            "label":       "Run a pre-flight sample encode before adding files to the task list",
+            "description": "Encodes a few short windows of each file with the configured encoder settings during the library scan.\n"
+                           "The results are extrapolated to predict the final file size and encode time.\n"
+                           "Files that are not predicted to get smaller by at least the configured amount are skipped.",
+        }
+        return values
+
+    def get_preflight_min_savings_percent_form_settings(self):
+        values = {
+            "label":          "Minimum predicted file size reduction (%)",
+            "sub_setting":    True,
+            "input_type":     "slider",
+            "slider_options": {
+                "min":    0,
+                "max":    90,
+                "suffix": "%"
+            },
+        }
+        if not self.settings.get_setting('enable_preflight_check'):
+            values["display"] = 'hidden'
+        return values
+
+    def get_preflight_quality_metric_form_settings(self):
+        values = {
+            "label":          "Measure the quality of the pre-flight sample encodes",
+            "description":    "Compares the encoded windows against the source with FFmpeg's built-in filters.\n"
+                              "The result is written to the log with the predicted file size.",
+            "sub_setting":    True,
+            "input_type":     "select",
+            "select_options": [
+                {
+                    "value": "none",
+                    "label": "Disabled",
+                },
+                {
+                    "value": "ssim",
+                    "label": "SSIM",
+                },
+                {
+                    "value": "psnr",
+                    "label": "PSNR",
+                },
+            ],
+        }
+        self.__set_default_option(values['select_options'], 'preflight_quality_metric', default_option='none')
+        if not self.settings.get_setting('enable_preflight_check'):
+            values["display"] = 'hidden'
+        return values
+
+    def get_enable_hw_fallback_form_settings(self):
+        values = {
+            "label":       "Retry failed hardware transcodes with software decoding, then a software encoder",
+            "description": "If the hardware transcode fails, it is run again with CPU decoding, and then with the CPU encoder\n"
+                           "for the same codec. The tier that succeeds is remembered for the source codec, profile and pixel\n"
+                           "format, so later files start at that tier.",
+        }
+        if self.settings.get_setting('mode') not in ['basic', 'standard']:
+            values["display"] = 'hidden'
+        if self.settings.get_setting('video_encoder') in ['libx264', 'libx265', 'libsvtav1']:
+            values["display"] = 'hidden'
+        return values
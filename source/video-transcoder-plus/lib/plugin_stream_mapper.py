@@ -23,13 +23,14 @@
 """
 import logging
 
-from video_transcoder.lib import tools
+from video_transcoder.lib import quality_model, tools
 from video_transcoder.lib.encoders.libx import LibxEncoder
 from video_transcoder.lib.encoders.qsv import QsvEncoder
 from video_transcoder.lib.encoders.vaapi import VaapiEncoder
 from video_transcoder.lib.encoders.nvenc import NvencEncoder
 from video_transcoder.lib.encoders.libsvtav1 import LibsvtAv1Encoder
-from video_transcoder.lib.ffmpeg import Probe, StreamMapper
+from video_transcoder.lib.ffmpeg import Probe, StreamMapper, spans
+from video_transcoder.lib.filtergraph import HW_PIX_FMTS, plan_crop_and_scale
 
 # Configure plugin logger
 logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
@@ -42,8 +43,12 @@ class PluginStreamMapper(StreamMapper):
         self.settings = None
         self.complex_video_filters = {}
         self.crop_value = None
+        self.crop_detected = False
         self.forced_encode = False
+        self.encode_pass = None
+        self.passlogfile = None
 
+    @spans.span('PluginStreamMapper.set_default_values')
     def set_default_values(self, settings, abspath, probe):
         """
         Configure the stream mapper with defaults
@@ -87,9 +92,9 @@ class PluginStreamMapper(StreamMapper):
 
             # Check for config specific settings
             if self.settings.get_setting('apply_smart_filters'):
-                if self.settings.get_setting('autocrop_black_bars'):
+                if self.settings.get_setting('autocrop_black_bars') and not self.crop_detected:
                     # Test if the file has black bars
-                    self.crop_value = tools.detect_black_bars(abspath, probe.get_probe(), self.settings)
+                    self.set_crop_value(tools.detect_black_bars(abspath, probe.get_probe(), self.settings))
 
         # Build hardware acceleration args based on encoder
         # Note: these are not applied to advanced mode - advanced mode was returned above
@@ -100,6 +105,105 @@ class PluginStreamMapper(StreamMapper):
             self.set_ffmpeg_generic_options(**generic_kwargs)
             self.set_ffmpeg_advanced_options(**advanced_kwargs)
 
+    def set_crop_value(self, crop_value):
+        """
+        Set the black bar crop value of the file. Black bar detection is not run again once this is set.
+
+        :param crop_value:
+        :return:
+        """
+        self.crop_value = crop_value
+        self.crop_detected = True
+
+    def two_pass_encode_enabled(self):
+        """
+        Returns True if the configured video encoder should run a two-pass encode
+
+        :return:
+        """
+        if self.settings.get_setting('mode') not in ['standard']:
+            return False
+        if self.settings.get_setting('video_encoder') not in LibxEncoder(self.settings).provides():
+            return False
+        return self.settings.get_setting('encoder_ratecontrol_method') in ['2PASS']
+
+    def set_encode_pass(self, encode_pass, passlogfile):
+        """
+        Set the pass of a two-pass encode and the prefix of the encoder stats file shared by both passes
+
+        :param encode_pass:
+        :param passlogfile:
+        :return:
+        """
+        self.encode_pass = encode_pass
+        self.passlogfile = passlogfile
+
+    def segmented_encode_enabled(self):
+        """
+        Returns True if the video stream should be encoded in segments that are processed concurrently.
+        This is only supported for the CPU encoders, and not for two-pass encodes or files with multiple video streams.
+
+        :return:
+        """
+        if not self.settings.get_setting('enable_segmented_encode'):
+            return False
+        if self.settings.get_setting('mode') not in ['basic', 'standard']:
+            return False
+        if self.settings.get_setting('video_encoder') not in ['libx264', 'libx265', 'libsvtav1']:
+            return False
+        if self.two_pass_encode_enabled():
+            return False
+        video_streams = [s for s in self.probe.get('streams', []) if s.get('codec_type') == 'video']
+        return len(video_streams) == 1
+
+    def get_segmented_encode_args(self):
+        """
+        Split the generated FFmpeg args into the args used to encode a segment of the video stream on its own,
+        and the args used to mux all other streams from the source back in with the encoded video.
+        The source is the second input of the mux command, so the input index of those stream maps is updated.
+
+        The segments are cut with their timestamps reset, so the joined video starts at 0. The start of the video
+        stream relative to the start of the source is returned as the 'video_offset' that the mux shifts it by.
+
+        :return:
+        """
+        video_offset = 0.0
+        for stream_info in self.probe.get('streams', []):
+            if stream_info.get('codec_type') == 'video':
+                try:
+                    video_offset = float(stream_info.get('start_time', 0)) - float(
+                        self.probe.get('format', {}).get('start_time', 0))
+                except (TypeError, ValueError):
+                    video_offset = 0.0
+                break
+
+        video_mapping = []
+        mux_mapping = []
+        for i in range(0, len(self.stream_mapping) - 1, 2):
+            map_arg, map_value = self.stream_mapping[i], self.stream_mapping[i + 1]
+            if map_value.startswith('[') or map_value.startswith('0:v'):
+                video_mapping += [map_arg, map_value]
+            elif map_value.startswith('0:'):
+                mux_mapping += [map_arg, '1:' + map_value[2:]]
+            else:
+                mux_mapping += [map_arg, map_value]
+
+        # Group the encoding args by output stream. Each group starts with its codec arg (eg. '-c:v:0')
+        video_encoding = []
+        mux_encoding = []
+        current_group = mux_encoding
+        for arg in self.stream_encoding:
+            if str(arg).startswith('-c:'):
+                current_group = video_encoding if str(arg).startswith('-c:v:') else mux_encoding
+            current_group.append(arg)
+
+        return {
+            "input_args":   self.generic_options + self.main_options,
+            "encode_args":  self.advanced_options + video_mapping + video_encoding,
+            "mux_args":     mux_mapping + mux_encoding,
+            "video_offset": round(video_offset, 6),
+        }
+
     def scale_resolution(self, stream_info: dict):
         def get_test_resolution(settings):
             target_resolution = settings.get_setting('target_resolution')
@@ -168,21 +272,42 @@ class PluginStreamMapper(StreamMapper):
         smart_filters = []
         if self.settings.get_setting('apply_smart_filters'):
             # NOTE: Crop must come first. Filters like scale will ruin the crop values
+            crop_value = None
             if self.settings.get_setting('autocrop_black_bars') and self.crop_value:
-                # Note: There is no good way to crop with HW filters at this time. For now, lets leave this as a SW filter.
-                filter_args.append(f"crop={self.crop_value}")
+                crop_value = self.crop_value
+            target_width, target_height = None, None
             if self.settings.get_setting('target_resolution') not in ['source']:
-                vid_width, vid_height = self.scale_resolution(stream_info)
-                if vid_height:
-                    # Apply scale with only width to keep aspect ratio.
-                    # NOTE: Use width since this may follow the black bar crop which will likely crop
-                    # height not width changing the aspect ratio.
-                    smart_filters.append({
-                        "scale": {
-                            "filter": f"scale={vid_width}:-1",
-                            "values": {"width": vid_width, "height": vid_height}
-                        },
-                    })
+                target_width, target_height = self.scale_resolution(stream_info)
+            source_width = int(stream_info.get('width', stream_info.get('coded_width', 0)))
+            source_height = int(stream_info.get('height', stream_info.get('coded_height', 0)))
+            crop, scale = plan_crop_and_scale(source_width, source_height, crop_value=crop_value,
+                                              target_width=target_width, target_height=target_height)
+            if crop:
+                # Encoder libs may replace this with a HW crop. Any that remain are applied as a SW filter.
+                # A SW crop only offsets the frame data pointers, so it costs nothing to run it ahead of the scale.
+                crop_w, crop_h, crop_x, crop_y = crop
+                smart_filters.append({
+                    "crop": {
+                        "filter": f"crop={crop_w}:{crop_h}:{crop_x}:{crop_y}",
+                        "values": {
+                            "width":         crop_w,
+                            "height":        crop_h,
+                            "x":             crop_x,
+                            "y":             crop_y,
+                            "source_width":  source_width,
+                            "source_height": source_height,
+                        }
+                    },
+                })
+            if scale:
+                # The scale size is computed from the cropped size to keep the aspect ratio.
+                scale_w, scale_h = scale
+                smart_filters.append({
+                    "scale": {
+                        "filter": f"scale={scale_w}:{scale_h}",
+                        "values": {"width": scale_w, "height": scale_h}
+                    },
+                })
 
         # Apply custom filtergraph logic from encoder libraries
         filtergraph_config = {}
@@ -221,10 +346,46 @@ class PluginStreamMapper(StreamMapper):
 
         # Join filtergraph
         filter_id = '0:v:{}'.format(stream_id)
-        filter_id, filtergraph = tools.join_filtergraph(filter_id, filter_args, stream_id)
+        filter_id, filtergraph = tools.join_filtergraph(filter_id, filter_args, stream_id,
+                                                        source_pix_fmt=self.__filtergraph_input_pix_fmt(stream_info),
+                                                        source_size=self.__filtergraph_input_size(stream_info))
 
         return filter_id, filtergraph
 
+    def __filtergraph_input_pix_fmt(self, stream_info: dict):
+        """
+        Returns the pixel format of the frames the decoder passes to the filtergraph, or None if it is not known.
+        Frames are in the source pixel format unless they are decoded in hardware.
+
+        :param stream_info:
+        :return:
+        """
+        if '-hwaccel_output_format' in self.generic_options:
+            output_format = self.generic_options[self.generic_options.index('-hwaccel_output_format') + 1]
+            if output_format in HW_PIX_FMTS:
+                return None
+            return output_format
+        if '-hwaccel' in self.generic_options:
+            # HW decoders download frames in their own SW format which may differ from the source
+            return None
+        return stream_info.get('pix_fmt')
+
+    @staticmethod
+    def __filtergraph_input_size(stream_info: dict):
+        """
+        Returns the size of the frames passed to the filtergraph, or None if it is not known
+
+        :param stream_info:
+        :return:
+        """
+        try:
+            width, height = int(stream_info.get('width')), int(stream_info.get('height'))
+        except (TypeError, ValueError):
+            return None
+        if width <= 0 or height <= 0:
+            return None
+        return width, height
+
     def test_stream_needs_processing(self, stream_info: dict):
         """
         Tests if the command will need to transcode the video stream
@@ -269,6 +430,20 @@ class PluginStreamMapper(StreamMapper):
             else:
                 self.forced_encode = True
 
+        # In basic mode, copy video streams that are not expected to get any smaller from a transcode
+        #   (Ignore checks if force transcode is set)
+        if codec_type in ['video'] and self.settings.get_setting('mode') == 'basic':
+            if not self.settings.get_setting('force_transcode'):
+                prediction = quality_model.predict(self.probe.get_probe(), stream_info,
+                                                   self.settings.get_setting('video_encoder'),
+                                                   self.settings.get_setting('video_codec'))
+                if prediction and prediction.get('skip'):
+                    logger.info(
+                        "Skipping transcode of video stream #%s. Source bitrate %s is not expected to be reduced "
+                        "(predicted %s)", stream_info.get('index'), prediction.get('source_bitrate'),
+                        prediction.get('predicted_bitrate'))
+                    return False
+
         # All other streams should be custom mapped
         return True
 
@@ -312,6 +487,7 @@ class PluginStreamMapper(StreamMapper):
 
                 # Load encoder classes
                 libx_encoder = LibxEncoder(self.settings, self.probe)
+                libx_encoder.set_encode_pass(self.encode_pass, self.passlogfile)
                 stva1_encoder = LibsvtAv1Encoder(self.settings, self.probe)
                 qsv_encoder = QsvEncoder(self.settings, self.probe)
                 vaapi_encoder = VaapiEncoder(self.settings, self.probe)
@@ -323,7 +499,7 @@ class PluginStreamMapper(StreamMapper):
                     stream_encoding += stream_args.get("encoder_args", [])
                     stream_encoding += stream_args.get("stream_args", [])
                 elif encoder_name in stva1_encoder.provides():
-                    stream_args = vaapi_encoder.stream_args(stream_info, stream_id, encoder_name)
+                    stream_args = stva1_encoder.stream_args(stream_info, stream_id, encoder_name)
                     stream_encoding += stream_args.get("encoder_args", [])
                     stream_encoding += stream_args.get("stream_args", [])
                 elif encoder_name in qsv_encoder.provides():
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.preflight.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (11:48 AM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from video_transcoder.lib import tools
+from video_transcoder.lib.ffmpeg import runner
+
+logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
+
+# Number of windows encoded during a pre-flight check
+PREFLIGHT_MAX_SAMPLES = 3
+
+
+def _run_ffmpeg(args):
+    """
+    Run an FFmpeg command and return its exit code and combined output
+
+    :param args:
+    :return:
+    """
+    returncode, out = runner.run(['ffmpeg', '-hide_banner'] + args)
+    return returncode, out.decode("utf-8", errors="replace")
+
+
+def encodes_video(mapper):
+    """
+    Returns True if the stream mapping of the given mapper encodes (rather than copies) a video stream
+
+    :param mapper:
+    :return:
+    """
+    encoding = mapper.stream_encoding
+    for i, arg in enumerate(encoding[:-1]):
+        if str(arg).startswith('-c:v') and encoding[i + 1] != 'copy':
+            return True
+    return False
+
+
+def measure_quality(encoded_file, abspath, ss, t_seconds, video_stream_index, metric, ref_size, crop_value=None):
+    """
+    Compare an encoded window against the same window of the source using FFmpeg's 'ssim' or 'psnr' filter.
+    The encoded window is scaled to the size of the (cropped) source so the two can be compared.
+
+    :param encoded_file:
+    :param abspath:
+    :param ss:
+    :param t_seconds:
+    :param video_stream_index:
+    :param metric:
+    :param ref_size:
+    :param crop_value:
+    :return:
+    """
+    ref_filters = []
+    if crop_value:
+        ref_filters.append(f"crop={crop_value}")
+    ref_filters.append("null")
+    filtergraph = "[0:v:0]scale={}:{}[dist];[1:v:{}]{}[ref];[dist][ref]{}".format(
+        ref_size[0], ref_size[1], video_stream_index, ",".join(ref_filters), metric)
+    returncode, output = _run_ffmpeg([
+        '-i', encoded_file,
+        '-ss', tools.format_seek_position(ss), '-t', str(int(t_seconds)), '-i', abspath,
+        '-lavfi', filtergraph,
+        '-f', 'null', '-',
+    ])
+    if returncode != 0:
+        return None
+    if metric == 'ssim':
+        matches = re.findall(r'SSIM .*All:([\d.]+)', output)
+    else:
+        matches = re.findall(r'PSNR .*average:([\d.]+|inf)', output)
+    if not matches:
+        return None
+    try:
+        return float(matches[-1])
+    except ValueError:
+        return None
+
+
+def run_preflight(mapper, probe, settings, abspath):
+    """
+    Encode a few short windows of the file with the configured encoder settings and extrapolate the result of the
+    full transcode.
+
+    The given mapper must already have its stream mapping generated (streams_need_processing).
+    Returns None if no prediction could be made. Otherwise returns a dictionary:
+        source_size                 - Size of the source file in bytes
+        predicted_size              - Predicted size of the transcoded file in bytes
+        predicted_savings_percent   - Predicted reduction in file size
+        predicted_encode_seconds    - Predicted time taken to transcode the file
+        quality                     - Average SSIM/PSNR of the encoded windows (if enabled)
+
+    :param mapper:
+    :param probe:
+    :param settings:
+    :param abspath:
+    :return:
+    """
+    probe_data = probe.get_probe()
+    total_duration = tools.get_duration_seconds_from_probe(probe_data)
+    if not total_duration:
+        logger.debug("[Pre-flight] Unable to determine the duration of '%s'. Skipping pre-flight check.", abspath)
+        return None
+
+    sample_len, starts = tools.plan_sample_windows(total_duration, max_samples=PREFLIGHT_MAX_SAMPLES,
+                                                   log_prefix="[Pre-flight]")
+    starts = tools.align_windows_to_keyframes(abspath, starts, sample_len,
+                                              start_time=tools.get_start_time_from_probe(probe_data),
+                                              cache_directory=os.path.join(settings.get_profile_directory(),
+                                                                           'keyframes'))
+    if not starts:
+        return None
+
+    vid_width, vid_height, video_stream_index = tools.get_video_stream_data(probe_data.get('streams'))
+    ref_size = (vid_width, vid_height)
+    if getattr(mapper, 'crop_value', None):
+        crop_w, crop_h = mapper.crop_value.split(':')[:2]
+        ref_size = (crop_w, crop_h)
+    metric = settings.get_setting('preflight_quality_metric')
+
+    # Only the video streams are encoded for the pre-flight check
+    mapper.set_ffmpeg_advanced_options('-an', '-sn', '-dn')
+
+    source_window_bytes = 0
+    encoded_window_bytes = 0
+    sampled_seconds = 0
+    encode_seconds = 0
+    quality_scores = []
+    temp_directory = tempfile.mkdtemp(prefix='unmanic_preflight_')
+    try:
+        for count, ss in enumerate(starts):
+            source_window = os.path.join(temp_directory, f'source-{count}.mkv')
+            encoded_window = os.path.join(temp_directory, f'encoded-{count}.mkv')
+
+            # Copy the source window to measure the bytes the encoder will be replacing
+            returncode, _ = _run_ffmpeg([
+                '-ss', tools.format_seek_position(ss), '-t', str(int(sample_len)), '-i', abspath,
+                '-map', '0:v', '-c', 'copy', '-an', '-sn', '-dn', '-y', source_window,
+            ])
+            if returncode != 0 or not os.path.exists(source_window):
+                logger.debug("[Pre-flight] Failed to copy source window @ %ss of '%s'", ss, abspath)
+                continue
+
+            # Encode the same window with the configured encoder
+            mapper.set_ffmpeg_generic_options(**{"-ss": tools.format_seek_position(ss), "-t": str(int(sample_len))})
+            mapper.set_output_file(encoded_window)
+            start_time = time.monotonic()
+            returncode, _ = _run_ffmpeg(mapper.get_ffmpeg_args())
+            elapsed = time.monotonic() - start_time
+            if returncode != 0 or not os.path.exists(encoded_window):
+                logger.debug("[Pre-flight] Failed to encode window @ %ss of '%s'", ss, abspath)
+                continue
+
+            source_window_bytes += os.path.getsize(source_window)
+            encoded_window_bytes += os.path.getsize(encoded_window)
+            sampled_seconds += min(sample_len, max(1, total_duration - ss))
+            encode_seconds += elapsed
+
+            if metric in ['ssim', 'psnr']:
+                score = measure_quality(encoded_window, abspath, ss, sample_len, video_stream_index, metric,
+                                        ref_size, crop_value=getattr(mapper, 'crop_value', None))
+                if score is not None:
+                    quality_scores.append(score)
+    finally:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+
+    if not source_window_bytes or not sampled_seconds:
+        logger.debug("[Pre-flight] No windows could be sampled for '%s'", abspath)
+        return None
+
+    # Extrapolate the sampled windows to the whole file. Any streams other than video are assumed to be unchanged.
+    source_size = os.path.getsize(abspath)
+    source_video_bytes = min(source_size, (source_window_bytes / sampled_seconds) * total_duration)
+    size_ratio = encoded_window_bytes / source_window_bytes
+    predicted_size = int(source_size - (source_video_bytes * (1 - size_ratio)))
+    result = {
+        "source_size":               source_size,
+        "predicted_size":            predicted_size,
+        "predicted_savings_percent": round(100 * (source_size - predicted_size) / source_size, 2),
+        "predicted_encode_seconds":  int((encode_seconds / sampled_seconds) * total_duration),
+        "quality":                   (sum(quality_scores) / len(quality_scores)) if quality_scores else None,
+    }
+    logger.info("[Pre-flight] '%s' - predicted size %s -> %s bytes (%s%% saved), encode time ~%ss, %s: %s",
+                abspath, result['source_size'], result['predicted_size'], result['predicted_savings_percent'],
+                result['predicted_encode_seconds'], metric, result['quality'])
+    return result
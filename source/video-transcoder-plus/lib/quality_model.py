@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.quality_model.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (11:02 AM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import logging
+import math
+
+logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
+
+# Bits per pixel per frame (in H.264 terms) that the basic mode default quality of each encoder produces on average.
+# Sources below this already have less detail to preserve, so the quality value can be relaxed.
+REFERENCE_BPP = 0.1
+
+# Compression efficiency of each codec relative to H.264. A codec with an efficiency of 1.5 needs 1/1.5 of the
+# bits that H.264 needs for the same visual quality.
+CODEC_EFFICIENCY = {
+    "mpeg1video": 0.4,
+    "mpeg2video": 0.5,
+    "msmpeg4v3":  0.6,
+    "mpeg4":      0.7,
+    "wmv3":       0.7,
+    "vc1":        0.8,
+    "vp8":        0.9,
+    "h264":       1.0,
+    "hevc":       1.5,
+    "vp9":        1.5,
+    "av1":        1.9,
+}
+
+# Quality value behaviour of each encoder family in basic mode.
+#   step        - How much the quality value is raised to halve the output bitrate
+#   max_offset  - The largest amount the quality value is raised above the encoder's basic mode default
+#   adjustable  - False if basic mode leaves the quality to the encoder/driver. Only the skip decision is applied.
+ENCODER_FAMILIES = {
+    "libx264":    {"step": 6, "max_offset": 6, "adjustable": True},
+    "libx265":    {"step": 6, "max_offset": 6, "adjustable": True},
+    "libsvtav1":  {"step": 8, "max_offset": 10, "adjustable": True},
+    "h264_qsv":   {"step": 6, "max_offset": 6, "adjustable": True},
+    "hevc_qsv":   {"step": 6, "max_offset": 6, "adjustable": True},
+    "av1_qsv":    {"step": 6, "max_offset": 6, "adjustable": True},
+    "h264_vaapi": {"step": 6, "max_offset": 0, "adjustable": False},
+    "hevc_vaapi": {"step": 6, "max_offset": 0, "adjustable": False},
+    "av1_vaapi":  {"step": 6, "max_offset": 0, "adjustable": False},
+    "h264_nvenc": {"step": 6, "max_offset": 0, "adjustable": False},
+    "hevc_nvenc": {"step": 6, "max_offset": 0, "adjustable": False},
+    "av1_nvenc":  {"step": 6, "max_offset": 0, "adjustable": False},
+}
+
+# The predicted output must be at least this fraction smaller than the source for the stream to be transcoded
+MIN_PREDICTED_SAVINGS = 0.10
+
+
+def _to_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number <= 0 or math.isnan(number) or math.isinf(number):
+        return None
+    return number
+
+
+def get_stream_fps(stream_info):
+    """
+    Returns the frame rate of a video stream, or None if it is not known
+
+    :param stream_info:
+    :return:
+    """
+    for key in ['avg_frame_rate', 'r_frame_rate']:
+        rate = str(stream_info.get(key, ''))
+        if '/' in rate:
+            numerator, denominator = rate.split('/', 1)
+            numerator = _to_number(numerator)
+            denominator = _to_number(denominator)
+            if numerator and denominator:
+                return numerator / denominator
+        elif _to_number(rate):
+            return _to_number(rate)
+    return None
+
+
+def get_stream_bitrate(probe_data, stream_info):
+    """
+    Returns the bitrate of a video stream in bits per second, or None if it is not known.
+    Reads the stream bitrate first, then the statistics tags written by mkvmerge, then falls back to the
+    container bitrate minus the bitrate of all other streams.
+
+    :param probe_data:
+    :param stream_info:
+    :return:
+    """
+    bitrate = _to_number(stream_info.get('bit_rate'))
+    if bitrate:
+        return bitrate
+
+    tags = stream_info.get('tags', {}) or {}
+    for key, value in tags.items():
+        if key.upper() == 'BPS' or key.upper().startswith('BPS-'):
+            bitrate = _to_number(value)
+            if bitrate:
+                return bitrate
+
+    streams = probe_data.get('streams', []) if probe_data else []
+    video_streams = [s for s in streams if s.get('codec_type') == 'video' and
+                     not s.get('disposition', {}).get('attached_pic')]
+    if len(video_streams) != 1:
+        # The container bitrate can not be attributed to a single video stream
+        return None
+    format_bitrate = _to_number(probe_data.get('format', {}).get('bit_rate'))
+    if not format_bitrate:
+        return None
+    other_bitrate = 0
+    for stream in streams:
+        if stream is video_streams[0] or stream.get('index') == stream_info.get('index'):
+            continue
+        other_bitrate += _to_number(stream.get('bit_rate')) or 0
+    bitrate = format_bitrate - other_bitrate
+    return bitrate if bitrate > 0 else None
+
+
+def predict(probe_data, stream_info, encoder_name, target_codec):
+    """
+    Predict the quality value adjustment and the output bitrate of a basic mode encode of a video stream.
+
+    Returns None if there is not enough information in the probe to make a prediction. Otherwise returns a dictionary:
+        quality_offset      - Amount to add to the encoder's default quality value (CRF/global_quality)
+        source_bitrate      - The bitrate of the source stream
+        predicted_bitrate   - The expected bitrate of the output stream
+        skip                - True if the output is not expected to be smaller than the source
+
+    :param probe_data:
+    :param stream_info:
+    :param encoder_name:
+    :param target_codec:
+    :return:
+    """
+    family = ENCODER_FAMILIES.get(encoder_name)
+    if not family:
+        return None
+    source_efficiency = CODEC_EFFICIENCY.get(str(stream_info.get('codec_name', '')).lower())
+    target_efficiency = CODEC_EFFICIENCY.get(str(target_codec).lower())
+    width = _to_number(stream_info.get('width'))
+    height = _to_number(stream_info.get('height'))
+    fps = get_stream_fps(stream_info)
+    source_bitrate = get_stream_bitrate(probe_data, stream_info)
+    if not all([source_efficiency, target_efficiency, width, height, fps, source_bitrate]):
+        return None
+
+    # Normalise the source bits per pixel to H.264 terms
+    pixels_per_second = width * height * fps
+    source_bpp = (source_bitrate / pixels_per_second) * source_efficiency
+
+    # Raise the quality value by one step for each halving of the source bpp below the reference
+    quality_offset = 0
+    if family.get('adjustable') and source_bpp < REFERENCE_BPP:
+        quality_offset = family['step'] * math.log2(REFERENCE_BPP / source_bpp)
+        quality_offset = int(round(min(quality_offset, family['max_offset'])))
+
+    # Predict the output bitrate at the adjusted quality value
+    output_bpp = REFERENCE_BPP * math.pow(2, -(quality_offset / family['step']))
+    predicted_bitrate = (output_bpp / target_efficiency) * pixels_per_second
+
+    result = {
+        "quality_offset":    quality_offset,
+        "source_bitrate":    int(source_bitrate),
+        "predicted_bitrate": int(predicted_bitrate),
+        "skip":              predicted_bitrate >= source_bitrate * (1 - MIN_PREDICTED_SAVINGS),
+    }
+    logger.debug("Quality model prediction for %s stream #%s with %s: %s", stream_info.get('codec_name'),
+                 stream_info.get('index'), encoder_name, result)
+    return result
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.segmented_encode.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (12:31 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+    Encodes the video stream of a file in segments that are processed concurrently.
+
+    This module is executed by the worker as a standalone script:
+        python3 segmented_encode.py /path/to/manifest.json
+
+    It must only import from the standard library.
+
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Length of each segment in seconds. The segment muxer only cuts on keyframes, so segments may be slightly longer.
+SEGMENT_SECONDS = 120
+
+# Share of the overall progress given to each stage
+SPLIT_PROGRESS = 5
+ENCODE_PROGRESS = 90
+
+PROGRESS_REGEX = re.compile(r'\[Segmented encode\] progress: (\d+)')
+
+
+def write_manifest(path, manifest):
+    """
+    Write a segmented encode manifest to disk
+
+    :param path:
+    :param manifest:
+    :return:
+    """
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+class ProgressParser(object):
+    """
+    Parses the progress lines printed by this script for the worker
+    """
+
+    def __init__(self):
+        self.percent = 0
+
+    def parse_progress(self, line_text):
+        if line_text:
+            match = PROGRESS_REGEX.search(line_text)
+            if match:
+                self.percent = max(self.percent, int(match.group(1)))
+        return {
+            'percent': str(self.percent)
+        }
+
+
+def _print(message):
+    print("[Segmented encode] {}".format(message), flush=True)
+
+
+def _progress(percent):
+    _print("progress: {}".format(int(percent)))
+
+
+def _run(args):
+    pipe = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out, _ = pipe.communicate()
+    return pipe.returncode, out.decode("utf-8", errors="replace")
+
+
+def _fail(message, output=''):
+    _print("ERROR: {}".format(message))
+    if output:
+        # Only print the tail of the FFmpeg output. It is where FFmpeg reports the failure.
+        print("\n".join(output.splitlines()[-30:]), flush=True)
+    return 1
+
+
+def split_video(manifest, work_directory):
+    """
+    Split the video stream of the source into segments on keyframes, without re-encoding it
+
+    :param manifest:
+    :param work_directory:
+    :return:
+    """
+    segment_pattern = os.path.join(work_directory, 'source-%05d.mkv')
+    returncode, output = _run([
+        'ffmpeg', '-hide_banner', '-y',
+        '-i', manifest['input_file'],
+        '-map', manifest.get('video_stream', '0:v:0'), '-c', 'copy', '-an', '-sn', '-dn',
+        '-f', 'segment', '-segment_time', str(manifest.get('segment_seconds', SEGMENT_SECONDS)),
+        '-segment_format', 'matroska', '-reset_timestamps', '1',
+        segment_pattern,
+    ])
+    segments = sorted(f for f in os.listdir(work_directory) if f.startswith('source-') and f.endswith('.mkv'))
+    return returncode, output, [os.path.join(work_directory, f) for f in segments]
+
+
+def encode_segment(manifest, segment):
+    """
+    Encode a single segment with the same filters and encoder args as a full file encode
+
+    :param manifest:
+    :param segment:
+    :return:
+    """
+    encoded_segment = os.path.join(os.path.dirname(segment), os.path.basename(segment).replace('source-', 'encoded-'))
+    returncode, output = _run(
+        ['ffmpeg', '-hide_banner', '-y'] +
+        manifest.get('input_args', []) +
+        ['-i', segment] +
+        manifest.get('encode_args', []) +
+        [encoded_segment]
+    )
+    return returncode, output, encoded_segment
+
+
+def concat_segments(encoded_segments, work_directory):
+    """
+    Join the encoded segments with the concat demuxer
+
+    :param encoded_segments:
+    :param work_directory:
+    :return:
+    """
+    concat_list = os.path.join(work_directory, 'concat.txt')
+    with open(concat_list, 'w') as f:
+        for segment in encoded_segments:
+            f.write("file '{}'\n".format(segment.replace("'", "'\\''")))
+    video_file = os.path.join(work_directory, 'video.mkv')
+    returncode, output = _run([
+        'ffmpeg', '-hide_banner', '-y',
+        '-f', 'concat', '-safe', '0', '-i', concat_list,
+        '-map', '0:v:0', '-c', 'copy',
+        video_file,
+    ])
+    return returncode, output, video_file
+
+
+def mux_streams(manifest, video_file):
+    """
+    Mux the encoded video stream with all other streams, metadata and chapters from the source.
+    The joined segments start at 0, so the video is shifted by its start in the source ('video_offset') to keep it in
+    sync with the audio and subtitle streams.
+
+    :param manifest:
+    :param video_file:
+    :return:
+    """
+    offset_args = []
+    video_offset = float(manifest.get('video_offset', 0))
+    if video_offset:
+        offset_args = ['-itsoffset', '{:.6f}'.format(video_offset)]
+    return _run(
+        ['ffmpeg', '-hide_banner', '-y'] +
+        offset_args +
+        ['-i', video_file,
+         '-i', manifest['input_file'],
+         '-map', '0:v:0', '-c:v:0', 'copy'] +
+        manifest.get('mux_args', []) +
+        ['-map_metadata', '1', '-map_chapters', '1', manifest['output_file']]
+    )
+
+
+def main(manifest_file):
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    work_directory = manifest.get('work_directory', os.path.dirname(os.path.abspath(manifest_file)))
+    if not os.path.exists(work_directory):
+        os.makedirs(work_directory)
+
+    # Split the video into segments
+    _progress(0)
+    returncode, output, segments = split_video(manifest, work_directory)
+    if returncode != 0 or not segments:
+        return _fail("Failed to split the video stream into segments", output)
+    _print("Split video into {} segments".format(len(segments)))
+    _progress(SPLIT_PROGRESS)
+
+    # Encode the segments concurrently
+    parallelism = max(1, int(manifest.get('parallelism', 1)))
+    encoded_segments = {}
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = {executor.submit(encode_segment, manifest, segment): segment for segment in segments}
+        for future in as_completed(futures):
+            returncode, output, encoded_segment = future.result()
+            if returncode != 0:
+                for pending in futures:
+                    pending.cancel()
+                return _fail("Failed to encode segment '{}'".format(futures[future]), output)
+            encoded_segments[futures[future]] = encoded_segment
+            _print("Encoded segment {} of {}".format(len(encoded_segments), len(segments)))
+            _progress(SPLIT_PROGRESS + (ENCODE_PROGRESS * len(encoded_segments) / len(segments)))
+
+    # Join the segments back together and mux in the remaining streams
+    returncode, output, video_file = concat_segments([encoded_segments[s] for s in segments], work_directory)
+    if returncode != 0:
+        return _fail("Failed to concatenate the encoded segments", output)
+    for segment in segments:
+        for path in [segment, encoded_segments[segment]]:
+            if os.path.exists(path):
+                os.remove(path)
+    returncode, output = mux_streams(manifest, video_file)
+    if returncode != 0:
+        return _fail("Failed to mux the encoded video with the source streams", output)
+    _progress(100)
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: {} /path/to/manifest.json".format(sys.argv[0]))
+        sys.exit(2)
+    sys.exit(main(sys.argv[1]))
@@ -22,9 +22,10 @@
 
 """
 import logging
+import math
+import os
 import re
 import shlex
-import subprocess
 from collections import Counter
 from typing import List, Optional, Iterable
 
@@ -33,7 +34,8 @@ from video_transcoder.lib.encoders.libsvtav1 import LibsvtAv1Encoder
 from video_transcoder.lib.encoders.qsv import QsvEncoder
 from video_transcoder.lib.encoders.vaapi import VaapiEncoder
 from video_transcoder.lib.encoders.nvenc import NvencEncoder
-from video_transcoder.lib.ffmpeg import StreamMapper
+from video_transcoder.lib.ffmpeg import StreamMapper, get_keyframe_index, runner, spans
+from video_transcoder.lib.filtergraph import FilterGraph
 
 image_video_codecs = [
     'alias_pix',
@@ -135,6 +137,28 @@ def available_encoders(settings=None, probe=None):
     return return_encoders
 
 
+class SettingsOverrides(object):
+    """
+    SettingsOverrides
+
+    Wraps a plugin settings object and returns the given values in place of the configured ones
+    """
+
+    def __init__(self, settings, overrides):
+        self.__settings = settings
+        self.__overrides = overrides
+
+    def get_setting(self, key=None):
+        if key is None:
+            return {**self.__settings.get_setting(), **self.__overrides}
+        if key in self.__overrides:
+            return self.__overrides[key]
+        return self.__settings.get_setting(key)
+
+    def __getattr__(self, name):
+        return getattr(self.__settings, name)
+
+
 def get_video_stream_data(streams):
     width = 0
     height = 0
@@ -200,28 +224,243 @@ def format_command_multiline(mapper, max_width=120, indent="  "):
     return " \\\n".join(lines)
 
 
-def join_filtergraph(filter_id, filter_args, stream_id):
+def scaled_progress_parser(parse_progress, start_percent, end_percent):
     """
-    Joins a filtergraph from a collection of args
+    Wraps a progress parser so that its 0-100 percent is reported within the given range.
+    This allows the progress of a task that runs multiple commands (eg. a two-pass encode) to span all of them.
+
+    :param parse_progress:
+    :param start_percent:
+    :param end_percent:
+    :return:
     """
-    filtergraph = ''
-    count = 1
+
+    def parser(line_text):
+        progress = parse_progress(line_text)
+        try:
+            percent = float(progress.get('percent', 0))
+        except (TypeError, ValueError):
+            percent = 0
+        percent = start_percent + (min(max(percent, 0), 100) * (end_percent - start_percent) / 100)
+        progress['percent'] = str(int(percent))
+        return progress
+
+    return parser
+
+
+def join_filtergraph(filter_id, filter_args, stream_id, source_pix_fmt=None, source_size=None):
+    """
+    Joins a filtergraph from a collection of args.
+    Redundant format/setparams filters are removed and the filters are joined into as few chains as possible.
+    If the pixel format and size of the frames entering the graph are given, conversions to the source format
+    are dropped and the remaining conversions are placed where the frames are smallest.
+    """
+    graph = FilterGraph(filter_id, source_pix_fmt=source_pix_fmt, source_size=source_size)
     for filter_string in filter_args:
-        # If we are appending to existing filters, separate by a semicolon to start a new chain
-        if filtergraph:
-            filtergraph += ';'
-        # Add the input for this filter
-        filtergraph += '[{}]'.format(filter_id)
-        # Add filtergraph
-        filtergraph += '{}'.format(filter_string)
-        # Update filter ID and add it to the end
-        filter_id = '0:vf:{}-{}'.format(stream_id, count)
-        filtergraph += '[{}]'.format(filter_id)
-        # Increment filter ID counter
+        graph.add(filter_string)
+    return graph.optimise().render(stream_id)
+
+
+def get_duration_seconds_from_probe(_probe) -> Optional[float]:
+    """
+    Returns the duration of a file in seconds from its probe data (format, video stream or tags), or None if unknown
+    """
+    fmt = _probe.get("format") if isinstance(_probe, dict) else None
+    if isinstance(fmt, dict):
+        dur = fmt.get("duration")
+        if dur is not None:
+            try:
+                return float(dur)
+            except (TypeError, ValueError):
+                pass
+    streams = _probe.get("streams") if isinstance(_probe, dict) else None
+    if isinstance(streams, list):
+        for s in streams:
+            if s.get("codec_type") == "video":
+                dur = s.get("duration")
+                if dur is not None:
+                    try:
+                        return float(dur)
+                    except (TypeError, ValueError):
+                        pass
+    if isinstance(fmt, dict) and isinstance(fmt.get("tags"), dict):
+        t = fmt["tags"]
+        ts = t.get("DURATION")
+        if ts and isinstance(ts, str):
+            parts = ts.split(":")
+            if len(parts) >= 3:
+                try:
+                    h = float(parts[0]);
+                    m = float(parts[1]);
+                    s = float(parts[2])
+                    return h * 3600 + m * 60 + s
+                except (TypeError, ValueError):
+                    pass
+    return None
+
+
+def get_start_time_from_probe(_probe) -> float:
+    """
+    Returns the start time of a file in seconds from its probe data, or 0 if unknown.
+    FFmpeg input seeks (-ss) are relative to this, while packet timestamps are not.
+    """
+    fmt = _probe.get("format") if isinstance(_probe, dict) else None
+    if isinstance(fmt, dict):
+        try:
+            return float(fmt.get("start_time", 0))
+        except (TypeError, ValueError):
+            pass
+    return 0.0
+
+
+def _gen_starts_known(total: float, first_start: int, step_between_starts: int, window: int, limit: int) -> Iterable[int]:
+    """
+    Generate start times so that each window fits within media (best-effort), up to 'limit' samples.
+    'step_between_starts' is the distance between window starts, *not* the gap itself.
+    """
+    # Ensure we don't start too close to EOF; keep a 1s buffer
+    max_start = max(0, int(total) - (window if window else 0) - 1)
+    s = max(0, int(first_start))
+    count = 0
+    while s <= max_start and count < limit:
+        yield s
+        s += int(step_between_starts)
         count += 1
-    return filter_id, filtergraph
 
 
+def plan_sample_windows(total_duration, max_samples=7, log_prefix="[Sampling]"):
+    """
+    Plan the windows used to sample a file for analysis (eg. black bar detection, pre-flight encodes).
+
+    Sampling rules:
+      - If duration < 60s: one window from the start, capped to 20s.
+      - If duration unknown: start at 0s, sample 10s every 30s.
+      - If 60s < duration <= 5min: sample 10s windows with a ~5s gap, starting at 30s.
+      - If 5min < duration <= 10min: sample 20s windows with a ~30s gap, starting at 90s.
+      - If duration > 10min: sample 20s windows with a ~90s gap, starting at 5min.
+
+    Returns a tuple of the window length in seconds and a list of window start times in seconds.
+    """
+    logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
+
+    if total_duration is not None and total_duration < 60:
+        return int(min(20, max(1, total_duration))), [0]
+
+    if total_duration is None:
+        # Unknown duration → 10s every 30s starting at 0s
+        sample_len = 10
+        first_start = 0
+        start_step = 30  # starts at 0,30,60,...
+        starts_iter = (first_start + i * start_step for i in range(max_samples))
+        logger.debug("%s Unknown video duration. Sampling 10s every 30s starting at 0s (max %d samples)",
+                     log_prefix, max_samples)
+
+    elif total_duration <= 5 * 60:
+        # 60s .. 5min → 10s windows, small gap (~5s) between windows, start at 30s
+        sample_len = 10
+        small_gap = 5
+        first_start = 30
+        start_step = sample_len + small_gap  # 10s window + ~5s gap → next start +15s
+        starts_iter = _gen_starts_known(total_duration, first_start, start_step, sample_len, max_samples)
+        logger.debug("%s Video duration 60s–5min. Sampling 10s windows, ~5s gap (start step=%ss) starting at 30s",
+                     log_prefix, start_step)
+
+    elif total_duration <= 10 * 60:
+        # 5–10min → 20s windows, ~30s gap, start at 90s (hopefully skip any intros)
+        sample_len = 20
+        long_gap = 30
+        first_start = 90
+        start_step = sample_len + long_gap  # 20 + 30 = 50s between starts
+        starts_iter = _gen_starts_known(total_duration, first_start, start_step, sample_len, max_samples)
+        logger.debug("%s Video duration 5–10min. Sampling %ss windows, ~%ss gap (start step=%ss) starting at %ss",
+                     log_prefix, sample_len,
+                     long_gap, start_step, first_start)
+
+    else:
+        # >10min → 20s windows, ~30s gap, start at 5:00 (should skip any intros)
+        sample_len = 20
+        long_gap = 90
+        first_start = 300
+        start_step = sample_len + long_gap  # 20 + 90 = 1:50s between starts
+        starts_iter = _gen_starts_known(total_duration, first_start, start_step, sample_len, max_samples)
+        logger.debug("%s Video duration >10min. Sampling %ss windows, ~%ss gap (start step=%ss) starting at %ss",
+                     log_prefix, sample_len,
+                     long_gap, start_step, first_start)
+
+    return sample_len, list(starts_iter)
+
+
+def format_seek_position(position):
+    """
+    Format a seek position for FFmpeg's '-ss' option.
+    The position is rounded up to the millisecond so that a seek to a keyframe timestamp never lands before it.
+
+    :param position:
+    :return:
+    """
+    return "{:.3f}".format(math.ceil(round(float(position) * 1000, 6)) / 1000)
+
+
+def align_windows_to_keyframes(abspath, starts, sample_len, start_time=0.0, cache_directory=None):
+    """
+    Move each sample window start back to the keyframe at or before it.
+    An input seek (-ss) to a keyframe can start decoding immediately rather than decoding and discarding every frame
+    from the previous keyframe. Only the parts of the file around each window are read to find the keyframes.
+    Returns the original starts if the keyframes could not be read.
+
+    The window starts are '-ss' positions, which FFmpeg takes relative to the start time of the file. The keyframe
+    timestamps are packet timestamps, so the start time of the file is subtracted from them.
+
+    :param abspath:
+    :param starts:
+    :param sample_len:
+    :param start_time:  The format start_time of the file (see get_start_time_from_probe())
+    :param cache_directory:
+    :return:
+    """
+    if not starts:
+        return starts
+    read_intervals = ",".join("{}%+{}".format(int(s + start_time), int(sample_len)) for s in starts)
+    keyframe_index = get_keyframe_index(abspath, read_intervals=read_intervals, cache_directory=cache_directory)
+    if not keyframe_index:
+        return starts
+    aligned = []
+    for start in starts:
+        keyframe = keyframe_index.floor(start + start_time)
+        if keyframe is not None:
+            keyframe = max(0.0, round(keyframe - start_time, 6))
+        # Do not move the window back further than its own length
+        if keyframe is None or (start - keyframe) > sample_len:
+            keyframe = start
+        if keyframe not in aligned:
+            aligned.append(keyframe)
+    return aligned
+
+
+def parse_last_cropdetect(output_text: str) -> Optional[str]:
+    """
+    Extract the last crop (w:h:x:y) reported by the cropdetect filter in FFmpeg's output
+
+    :param output_text:
+    :return:
+    """
+    m = re.findall(r'\[Parsed_cropdetect.*\].*crop=(\d+:\d+:\d+:\d+)', output_text)
+    return m[-1] if m else None
+
+
+async def async_cropdetect_samples(commands: List[list]) -> List[str]:
+    """
+    Run FFmpeg cropdetect sample commands concurrently (at most runner.MAX_CONCURRENT_COMMANDS at once).
+    Returns the last crop reported by each command, or 'NO_CROP'.
+
+    :param commands:
+    :return:
+    """
+    results = await runner.gather(commands)
+    return [parse_last_cropdetect(out.decode("utf-8", errors="replace")) or "NO_CROP" for _, out in results]
+
+
+@spans.span('detect_black_bars')
 def detect_black_bars(abspath, probe_data, settings):
     """
     Detect black bars via ffmpeg cropdetect using quorum logic across multiple samples.
@@ -233,10 +472,7 @@ def detect_black_bars(abspath, probe_data, settings):
         or we exhaust feasible windows. 'No crop' is a valid quorum result.
 
     Sampling rules:
-      - If duration < 60s: one pass over the WHOLE file (no -t window).
-      - If duration unknown: start at 0s, sample 10s every 30s.
-      - If 60s ≤ duration ≤ 5min: sample 10s every 60s, starting at 30s.
-      - If duration > 5min: sample 20s, starting at 60s, every 5 minutes (assumption; see note).
+      - Windows are planned by plan_sample_windows().
 
     Returns:
       - crop string "w:h:x:y" if a non-trivial crop quorum is reached,
@@ -247,45 +483,6 @@ def detect_black_bars(abspath, probe_data, settings):
     # -------------------------
     # Helpers
     # -------------------------
-    def _get_video_duration_seconds_from_probe(_probe) -> Optional[float]:
-        fmt = _probe.get("format") if isinstance(_probe, dict) else None
-        if isinstance(fmt, dict):
-            dur = fmt.get("duration")
-            if dur is not None:
-                try:
-                    return float(dur)
-                except (TypeError, ValueError):
-                    pass
-        streams = _probe.get("streams") if isinstance(_probe, dict) else None
-        if isinstance(streams, list):
-            for s in streams:
-                if s.get("codec_type") == "video":
-                    dur = s.get("duration")
-                    if dur is not None:
-                        try:
-                            return float(dur)
-                        except (TypeError, ValueError):
-                            pass
-        if isinstance(fmt, dict) and isinstance(fmt.get("tags"), dict):
-            t = fmt["tags"]
-            ts = t.get("DURATION")
-            if ts and isinstance(ts, str):
-                parts = ts.split(":")
-                if len(parts) >= 3:
-                    try:
-                        h = float(parts[0]);
-                        m = float(parts[1]);
-                        s = float(parts[2])
-                        return h * 3600 + m * 60 + s
-                    except (TypeError, ValueError):
-                        pass
-        return None
-
-    def _parse_last_cropdetect(output_text: str) -> Optional[str]:
-        # Extract the last reported crop=WxH:X:Y
-        m = re.findall(r'\[Parsed_cropdetect.*\].*crop=(\d+:\d+:\d+:\d+)', output_text)
-        return m[-1] if m else None
-
     def _get_pix_fmt(streams) -> Optional[str]:
         if isinstance(streams, list):
             for s in streams:
@@ -414,7 +611,7 @@ def detect_black_bars(abspath, probe_data, settings):
 
         return f"{w_r}:{h_r}:{x_r}:{y_r}"
 
-    def _ffmpeg_sample(ss: int, t_seconds: Optional[int], r_to: Optional[int], enable_hw_accel=False) -> str:
+    def _sample_command(ss: float, t_seconds: Optional[int], r_to: Optional[int], enable_hw_accel=False) -> list:
         # NOTE: After adding HW accel, I actually found it to be slower.
         #   I am leaving the code here with a switch enable_hw_accel incase I come back to test further later on.
         mapper = StreamMapper(logger, ['video', 'audio', 'subtitle', 'data', 'attachment'])
@@ -459,7 +656,7 @@ def detect_black_bars(abspath, probe_data, settings):
         filter_id, filtergraph = join_filtergraph(filter_id, filter_args, stream_id)
 
         # Seek to the sample start
-        mapper.set_ffmpeg_generic_options(**{"-ss": str(int(ss))})
+        mapper.set_ffmpeg_generic_options(**{"-ss": format_seek_position(ss)})
 
         # Ingore non-video streams and insert filter
         adv_args = ["-an", "-sn", "-dn"]
@@ -472,28 +669,13 @@ def detect_black_bars(abspath, probe_data, settings):
         mapper.set_ffmpeg_advanced_options(*adv_args, **adv_kwargs)
         mapper.set_output_null()
 
-        ffmpeg_command = ['ffmpeg'] + mapper.get_ffmpeg_args()
-        pipe = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        out, _ = pipe.communicate()
-        raw = out.decode("utf-8", errors="replace")
+        return ['ffmpeg'] + mapper.get_ffmpeg_args()
 
-        crop = _parse_last_cropdetect(raw)
+    def _ffmpeg_sample(ss: float, t_seconds: Optional[int], r_to: Optional[int]) -> str:
+        _, out = runner.run(_sample_command(ss, t_seconds, r_to))
+        crop = parse_last_cropdetect(out.decode("utf-8", errors="replace"))
         return crop if crop else "NO_CROP"
 
-    def _gen_starts_known(total: float, first_start: int, step_between_starts: int, window: int, limit: int) -> Iterable[int]:
-        """
-        Generate start times so that each window fits within media (best-effort), up to 'limit' samples.
-        'step_between_starts' is the distance between window starts, *not* the gap itself.
-        """
-        # Ensure we don't start too close to EOF; keep a 1s buffer
-        max_start = max(0, int(total) - (window if window else 0) - 1)
-        s = max(0, int(first_start))
-        count = 0
-        while s <= max_start and count < limit:
-            yield s
-            s += int(step_between_starts)
-            count += 1
-
     def _quorum(last_three: List[str]) -> Optional[str]:
         """
         Given up to the last 3 observations, return:
@@ -527,7 +709,7 @@ def detect_black_bars(abspath, probe_data, settings):
     pix_fmt = _get_pix_fmt(probe_data.get('streams'))
     round_to, min_bar_px = _choose_round_and_minbar(pix_fmt)
 
-    total_duration = _get_video_duration_seconds_from_probe(probe_data)
+    total_duration = get_duration_seconds_from_probe(probe_data)
 
     MAX_SAMPLES = 7
     logger.info("[BB Detection] Sampling video file '%s' (width:%s, height:%s) to detect black bars",
@@ -561,178 +743,149 @@ def detect_black_bars(abspath, probe_data, settings):
         return None
 
     # Define sampling parameters
-    if total_duration is None:
-        # Unknown duration → 10s every 30s starting at 0s
-        sample_len = 10
-        first_start = 0
-        start_step = 30  # starts at 0,30,60,...
-        starts_iter = (first_start + i * start_step for i in range(MAX_SAMPLES))
-        logger.debug("[BB Detection] Unknown video duration. Sampling 10s every 30s starting at 0s (max %d samples)",
-                     MAX_SAMPLES)
+    sample_len, starts_iter = plan_sample_windows(total_duration, max_samples=MAX_SAMPLES, log_prefix="[BB Detection]")
+    starts_iter = align_windows_to_keyframes(abspath, starts_iter, sample_len,
+                                             start_time=get_start_time_from_probe(probe_data),
+                                             cache_directory=os.path.join(settings.get_profile_directory(), 'keyframes'))
 
-    elif total_duration <= 5 * 60:
-        # 60s .. 5min → 10s windows, small gap (~5s) between windows, start at 30s
-        sample_len = 10
-        small_gap = 5
-        first_start = 30
-        start_step = sample_len + small_gap  # 10s window + ~5s gap → next start +15s
-        starts_iter = _gen_starts_known(total_duration, first_start, start_step, sample_len, MAX_SAMPLES)
-        logger.debug("[BB Detection] Video duration 60s–5min. Sampling 10s windows, ~5s gap (start step=%ss) starting at 30s",
-                     start_step)
+    # -------------------------
+    # Rolling quorum loop (last 3) + merge & variable aspect check
+    # -------------------------
+    last_three: List[str] = []
+    all_observed: List[str] = []  # store all normalized crops
+    third_sample_value: Optional[str] = None  # for fallback
+    samples_taken = 0
 
-    elif total_duration <= 10 * 60:
-        # 5–10min → 20s windows, ~30s gap, start at 90s (hopefully skip any intros)
-        sample_len = 20
-        long_gap = 30
-        first_start = 90
-        start_step = sample_len + long_gap  # 20 + 30 = 50s between starts
-        starts_iter = _gen_starts_known(total_duration, first_start, start_step, sample_len, MAX_SAMPLES)
-        logger.debug("[BB Detection] Video duration 5–10min. Sampling %ss windows, ~%ss gap (start step=%ss) starting at %ss",
-                     sample_len,
-                     long_gap, start_step, first_start)
+    # The first two windows are always sampled, so sample them concurrently
+    first_samples = runner.run_coroutine(async_cropdetect_samples(
+        [_sample_command(ss, sample_len, round_to) for ss in starts_iter[:2]]))
 
-    else:
-        # >10min → 20s windows, ~30s gap, start at 5:00 (should skip any intros)
-        sample_len = 20
-        long_gap = 90
-        first_start = 300
-        start_step = sample_len + long_gap  # 20 + 90 = 1:50s between starts
-        starts_iter = _gen_starts_known(total_duration, first_start, start_step, sample_len, MAX_SAMPLES)
-        logger.debug("[BB Detection] Video duration >10min. Sampling %ss windows, ~%ss gap (start step=%ss) starting at %ss",
-                     sample_len,
-                     long_gap, start_step, first_start)
+    for ss in starts_iter:
+        if samples_taken >= MAX_SAMPLES:
+            break
 
-# -------------------------
-# Rolling quorum loop (last 3) + merge & variable aspect check
-# -------------------------
-last_three: List[str] = []
-all_observed: List[str] = []  # store all normalized crops
-third_sample_value: Optional[str] = None  # for fallback
-samples_taken = 0
-
-for ss in starts_iter:
-    if samples_taken >= MAX_SAMPLES:
-        break
-
-    raw_observed = _ffmpeg_sample(ss=int(ss), t_seconds=sample_len, r_to=round_to)
-    if raw_observed == "NO_CROP":
-        observed = "NO_CROP"
-        logger.debug("[BB Detection] Sample #%d @ %ss → raw=NO_CROP", samples_taken + 1, ss)
-    else:
-        observed = _normalise_crop_or_nocrop(
-            raw_observed, src_w, src_h,
-            min_sum_tb=12,
-            r_to=round_to,
-        )
-        if observed == "NO_CROP":
-            logger.debug("[BB Detection] Sample #%d @ %ss → raw=%s, normalised=NO_CROP",
-                         samples_taken + 1, ss, raw_observed)
-        elif observed != raw_observed:
-            logger.debug("[BB Detection] Sample #%d @ %ss → raw=%s, normalised=%s",
-                         samples_taken + 1, ss, raw_observed, observed)
+        if samples_taken < len(first_samples):
+            raw_observed = first_samples[samples_taken]
         else:
-            logger.debug("[BB Detection] Sample #%d @ %ss → %s", samples_taken + 1, ss, observed)
+            raw_observed = _ffmpeg_sample(ss=ss, t_seconds=sample_len, r_to=round_to)
+        if raw_observed == "NO_CROP":
+            observed = "NO_CROP"
+            logger.debug("[BB Detection] Sample #%d @ %ss → raw=NO_CROP", samples_taken + 1, ss)
+        else:
+            observed = _normalise_crop_or_nocrop(
+                raw_observed, src_w, src_h,
+                min_sum_tb=12,
+                r_to=round_to,
+            )
+            if observed == "NO_CROP":
+                logger.debug("[BB Detection] Sample #%d @ %ss → raw=%s, normalised=NO_CROP",
+                             samples_taken + 1, ss, raw_observed)
+            elif observed != raw_observed:
+                logger.debug("[BB Detection] Sample #%d @ %ss → raw=%s, normalised=%s",
+                             samples_taken + 1, ss, raw_observed, observed)
+            else:
+                logger.debug("[BB Detection] Sample #%d @ %ss → %s", samples_taken + 1, ss, observed)
 
-    samples_taken += 1
-    if samples_taken == 3:
-        third_sample_value = observed
+        samples_taken += 1
+        if samples_taken == 3:
+            third_sample_value = observed
 
-    last_three.append(observed)
-    if len(last_three) > 3:
-        last_three.pop(0)
+        last_three.append(observed)
+        if len(last_three) > 3:
+            last_three.pop(0)
 
-    # Keep all non-NO_CROP observed crops
-    if observed != "NO_CROP":
-        all_observed.append(observed)
+        # Keep all non-NO_CROP observed crops
+        if observed != "NO_CROP":
+            all_observed.append(observed)
 
-    logger.debug("[BB Detection] Current sample results=%s", last_three)
+        logger.debug("[BB Detection] Current sample results=%s", last_three)
 
-    # Early stop 2-of-2
-    if len(last_three) == 2 and last_three[0] == last_three[1]:
-        if last_three[0] == "NO_CROP":
-            logger.debug("[BB Detection] Decision: NO_CROP (2/2 agreement).")
-            break
-        logger.debug("[BB Detection] Decision: CROP=%s (2/2 agreement).", last_three[0])
-        break
-
-    # 2-of-3 quorum
-    if len(last_three) == 3:
-        decision = _quorum(last_three)
-        if decision is not None:
-            logger.debug("[BB Detection] Decision: CROP=%s (2/3 majority on %s).", decision, last_three)
-            break
-        if last_three.count("NO_CROP") >= 2:
-            logger.debug("[BB Detection] Decision: NO_CROP (2/3 majority on %s).", last_three)
+        # Early stop 2-of-2
+        if len(last_three) == 2 and last_three[0] == last_three[1]:
+            if last_three[0] == "NO_CROP":
+                logger.debug("[BB Detection] Decision: NO_CROP (2/2 agreement).")
+                break
+            logger.debug("[BB Detection] Decision: CROP=%s (2/2 agreement).", last_three[0])
             break
 
-# -------------------------
-# Merge similar crops
-# -------------------------
-def merge_crops(crops: List[str], threshold: float = 0.10) -> Optional[str]:
-    """
-    Merge crops that are within 'threshold' (10%) of each other.
-    Returns the crop that covers max area in the dominant cluster.
-    """
-    if not crops:
-        return None
-
-    clusters: List[List[str]] = []
-
-    def similar(a: str, b: str) -> bool:
-        wa, ha, xa, ya = map(int, a.split(":"))
-        wb, hb, xb, yb = map(int, b.split(":"))
-        # Compare relative differences
-        return all(abs(val_a - val_b) / max(val_a, val_b) <= threshold
-                   for val_a, val_b in zip((wa, ha, xa, ya), (wb, hb, xb, yb)))
-
-    for c in crops:
-        found = False
-        for cluster in clusters:
-            if any(similar(c, other) for other in cluster):
-                cluster.append(c)
-                found = True
+        # 2-of-3 quorum
+        if len(last_three) == 3:
+            decision = _quorum(last_three)
+            if decision is not None:
+                logger.debug("[BB Detection] Decision: CROP=%s (2/3 majority on %s).", decision, last_three)
+                break
+            if last_three.count("NO_CROP") >= 2:
+                logger.debug("[BB Detection] Decision: NO_CROP (2/3 majority on %s).", last_three)
                 break
-        if not found:
-            clusters.append([c])
-
-    # Pick the cluster with most members
-    dominant = max(clusters, key=lambda x: len(x))
-    # Compute merged crop by min x/y and max right/bottom
-    xs, ys, ws, hs = [], [], [], []
-    for crop in dominant:
-        w, h, x, y = map(int, crop.split(":"))
-        xs.append(x)
-        ys.append(y)
-        ws.append(x + w)
-        hs.append(y + h)
-    x_final = min(xs)
-    y_final = min(ys)
-    w_final = max(ws) - x_final
-    h_final = max(hs) - y_final
-
-    # Skip if it would result in full frame (no crop)
-    if w_final == src_w and h_final == src_h and x_final == 0 and y_final == 0:
-        return None
 
-    return f"{w_final}:{h_final}:{x_final}:{y_final}"
-
-final_crop = merge_crops(all_observed, threshold=0.10)
-
-# -------------------------
-# Variable aspect check
-# -------------------------
-if final_crop:
-    # Compare all crops in pixels; if any differ by >10% along dominant axis → likely VAR
-    dominant_axis = 'w' if src_w >= src_h else 'h'
-    vals = []
-    for c in all_observed:
-        w, h, x, y = map(int, c.split(":"))
-        vals.append(w if dominant_axis == 'w' else h)
-    max_val, min_val = max(vals), min(vals)
-    if (max_val - min_val) / max_val > 0.10:
-        logger.debug("[BB Detection] Variable aspect ratio detected; skipping crop.")
-        return None
+    # -------------------------
+    # Merge similar crops
+    # -------------------------
+    def merge_crops(crops: List[str], threshold: float = 0.10) -> Optional[str]:
+        """
+        Merge crops that are within 'threshold' (10%) of each other.
+        Returns the crop that covers max area in the dominant cluster.
+        """
+        if not crops:
+            return None
+
+        clusters: List[List[str]] = []
+
+        def similar(a: str, b: str) -> bool:
+            wa, ha, xa, ya = map(int, a.split(":"))
+            wb, hb, xb, yb = map(int, b.split(":"))
+            # Compare relative differences
+            return all(abs(val_a - val_b) / max(val_a, val_b) <= threshold
+                       for val_a, val_b in zip((wa, ha, xa, ya), (wb, hb, xb, yb)))
+
+        for c in crops:
+            found = False
+            for cluster in clusters:
+                if any(similar(c, other) for other in cluster):
+                    cluster.append(c)
+                    found = True
+                    break
+            if not found:
+                clusters.append([c])
+
+        # Pick the cluster with most members
+        dominant = max(clusters, key=lambda x: len(x))
+        # Compute merged crop by min x/y and max right/bottom
+        xs, ys, ws, hs = [], [], [], []
+        for crop in dominant:
+            w, h, x, y = map(int, crop.split(":"))
+            xs.append(x)
+            ys.append(y)
+            ws.append(x + w)
+            hs.append(y + h)
+        x_final = min(xs)
+        y_final = min(ys)
+        w_final = max(ws) - x_final
+        h_final = max(hs) - y_final
+
+        # Skip if it would result in full frame (no crop)
+        if w_final == src_w and h_final == src_h and x_final == 0 and y_final == 0:
+            return None
+
+        return f"{w_final}:{h_final}:{x_final}:{y_final}"
+
+    final_crop = merge_crops(all_observed, threshold=0.10)
+
+    # -------------------------
+    # Variable aspect check
+    # -------------------------
+    if final_crop:
+        # Compare all crops in pixels; if any differ by >10% along dominant axis → likely VAR
+        dominant_axis = 'w' if src_w >= src_h else 'h'
+        vals = []
+        for c in all_observed:
+            w, h, x, y = map(int, c.split(":"))
+            vals.append(w if dominant_axis == 'w' else h)
+        max_val, min_val = max(vals), min(vals)
+        if (max_val - min_val) / max_val > 0.10:
+            logger.debug("[BB Detection] Variable aspect ratio detected; skipping crop.")
+            return None
 
-if final_crop:
-    logger.debug("[BB Detection] Final merged crop: %s", final_crop)
-return final_crop
+    if final_crop:
+        logger.debug("[BB Detection] Final merged crop: %s", final_crop)
+    return final_crop
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.transcode_fallback.py
+
+    Written by:               Josh.5 <jsunnex@gmail.com>
+    Date:                     19 Oct 2026, (3:24 PM)
+
+    Copyright:
+        Copyright (C) 2021 Josh Sunnex
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import logging
+import time
+
+from video_transcoder.lib import plugin_stream_mapper
+from video_transcoder.lib.ffmpeg import database
+from video_transcoder.lib.tools import SettingsOverrides
+
+logger = logging.getLogger("Unmanic.Plugin.video_transcoder")
+
+# Fallback tiers in the order that they are tried
+TIER_HARDWARE = 'hardware'
+TIER_SOFTWARE_DECODE = 'software_decode'
+TIER_SOFTWARE_ENCODE = 'software_encode'
+TIERS = [TIER_HARDWARE, TIER_SOFTWARE_DECODE, TIER_SOFTWARE_ENCODE]
+
+# Settings that select the hardware decoder of each HW encoder
+HW_DECODING_METHOD_SETTINGS = {
+    "h264_nvenc": "nvenc_decoding_method",
+    "hevc_nvenc": "nvenc_decoding_method",
+    "h264_qsv":   "qsv_decoding_method",
+    "hevc_qsv":   "qsv_decoding_method",
+    "av1_qsv":    "qsv_decoding_method",
+    "h264_vaapi": "vaapi_decoding_method",
+    "hevc_vaapi": "vaapi_decoding_method",
+}
+
+# Software encoders used for the last tier, by codec
+SOFTWARE_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "av1":  "libsvtav1",
+}
+
+# A recorded tier is only trusted for this long. After that the hardware tier is tried again.
+TIER_HISTORY_SECONDS = 7 * 24 * 3600
+
+schema = [
+    """
+    CREATE TABLE IF NOT EXISTS fallback_tiers (
+        encoder    TEXT NOT NULL,
+        codec      TEXT NOT NULL,
+        profile    TEXT NOT NULL,
+        pix_fmt    TEXT NOT NULL,
+        tier       TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (encoder, codec, profile, pix_fmt)
+    )
+    """,
+]
+
+
+def fallback_supported(settings):
+    """
+    Returns True if the configured encoder can fall back to other tiers
+
+    :param settings:
+    :return:
+    """
+    if not settings.get_setting('enable_hw_fallback'):
+        return False
+    if settings.get_setting('mode') not in ['basic', 'standard']:
+        return False
+    return settings.get_setting('video_encoder') in HW_DECODING_METHOD_SETTINGS
+
+
+def tier_settings(settings, tier):
+    """
+    Returns the settings used to build the FFmpeg command of a fallback tier
+
+    :param settings:
+    :param tier:
+    :return:
+    """
+    encoder_name = settings.get_setting('video_encoder')
+    if tier == TIER_HARDWARE:
+        return settings
+    if tier == TIER_SOFTWARE_DECODE:
+        return SettingsOverrides(settings, {HW_DECODING_METHOD_SETTINGS[encoder_name]: 'cpu'})
+    software_encoder = SOFTWARE_ENCODERS.get(settings.get_setting('video_codec'))
+    if not software_encoder:
+        return None
+    return SettingsOverrides(settings, {
+        HW_DECODING_METHOD_SETTINGS[encoder_name]: 'cpu',
+        'video_encoder':                           software_encoder,
+    })
+
+
+def source_key(settings, probe):
+    """
+    Returns the key that fallback tiers are recorded against for a file
+
+    :param settings:
+    :param probe:
+    :return:
+    """
+    for stream in probe.get('streams', []):
+        if stream.get('codec_type') != 'video' or stream.get('disposition', {}).get('attached_pic'):
+            continue
+        return (
+            settings.get_setting('video_encoder'),
+            str(stream.get('codec_name', '')),
+            str(stream.get('profile', '')),
+            str(stream.get('pix_fmt', '')),
+        )
+    return None
+
+
+class TierHistory(object):
+    """
+    TierHistory
+
+    Records the fallback tier that last succeeded for each encoder and source codec/profile/pix_fmt
+    """
+
+    def __init__(self, settings):
+        self.db_file = database.get_database_file(settings, 'transcode_fallback.db')
+
+    def __connection(self):
+        return database.get_connection(self.db_file, schema=schema)
+
+    def get(self, key):
+        """
+        Returns the tier that last succeeded for the given key, or None if there is no recent record
+
+        :param key:
+        :return:
+        """
+        row = self.__connection().execute(
+            "SELECT tier, updated_at FROM fallback_tiers WHERE encoder = ? AND codec = ? AND profile = ? "
+            "AND pix_fmt = ?",
+            tuple(key)
+        ).fetchone()
+        if not row or row[0] not in TIERS or (time.time() - row[1]) > TIER_HISTORY_SECONDS:
+            return None
+        return row[0]
+
+    def record(self, key, tier):
+        """
+        Record the tier that succeeded for the given key
+
+        :param key:
+        :param tier:
+        :return:
+        """
+        connection = self.__connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO fallback_tiers (encoder, codec, profile, pix_fmt, tier, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                tuple(key) + (tier, time.time())
+            )
+        logger.info("Recorded fallback tier '%s' for %s", tier, "/".join(key))
+
+
+def build_tier_commands(settings, abspath, probe, mapper):
+    """
+    Build the FFmpeg command of each fallback tier, starting at the tier that last succeeded for this kind of source.
+    The given mapper is the one already configured for the hardware tier.
+    Tiers that would run the same command as an earlier tier are skipped.
+    Returns a list of (tier, command) tuples.
+
+    :param settings:
+    :param abspath:
+    :param probe:
+    :param mapper:
+    :return:
+    """
+    tiers = TIERS
+    key = source_key(settings, probe)
+    if key:
+        recorded_tier = TierHistory(settings).get(key)
+        if recorded_tier:
+            tiers = TIERS[TIERS.index(recorded_tier):]
+
+    commands = []
+    for tier in tiers:
+        if tier == TIER_HARDWARE:
+            tier_mapper = mapper
+        else:
+            settings_for_tier = tier_settings(settings, tier)
+            if settings_for_tier is None:
+                continue
+            tier_mapper = plugin_stream_mapper.PluginStreamMapper()
+            # Reuse the black bar detection of the hardware tier
+            tier_mapper.set_crop_value(mapper.crop_value)
+            tier_mapper.set_default_values(settings_for_tier, abspath, probe)
+            if not tier_mapper.streams_need_processing():
+                continue
+            tier_mapper.set_output_file(mapper.output_file)
+        command = ['ffmpeg'] + tier_mapper.get_ffmpeg_args()
+        if any(command == c for _, c in commands):
+            continue
+        commands.append((tier, command))
+    return commands
@@ -22,20 +22,12 @@
 
 """
 
-"""
-TODO:
-    - Add support for 2-pass libx264 and libx265
-    - Add support for VAAPI 264
-    - Add support for NVENC 264/265
-    - Add advanced input forms for building custom ffmpeg queries
-    - Add support for source bitrate matching on basic mode
-"""
-
 import logging
 import os
+import sys
 
-from video-transcoder-plus.lib import plugin_stream_mapper, tools
-from video-transcoder-plus.lib.ffmpeg import Parser, Probe
+from video-transcoder-plus.lib import device_scheduler, fallback_encode, plugin_stream_mapper, preflight, segmented_encode, tools, transcode_fallback
+from video-transcoder-plus.lib.ffmpeg import FileRegistry, Parser, PreFilter, Probe, runner, spans
 from video-transcoder-plus.lib.global_settings import GlobalSettings
 from video-transcoder-plus.lib.encoders.libx import LibxEncoder
 from video-transcoder-plus.lib.encoders.qsv import QsvEncoder
@@ -52,11 +44,28 @@ logger = logging.getLogger("Unmanic.Plugin.video-transcoder-plus")
 
 class Settings(PluginSettings):
 
+    @spans.span('Settings')
     def __init__(self, *args, **kwargs):
         super(Settings, self).__init__(*args, **kwargs)
         self.settings = self.__build_settings_object()
         self.global_settings = GlobalSettings(self)
-        self.form_settings = self.__build_form_settings_object()
+        self.__form_settings = None
+
+    @property
+    def form_settings(self):
+        """
+        The form settings are only built the first time they are requested.
+        Runners never render the form, so they do not need to pay for probing the available encoders and devices.
+
+        :return:
+        """
+        if self.__form_settings is None:
+            self.__form_settings = self.__build_form_settings_object()
+        return self.__form_settings
+
+    @form_settings.setter
+    def form_settings(self, value):
+        self.__form_settings = value
 
     def __build_form_settings_object(self):
         """
@@ -134,6 +143,9 @@ class Settings(PluginSettings):
         advanced_input_options = global_settings.get('advanced_input_options')
         output_settings = global_settings.get('output_settings')
         filter_settings = global_settings.get('filter_settings')
+        segmented_settings = global_settings.get('segmented_settings')
+        preflight_settings = global_settings.get('preflight_settings')
+        fallback_settings = global_settings.get('fallback_settings')
         return {
             **main_options,
             **encoder_selection,
@@ -141,17 +153,17 @@ class Settings(PluginSettings):
             **advanced_input_options,
             **output_settings,
             **filter_settings,
+            **segmented_settings,
+            **preflight_settings,
+            **fallback_settings,
         }
 
 
-def file_marked_as_force_transcoded(path):
-    directory_info = UnmanicDirectoryInfo(os.path.dirname(path))
+@spans.span('file_marked_as_force_transcoded')
+def file_marked_as_force_transcoded(settings, path):
+    registry = FileRegistry(settings, 'video-transcoder-plus', logger)
     try:
-        has_been_force_transcoded = directory_info.get('video-transcoder-plus', os.path.basename(path))
-    except NoSectionError as e:
-        has_been_force_transcoded = ''
-    except NoOptionError as e:
-        has_been_force_transcoded = ''
+        has_been_force_transcoded = registry.get(path)
     except Exception as e:
         logger.debug("Unknown exception %s.", e)
         has_been_force_transcoded = ''
@@ -164,6 +176,7 @@ def file_marked_as_force_transcoded(path):
     return False
 
 
+@runner.track_runner(logger)
 def on_library_management_file_test(data):
     """
     Runner function - enables additional actions during the library management file tests.
@@ -187,19 +200,47 @@ def on_library_management_file_test(data):
     # Get the path to the file
     abspath = data.get('path')
 
-    # Get file probe
-    probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'])
-    if not probe:
-        # File not able to be probed by ffprobe
+    # Reject files by their name and size, or reuse the verdict from a previous scan of this file with the same
+    # settings, before probing it
+    file_prefilter = PreFilter('video-transcoder-plus', ['video'], settings=settings,
+                               library_id=data.get('library_id'))
+    with spans.span('PreFilter.check'):
+        rejected, cached_verdict = file_prefilter.check(abspath)
+    if rejected:
+        logger.debug("File '%s' rejected by the pre-filter.", abspath)
         return
 
-    # Get stream mapper
-    mapper = plugin_stream_mapper.PluginStreamMapper()
-    mapper.set_default_values(settings, abspath, probe)
+    if cached_verdict is not None:
+        needs_processing, forced_encode = cached_verdict
+        logger.debug("File '%s' verdict loaded from decision cache.", abspath)
+    else:
+        # Get file probe
+        probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'])
+        if not probe:
+            # File not able to be probed by ffprobe
+            return
 
-    # Check if this file needs to be processed
-    if mapper.streams_need_processing():
-        if file_marked_as_force_transcoded(abspath) and mapper.forced_encode:
+        # Get stream mapper
+        mapper = plugin_stream_mapper.PluginStreamMapper()
+        mapper.set_default_values(settings, abspath, probe)
+
+        # Check if this file needs to be processed
+        needs_processing = mapper.streams_need_processing()
+        forced_encode = mapper.forced_encode
+
+        # Check that transcoding the video is expected to pay off
+        if needs_processing and settings.get_setting('enable_preflight_check') and preflight.encodes_video(mapper):
+            prediction = preflight.run_preflight(mapper, probe, settings, abspath)
+            min_savings = float(settings.get_setting('preflight_min_savings_percent'))
+            if prediction and prediction.get('predicted_savings_percent') < min_savings:
+                logger.debug("File '%s' is predicted to only save %s%%. Pre-flight check will ignore this file.",
+                             abspath, prediction.get('predicted_savings_percent'))
+                needs_processing = False
+
+        file_prefilter.store(abspath, needs_processing, forced_encode)
+
+    if needs_processing:
+        if file_marked_as_force_transcoded(settings, abspath) and forced_encode:
             logger.debug(
                 "File '%s' has been previously marked as forced transcoded. Plugin found streams require processing, but will ignore this file.",
                 abspath)
@@ -211,6 +252,7 @@ def on_library_management_file_test(data):
         logger.debug("File '%s' does not contain streams require processing.", abspath)
 
 
+@runner.track_runner(logger)
 def on_worker_process(data):
     """
     Runner function - enables additional configured processing jobs during the worker stages of a task.
@@ -239,19 +281,47 @@ def on_worker_process(data):
     # Get the path to the file
     abspath = data.get('file_in')
 
+    # If this runner was repeated after a HW fallback encode, record the tier that succeeded.
+    # The file has already been transcoded, so there is nothing more to do.
+    fallback_directory = os.path.join(os.path.dirname(data.get('file_out')), 'hw_fallback')
+    fallback_result_file = os.path.join(fallback_directory, 'result.json')
+    fallback_result = fallback_encode.read_result(fallback_result_file)
+    if fallback_result:
+        if fallback_result.get('source_key'):
+            history = transcode_fallback.TierHistory(settings)
+            history.record(fallback_result['source_key'], fallback_result['tier'])
+        os.remove(fallback_result_file)
+        return
+
     # Get file probe
     probe = Probe(logger, allowed_mimetypes=['video'])
     if not probe.file(abspath):
         # File probe failed, skip the rest of this test
         return
 
+    # Lease a HW device to this task if the device is selected automatically. It is released by the post-processor.
+    settings = device_scheduler.lease_scheduled_device(settings, os.path.dirname(data.get('file_out')))
+
     # Get stream mapper
     mapper = plugin_stream_mapper.PluginStreamMapper()
     mapper.set_default_values(settings, abspath, probe)
 
+    # Configure the pass of a two-pass encode.
+    # Both passes share a stats file in the task's cache directory. The first pass writes a marker file next to it so
+    # that this runner knows to run the second pass when it is repeated.
+    encode_pass = None
+    first_pass_marker = None
+    if mapper.two_pass_encode_enabled():
+        stats_directory = os.path.join(os.path.dirname(data.get('file_out')), 'two_pass_stats')
+        if not os.path.exists(stats_directory):
+            os.makedirs(stats_directory)
+        first_pass_marker = os.path.join(stats_directory, '.first_pass')
+        encode_pass = 2 if os.path.exists(first_pass_marker) else 1
+        mapper.set_encode_pass(encode_pass, os.path.join(stats_directory, 'ffmpeg2pass'))
+
     # Check if this file needs to be processed
     if mapper.streams_need_processing():
-        if file_marked_as_force_transcoded(abspath) and mapper.forced_encode:
+        if file_marked_as_force_transcoded(settings, abspath) and mapper.forced_encode:
             # Do not process this file, it has been force transcoded once before
             return
 
@@ -267,6 +337,11 @@ def on_worker_process(data):
             mapper.set_output_file(new_file_out)
             data['file_out'] = new_file_out
 
+        if encode_pass == 1:
+            # The first pass only generates the encoder stats file. Discard the output and skip all other streams
+            mapper.set_output_null()
+            mapper.set_ffmpeg_advanced_options('-an', '-sn', '-dn')
+
         # # Pretty, wrapped printing of the command to null for debugging. Should always be commented out.
         # mapper.set_output_null()
         # print(tools.format_command_multiline(mapper, max_width=120))
@@ -282,6 +357,48 @@ def on_worker_process(data):
         parser = Parser(logger)
         parser.set_probe(probe)
         data['command_progress_parser'] = parser.parse_progress
+        if encode_pass == 1:
+            # Run this runner again for the second pass once the first pass has completed
+            with open(first_pass_marker, 'w') as f:
+                f.write('')
+            data['repeat'] = True
+            data['command_progress_parser'] = tools.scaled_progress_parser(parser.parse_progress, 0, 50)
+        elif encode_pass == 2:
+            data['command_progress_parser'] = tools.scaled_progress_parser(parser.parse_progress, 50, 100)
+
+        if transcode_fallback.fallback_supported(settings) and preflight.encodes_video(mapper):
+            # Run each fallback tier until one succeeds. This runner is then repeated to record the tier.
+            tier_commands = transcode_fallback.build_tier_commands(settings, abspath, probe, mapper)
+            if len(tier_commands) == 1:
+                data['exec_command'] = tier_commands[0][1]
+            elif tier_commands:
+                if not os.path.exists(fallback_directory):
+                    os.makedirs(fallback_directory)
+                manifest_file = os.path.join(fallback_directory, 'manifest.json')
+                fallback_encode.write_manifest(manifest_file, {
+                    "output_file": mapper.output_file,
+                    "result_file": fallback_result_file,
+                    "source_key":  transcode_fallback.source_key(settings, probe),
+                    "tiers":       [{"name": tier, "command": command} for tier, command in tier_commands],
+                })
+                data['exec_command'] = [sys.executable, fallback_encode.__file__, manifest_file]
+                data['repeat'] = True
+
+        if mapper.segmented_encode_enabled() and preflight.encodes_video(mapper):
+            # Run the segmented encode script in place of a single FFmpeg command
+            work_directory = os.path.join(os.path.dirname(data.get('file_out')), 'segmented_encode')
+            if not os.path.exists(work_directory):
+                os.makedirs(work_directory)
+            manifest_file = os.path.join(work_directory, 'manifest.json')
+            segmented_encode.write_manifest(manifest_file, {
+                "input_file":     abspath,
+                "output_file":    mapper.output_file,
+                "work_directory": work_directory,
+                "parallelism":    settings.get_setting('segmented_encode_parallelism'),
+                **mapper.get_segmented_encode_args(),
+            })
+            data['exec_command'] = [sys.executable, segmented_encode.__file__, manifest_file]
+            data['command_progress_parser'] = segmented_encode.ProgressParser().parse_progress
 
         if settings.get_setting('force_transcode'):
             cache_directory = os.path.dirname(data.get('file_out'))
@@ -293,6 +410,7 @@ def on_worker_process(data):
     return
 
 
+@runner.track_runner(logger)
 def on_postprocessor_task_results(data):
     """
     Runner function - provides a means for additional postprocessor functions based on the task success.
@@ -311,6 +429,10 @@ def on_postprocessor_task_results(data):
     # Get settings
     settings = Settings(library_id=data.get('library_id'))
 
+    # Release any HW device leased to this task
+    if data.get('final_cache_path'):
+        device_scheduler.release_scheduled_device(settings, os.path.dirname(data.get('final_cache_path')))
+
     # Get the original file's absolute path
     original_source_path = data.get('source_data', {}).get('abspath')
     if not original_source_path:
@@ -332,4 +454,6 @@ def on_postprocessor_task_results(data):
             directory_info = UnmanicDirectoryInfo(os.path.dirname(transcoded_file_path))
             directory_info.set('video-transcoder-plus', os.path.basename(transcoded_file_path), 'force_transcoded')
             directory_info.save()
+            registry = FileRegistry(settings, 'video-transcoder-plus', logger)
+            registry.mark(transcoded_file_path, 'force_transcoded')
             logger.debug("Ignore on next scan written for '%s'.", transcoded_file_path)
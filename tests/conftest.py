@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.conftest
+
+    Makes the plugins in 'source/' importable by their plugin ID (and the aliases of 'PLUGIN_ALIASES') the same way
+    the benchmark harness does, against the stand-in 'unmanic' package from 'benchmarks/stubs'.
+    The fake ffmpeg/ffprobe from 'benchmarks/fake_bin' are put on the PATH, so no FFmpeg is required.
+
+    Usage:
+        python3 -m pytest tests
+
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, 'benchmarks'))
+import run_benchmarks  # noqa: E402
+
+_workspace = tempfile.mkdtemp(prefix='unmanic_plugin_tests_')
+atexit.register(shutil.rmtree, _workspace, True)
+os.environ['UNMANIC_BENCHMARK_PROFILE_ROOT'] = os.path.join(_workspace, 'profiles')
+os.environ['PATH'] = run_benchmarks.FAKE_BIN_DIRECTORY + os.pathsep + os.environ.get('PATH', '')
+run_benchmarks.create_import_path(_workspace, run_benchmarks.list_plugins())
+
+
+def import_plugin(plugin_id):
+    """
+    Import the plugin module of a plugin by its plugin ID
+
+    :param plugin_id:
+    :return:
+    """
+    module, error = run_benchmarks.import_plugin(plugin_id)
+    if module is None:
+        raise ImportError("Unable to import {}: {}".format(plugin_id, error))
+    return module
+
+
+class FakeSettings(object):
+    """Plugin settings holding a plain dict of values"""
+
+    def __init__(self, values=None, profile_directory=None):
+        self.values = dict(values or {})
+        self.profile_directory = profile_directory
+
+    def get_setting(self, key=None):
+        if key is None:
+            return self.values
+        return self.values.get(key)
+
+    def set_setting(self, key, value):
+        self.values[key] = value
+        return True
+
+    def get_profile_directory(self):
+        os.makedirs(self.profile_directory, exist_ok=True)
+        return self.profile_directory
+
+
+def video_probe(codec_name='h264', pix_fmt='yuv420p', width=1920, height=1080, extra_streams=None):
+    """
+    Returns an ffprobe result of a file with one video stream
+
+    :param codec_name:
+    :param pix_fmt:
+    :param width:
+    :param height:
+    :param extra_streams:
+    :return:
+    """
+    streams = [{
+        'index':      0,
+        'codec_name': codec_name,
+        'codec_type': 'video',
+        'pix_fmt':    pix_fmt,
+        'width':      width,
+        'height':     height,
+        'start_time': '0.000000',
+    }]
+    for index, stream in enumerate(extra_streams or [], start=1):
+        streams.append(dict(stream, index=index))
+    return {
+        'streams': streams,
+        'format':  {'filename': 'source.mkv', 'start_time': '0.000000', 'duration': '60.000000'},
+    }
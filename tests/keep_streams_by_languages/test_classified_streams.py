@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.keep_streams_by_languages.test_classified_streams
+
+    Tests for the streams that 'ClassifiedStreams' in keep_streams_by_languages removes.
+    Requires the plugin's own requirements (python-iso639).
+
+"""
+import pytest
+
+pytest.importorskip('iso639')
+
+from conftest import import_plugin  # noqa: E402
+
+plugin = import_plugin('keep_streams_by_languages')
+
+STREAMS = [
+    {'index': 0, 'codec_type': 'video', 'codec_name': 'h264'},
+    {'index': 1, 'codec_type': 'subtitle', 'codec_name': 'subrip', 'tags': {'language': 'fre'}},
+    {'index': 2, 'codec_type': 'audio', 'codec_name': 'aac', 'tags': {'language': 'eng'}},
+    {'index': 3, 'codec_type': 'audio', 'codec_name': 'aac', 'tags': {'language': 'fre'}},
+    {'index': 4, 'codec_type': 'subtitle', 'codec_name': 'subrip', 'tags': {'language': 'eng'}},
+]
+
+
+def classified_streams():
+    rules = plugin.LanguageRules(audio_languages='eng', subtitle_languages='eng')
+    return plugin.ClassifiedStreams(rules, STREAMS, input_file='source.mkv')
+
+
+def test_dropped_streams_are_a_frozenset():
+    classified = classified_streams()
+    assert classified.dropped == frozenset([1, 3])
+    assert isinstance(classified.dropped, frozenset)
+
+
+def test_dropped_streams_in_order_are_grouped_by_type():
+    assert classified_streams().dropped_in_order == [3, 1]
+
+
+def test_stream_mapper_removes_dropped_streams():
+    mapper = plugin.PluginStreamMapper()
+    mapper.set_classified_streams(classified_streams())
+    assert [mapper.test_stream_needs_processing(s) for s in STREAMS[1:]] == [True, False, True, False]
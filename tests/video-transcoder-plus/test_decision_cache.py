@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.video-transcoder-plus.test_decision_cache
+
+    Tests for the eviction of verdicts of missing files from 'lib/ffmpeg/decision_cache.py'.
+
+"""
+import os
+
+import pytest
+
+from conftest import FakeSettings
+from video_transcoder.lib.ffmpeg import decision_cache
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """A library of 10 files with a stored verdict for each"""
+    monkeypatch.setattr(decision_cache, '_eviction_state', {})
+    monkeypatch.setattr(decision_cache, 'EVICTION_BATCH_SIZE', 4)
+    library_root = tmp_path / 'library'
+    library_root.mkdir()
+    settings = FakeSettings({'mode': 'basic'}, profile_directory=str(tmp_path / 'profile'))
+    cache = decision_cache.DecisionCache(settings, library_id=1)
+    paths = []
+    for number in range(10):
+        path = library_root / 'show' / 'episode_{:02d}.mkv'.format(number)
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b'video')
+        cache.set(str(path), needs_processing=True)
+        paths.append(str(path))
+    return cache, str(library_root), paths
+
+
+def cached_paths(cache):
+    connection = decision_cache.database.get_connection(cache.db_file, schema=decision_cache.schema)
+    return sorted(row[0] for row in connection.execute("SELECT path FROM file_decisions"))
+
+
+def test_evicts_missing_files_in_bounded_batches(library, monkeypatch):
+    cache, library_root, paths = library
+    for path in paths[:6]:
+        os.remove(path)
+    checked = []
+    exists = os.path.exists
+    monkeypatch.setattr(decision_cache.os.path, 'exists', lambda path: checked.append(path) or exists(path))
+
+    cache.evict_missing(force=True)
+    assert checked == paths[:4]
+    assert cached_paths(cache) == paths[4:]
+
+    cache.evict_missing(force=True)
+    assert cached_paths(cache) == paths[6:]
+
+
+def test_eviction_wraps_around_to_the_first_path(library):
+    cache, library_root, paths = library
+    cache.evict_missing(force=True)
+    cache.evict_missing(force=True)
+    cache.evict_missing(force=True)
+    os.remove(paths[0])
+    cache.evict_missing(force=True)
+    assert cached_paths(cache) == paths[1:]
+
+
+def test_eviction_is_skipped_when_the_library_root_does_not_exist(library, tmp_path):
+    cache, library_root, paths = library
+    # Simulate an unmounted library
+    os.rename(library_root, str(tmp_path / 'unmounted'))
+    cache.evict_missing(force=True)
+    assert cached_paths(cache) == paths
+
+
+def test_eviction_runs_at_most_once_per_interval(library):
+    cache, library_root, paths = library
+    cache.evict_missing()
+    for path in paths:
+        os.remove(path)
+    cache.evict_missing()
+    assert cached_paths(cache) == paths
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.video-transcoder-plus.test_decode_support
+
+    Tests for 'lib/encoders/decode_support.py' and the decoding method fallback of the hardware encoders.
+
+"""
+import pytest
+
+from conftest import FakeSettings, video_probe
+from video_transcoder.lib.encoders import decode_support
+from video_transcoder.lib.encoders.nvenc import NvencEncoder
+from video_transcoder.lib.encoders.vaapi import VaapiEncoder
+
+# 'vainfo --display drm --device /dev/dri/renderD128' on an Intel UHD 630 (iHD driver)
+VAINFO_OUTPUT = """\
+Trying display: drm
+libva info: VA-API version 1.20.0
+libva info: Trying to open /usr/lib/x86_64-linux-gnu/dri/iHD_drv_video.so
+libva info: Found init function __vaDriverInit_1_20
+libva info: va_openDriver() returns 0
+vainfo: VA-API version: 1.20 (libva 2.12.0)
+vainfo: Driver version: Intel iHD driver for Intel(R) Gen Graphics - 24.1.0 ()
+vainfo: Supported profile and entrypoints
+      VAProfileNone                   : VAEntrypointVideoProc
+      VAProfileNone                   : VAEntrypointStats
+      VAProfileMPEG2Simple            : VAEntrypointVLD
+      VAProfileMPEG2Simple            : VAEntrypointEncSlice
+      VAProfileMPEG2Main              : VAEntrypointVLD
+      VAProfileH264Main               : VAEntrypointVLD
+      VAProfileH264Main               : VAEntrypointEncSlice
+      VAProfileH264High               : VAEntrypointVLD
+      VAProfileH264High               : VAEntrypointEncSlice
+      VAProfileJPEGBaseline           : VAEntrypointVLD
+      VAProfileH264ConstrainedBaseline: VAEntrypointVLD
+      VAProfileVP8Version0_3          : VAEntrypointVLD
+      VAProfileHEVCMain               : VAEntrypointVLD
+      VAProfileHEVCMain               : VAEntrypointEncSlice
+      VAProfileHEVCMain10             : VAEntrypointVLD
+      VAProfileHEVCMain10             : VAEntrypointEncSlice
+      VAProfileVP9Profile0            : VAEntrypointVLD
+      VAProfileVP9Profile2            : VAEntrypointVLD
+      VAProfileHEVCMain444            : VAEntrypointEncSliceLP
+"""
+
+# 'ffmpeg -hide_banner -hwaccels'
+HWACCELS_OUTPUT = """\
+Hardware acceleration methods:
+vdpau
+cuda
+vaapi
+qsv
+drm
+opencl
+vulkan
+
+"""
+
+VAAPI_DEVICE = {'hwaccel_device': 'renderD128', 'hwaccel_device_path': '/dev/dri/renderD128'}
+
+
+@pytest.fixture
+def capabilities(monkeypatch):
+    """Replace the cached capability queries with the canned tool output"""
+    cache = {
+        ('hwaccels',):                                   decode_support.parse_hwaccels(HWACCELS_OUTPUT),
+        ('nvdec',):                                      decode_support.NVDEC_DECODE_MATRIX,
+        ('vainfo', VAAPI_DEVICE['hwaccel_device_path']): decode_support.parse_vainfo(VAINFO_OUTPUT),
+    }
+    monkeypatch.setattr(decode_support, '_cache', cache)
+    return cache
+
+
+def nvenc_encoder(decoding_method, probe_info):
+    encoder = NvencEncoder(FakeSettings({'nvenc_decoding_method': decoding_method}))
+    encoder.set_probe(probe_info=probe_info)
+    return encoder
+
+
+def vaapi_encoder(probe_info):
+    encoder = VaapiEncoder(FakeSettings({'vaapi_decoding_method': 'vaapi'}))
+    encoder.set_probe(probe_info=probe_info)
+    return encoder
+
+
+def test_parse_hwaccels():
+    assert decode_support.parse_hwaccels(HWACCELS_OUTPUT) == ['vdpau', 'cuda', 'vaapi', 'qsv', 'drm', 'opencl',
+                                                              'vulkan']
+
+
+def test_parse_hwaccels_without_output():
+    assert decode_support.parse_hwaccels('') == []
+    assert decode_support.parse_hwaccels(None) == []
+
+
+def test_parse_vainfo():
+    assert decode_support.parse_vainfo(VAINFO_OUTPUT) == {
+        'mpeg2video': {'420': 8},
+        'h264':       {'420': 8},
+        'mjpeg':      {'420': 8},
+        'vp8':        {'420': 8},
+        'hevc':       {'420': 10},
+        'vp9':        {'420': 10},
+    }
+
+
+def test_parse_vainfo_ignores_encode_only_profiles():
+    # HEVC 4:4:4 is only listed with an encode entrypoint
+    assert '444' not in decode_support.parse_vainfo(VAINFO_OUTPUT)['hevc']
+
+
+@pytest.mark.parametrize('pix_fmt, bit_depth', [
+    ('yuv420p', 8),
+    ('yuvj420p', 8),
+    ('nv12', 8),
+    ('yuv420p10le', 10),
+    ('yuv422p10be', 10),
+    ('yuv444p12le', 12),
+    ('p010le', 10),
+    ('p016le', 16),
+    ('gbrp10le', 10),
+    (None, 8),
+])
+def test_pix_fmt_bit_depth(pix_fmt, bit_depth):
+    assert decode_support.pix_fmt_bit_depth(pix_fmt) == bit_depth
+
+
+@pytest.mark.parametrize('codec_name, pix_fmt, supported', [
+    ('h264', 'yuv420p', True),
+    ('h264', 'yuv420p10le', False),
+    ('hevc', 'yuv420p10le', True),
+    ('hevc', 'yuv420p12le', True),
+    ('hevc', 'yuv422p10le', False),
+    ('hevc', 'yuv444p12le', True),
+    ('prores', 'yuv422p10le', False),
+])
+def test_stream_decode_supported_nvdec(codec_name, pix_fmt, supported):
+    stream_info = {'codec_name': codec_name, 'pix_fmt': pix_fmt}
+    assert decode_support.stream_decode_supported(decode_support.NVDEC_DECODE_MATRIX, stream_info) is supported
+
+
+@pytest.mark.parametrize('codec_name, pix_fmt, supported', [
+    ('hevc', 'yuv420p10le', True),
+    ('hevc', 'yuv420p12le', False),
+    ('hevc', 'yuv422p10le', False),
+    ('vp9', 'yuv420p10le', True),
+    ('av1', 'yuv420p', False),
+])
+def test_stream_decode_supported_vainfo(codec_name, pix_fmt, supported):
+    matrix = decode_support.parse_vainfo(VAINFO_OUTPUT)
+    stream_info = {'codec_name': codec_name, 'pix_fmt': pix_fmt}
+    assert decode_support.stream_decode_supported(matrix, stream_info) is supported
+
+
+def test_stream_decode_supported_unknown_matrix():
+    assert decode_support.stream_decode_supported(None, {'codec_name': 'h264', 'pix_fmt': 'yuv420p'}) is None
+
+
+def test_nvdec_keeps_cuda_for_supported_source(capabilities):
+    encoder = nvenc_encoder('cuda', video_probe('hevc', 'yuv420p10le'))
+    assert encoder.decoding_method() == 'cuda'
+
+
+def test_nvdec_falls_back_to_cpu_for_h264_10bit(capabilities):
+    encoder = nvenc_encoder('cuda', video_probe('h264', 'yuv420p10le'))
+    assert encoder.decoding_method() == 'cpu'
+
+
+def test_nvdec_falls_back_to_cpu_for_hevc_422(capabilities):
+    encoder = nvenc_encoder('cuda', video_probe('hevc', 'yuv422p10le'))
+    assert encoder.decoding_method() == 'cpu'
+
+
+def test_nvdec_ignores_cover_art(capabilities):
+    cover_art = {'codec_name': 'mjpeg', 'codec_type': 'video', 'pix_fmt': 'yuvj444p',
+                 'disposition': {'attached_pic': 1}}
+    probe_info = video_probe('h264', 'yuv420p', extra_streams=[cover_art])
+    probe_info['streams'].reverse()
+    assert nvenc_encoder('cuda', probe_info).decoding_method() == 'cuda'
+
+
+def test_falls_back_to_cpu_for_missing_hwaccel(capabilities):
+    capabilities[('hwaccels',)] = ['vdpau', 'vaapi', 'drm']
+    encoder = nvenc_encoder('cuda', video_probe('h264', 'yuv420p'))
+    assert encoder.decoding_method() == 'cpu'
+
+
+def test_keeps_decoding_method_when_capabilities_are_unknown(capabilities):
+    capabilities[('hwaccels',)] = None
+    capabilities[('nvdec',)] = None
+    encoder = nvenc_encoder('cuda', video_probe('h264', 'yuv420p10le'))
+    assert encoder.decoding_method() == 'cuda'
+
+
+def test_vaapi_falls_back_to_cpu_for_hevc_422(capabilities):
+    encoder = vaapi_encoder(video_probe('hevc', 'yuv422p10le'))
+    assert encoder.decoding_method(VAAPI_DEVICE) == 'cpu'
+
+
+def test_vaapi_keeps_vaapi_for_supported_source(capabilities):
+    encoder = vaapi_encoder(video_probe('hevc', 'yuv420p10le'))
+    assert encoder.decoding_method(VAAPI_DEVICE) == 'vaapi'
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.video-transcoder-plus.test_encoder_filtergraphs
+
+    Compares the FFmpeg args built for the hardware encoders ('lib/encoders/{nvenc,qsv,vaapi}.py') with each decoding
+    method, with autocrop enabled.
+
+    A 1920x1080 h264 source with 140px black bars at the top and bottom (crop '1920:800:0:140') is used. The black bar
+    detection is skipped by setting the crop value on the stream mapper.
+
+"""
+import logging
+
+import pytest
+
+from conftest import import_plugin, video_probe
+from video_transcoder.lib.encoders import decode_support, nvenc, qsv, vaapi
+from video_transcoder.lib.ffmpeg import Probe
+from video_transcoder.lib.plugin_stream_mapper import PluginStreamMapper
+
+plugin = import_plugin('video-transcoder-plus')
+
+SOURCE_FILE = '/library/source.mkv'
+OUTPUT_FILE = '/cache/output.mkv'
+CROP_VALUE = '1920:800:0:140'
+
+CUDA_DEVICES = [{'hwaccel_device': '0', 'hwaccel_device_name': 'NVIDIA GeForce RTX 3060 (UUID: GPU-0)'}]
+VAAPI_DEVICES = [{'hwaccel': 'vaapi', 'hwaccel_device': 'renderD128', 'hwaccel_device_path': '/dev/dri/renderD128'}]
+
+INPUT_ARGS = ['-hide_banner', '-loglevel', 'info']
+OUTPUT_ARGS = ['-y', OUTPUT_FILE]
+
+
+@pytest.fixture(autouse=True)
+def hardware(monkeypatch):
+    """One NVIDIA GPU and one VAAPI render device that can decode the source"""
+    monkeypatch.setattr(nvenc, 'list_available_cuda_devices', lambda: CUDA_DEVICES)
+    monkeypatch.setattr(vaapi, 'list_available_vaapi_devices', lambda: VAAPI_DEVICES)
+    monkeypatch.setattr(qsv, 'list_available_vaapi_devices', lambda: VAAPI_DEVICES)
+    monkeypatch.setattr(decode_support, '_cache', {
+        ('hwaccels',):                     ['cuda', 'vaapi', 'qsv'],
+        ('nvdec',):                        decode_support.NVDEC_DECODE_MATRIX,
+        ('vainfo', '/dev/dri/renderD128'): {'h264': {'420': 8}, 'hevc': {'420': 10}},
+    })
+
+
+def ffmpeg_args(values):
+    """
+    Returns the FFmpeg args that the worker builds for the source file with the given settings
+
+    :param values:
+    :return:
+    """
+    settings = plugin.Settings(library_id=1)
+    settings_values = {
+        'mode':                  'standard',
+        'apply_smart_filters':   True,
+        'autocrop_black_bars':   True,
+        'target_resolution':     'source',
+        'max_muxing_queue_size': 4096,
+        'nvenc_device':          '0',
+        'vaapi_device':          'renderD128',
+    }
+    settings_values.update(values)
+    for key, value in settings_values.items():
+        settings.set_setting(key, value)
+
+    probe = Probe(logging.getLogger('tests'), allowed_mimetypes=['video'])
+    probe.set_probe(video_probe('h264', 'yuv420p', 1920, 1080))
+
+    mapper = PluginStreamMapper()
+    mapper.set_crop_value(CROP_VALUE)
+    mapper.set_default_values(settings, SOURCE_FILE, probe)
+    assert mapper.streams_need_processing()
+    mapper.set_output_file(OUTPUT_FILE)
+    return mapper.get_ffmpeg_args()
+
+
+def mapped_video(filtergraph):
+    """Returns the advanced options and the mapping of a video stream through the given filtergraph"""
+    return ['-strict', '-2', '-max_muxing_queue_size', '4096', '-filter_complex',
+            '[0:v:0]{}[0:vf:0-1]'.format(filtergraph), '-map', '[0:vf:0-1]']
+
+
+NVENC_ARGS = ['-c:v:0', 'hevc_nvenc', '-gpu', '0', '-preset', 'p4', '-profile:v:0', 'main']
+QSV_ARGS = ['-c:v:0', 'hevc_qsv', '-global_quality', '23', '-look_ahead_depth', '100', '-extbrc', '1',
+            '-preset', 'slow']
+VAAPI_ARGS = ['-c:v:0', 'hevc_vaapi', '-rc_mode', 'ICQ', '-global_quality', '23']
+
+
+def test_nvenc_cpu_decode():
+    assert ffmpeg_args({'video_encoder': 'hevc_nvenc', 'nvenc_decoding_method': 'cpu'}) == (
+        INPUT_ARGS + ['-i', SOURCE_FILE]
+        + mapped_video('crop=1920:800:0:140,format=nv12,hwupload_cuda')
+        + NVENC_ARGS + OUTPUT_ARGS
+    )
+
+
+def test_nvenc_cuda_decode():
+    # There is no CUDA crop filter. The decoder outputs SW frames that are cropped, then uploaded.
+    assert ffmpeg_args({'video_encoder': 'hevc_nvenc', 'nvenc_decoding_method': 'cuda'}) == (
+        INPUT_ARGS
+        + ['-hwaccel_device', '0', '-hwaccel', 'cuda', '-init_hw_device', 'cuda=hw', '-filter_hw_device', 'hw',
+           '-hwaccel_output_format', 'nv12']
+        + ['-i', SOURCE_FILE]
+        + mapped_video('crop=1920:800:0:140,hwupload_cuda')
+        + NVENC_ARGS + OUTPUT_ARGS
+    )
+
+
+def test_nvenc_cuvid_decode_crops_in_decoder():
+    # The crop is applied by the CUVID decoder ('-crop TxBxLxR'), so no filtergraph is needed
+    assert ffmpeg_args({'video_encoder': 'hevc_nvenc', 'nvenc_decoding_method': 'cuvid'}) == (
+        INPUT_ARGS
+        + ['-hwaccel_device', '0', '-hwaccel', 'cuvid', '-init_hw_device', 'cuda=hw', '-filter_hw_device', 'hw',
+           '-crop', '140x140x0x0', '-hwaccel_output_format', 'cuda', '-c:v:0', 'h264_cuvid']
+        + ['-i', SOURCE_FILE]
+        + ['-strict', '-2', '-max_muxing_queue_size', '4096', '-map', '0:v:0']
+        + NVENC_ARGS + OUTPUT_ARGS
+    )
+
+
+def test_nvenc_cuvid_decoder_is_selected_once():
+    args = ffmpeg_args({'video_encoder': 'hevc_nvenc', 'nvenc_decoding_method': 'cuvid'})
+    input_args = args[:args.index('-i')]
+    decoder_options = [arg for arg in input_args if arg == '-c:v' or arg.startswith('-c:v:')]
+    assert decoder_options == ['-c:v:0']
+
+
+def test_nvenc_cuvid_decode_in_basic_mode_selects_decoder():
+    args = ffmpeg_args({'mode': 'basic', 'video_encoder': 'hevc_nvenc', 'nvenc_decoding_method': 'cuvid'})
+    input_args = args[:args.index('-i')]
+    assert input_args[input_args.index('-c:v:0') + 1] == 'h264_cuvid'
+
+
+def test_qsv_cpu_decode():
+    assert ffmpeg_args({'video_encoder': 'hevc_qsv', 'qsv_decoding_method': 'cpu'}) == (
+        INPUT_ARGS + ['-init_hw_device', 'qsv=qsv0', '-filter_hw_device', 'qsv0']
+        + ['-i', SOURCE_FILE]
+        + mapped_video('crop=1920:800:0:140,format=nv12,hwupload=extra_hw_frames=64,format=qsv,vpp_qsv=format=nv12')
+        + QSV_ARGS + OUTPUT_ARGS
+    )
+
+
+def test_qsv_qsv_decode_crops_with_vpp():
+    assert ffmpeg_args({'video_encoder': 'hevc_qsv', 'qsv_decoding_method': 'qsv'}) == (
+        INPUT_ARGS
+        + ['-init_hw_device', 'qsv=qsv0', '-filter_hw_device', 'qsv0', '-hwaccel', 'qsv',
+           '-hwaccel_output_format', 'qsv']
+        + ['-i', SOURCE_FILE]
+        + mapped_video('format=nv12|qsv,hwupload=extra_hw_frames=64,format=qsv,vpp_qsv=format=nv12,'
+                       'vpp_qsv=cx=0:cy=140:cw=1920:ch=800')
+        + QSV_ARGS + OUTPUT_ARGS
+    )
+
+
+def test_qsv_qsv_decode_crops_and_scales_with_vpp():
+    args = ffmpeg_args({'video_encoder': 'hevc_qsv', 'qsv_decoding_method': 'qsv', 'target_resolution': '720p_hdtv'})
+    filtergraph = args[args.index('-filter_complex') + 1]
+    assert filtergraph == ('[0:v:0]format=nv12|qsv,hwupload=extra_hw_frames=64,format=qsv,vpp_qsv=format=nv12,'
+                           'vpp_qsv=cx=0:cy=140:cw=1920:ch=800,scale_qsv=w=1280:h=534[0:vf:0-1]')
+
+
+def test_vaapi_cpu_decode():
+    assert ffmpeg_args({'video_encoder': 'hevc_vaapi', 'vaapi_decoding_method': 'cpu'}) == (
+        INPUT_ARGS + ['-vaapi_device', '/dev/dri/renderD128']
+        + ['-i', SOURCE_FILE]
+        + mapped_video('crop=1920:800:0:140,format=nv12,hwupload')
+        + VAAPI_ARGS + OUTPUT_ARGS
+    )
+
+
+def test_vaapi_vaapi_decode_crops_with_scale_vaapi():
+    # The crop only sets the crop area of the VAAPI frame. A scale_vaapi to the cropped size applies it.
+    assert ffmpeg_args({'video_encoder': 'hevc_vaapi', 'vaapi_decoding_method': 'vaapi'}) == (
+        INPUT_ARGS
+        + ['-init_hw_device', 'vaapi=vaapi0:/dev/dri/renderD128', '-hwaccel', 'vaapi', '-hwaccel_output_format',
+           'vaapi', '-hwaccel_device', 'vaapi0', '-filter_hw_device', 'vaapi0']
+        + ['-i', SOURCE_FILE]
+        + mapped_video('format=nv12|vaapi,hwupload,crop=1920:800:0:140,scale_vaapi=w=1920:h=800')
+        + VAAPI_ARGS + OUTPUT_ARGS
+    )
+
+
+def test_vaapi_vaapi_decode_crops_and_scales_with_one_scale_vaapi():
+    args = ffmpeg_args({'video_encoder': 'hevc_vaapi', 'vaapi_decoding_method': 'vaapi',
+                        'target_resolution': '720p_hdtv'})
+    filtergraph = args[args.index('-filter_complex') + 1]
+    assert filtergraph == '[0:v:0]format=nv12|vaapi,hwupload,crop=1920:800:0:140,scale_vaapi=w=1280:h=534[0:vf:0-1]'
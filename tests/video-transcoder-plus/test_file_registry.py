@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.video-transcoder-plus.test_file_registry
+
+    Tests for 'lib/ffmpeg/file_registry.py' and its import of the marks in a directory's '.unmanic' file.
+
+"""
+import logging
+
+import pytest
+
+from conftest import FakeSettings
+from unmanic.libs.directoryinfo import UnmanicDirectoryInfo
+from video_transcoder.lib.ffmpeg import FileRegistry
+
+logger = logging.getLogger('tests')
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return FakeSettings(profile_directory=str(tmp_path / 'profile'))
+
+
+@pytest.fixture
+def library(tmp_path):
+    library_directory = tmp_path / 'library'
+    library_directory.mkdir()
+    return library_directory
+
+
+def write_directory_info(directory, section, filename, value):
+    directory_info = UnmanicDirectoryInfo(str(directory))
+    directory_info.set(section, filename, value)
+    directory_info.save()
+
+
+def test_imports_mark_of_mixed_case_filename(settings, library):
+    movie = library / 'Movie.mkv'
+    movie.write_bytes(b'video')
+    write_directory_info(library, 'video-transcoder-plus', 'Movie.mkv', 'force_transcoded')
+    registry = FileRegistry(settings, 'video-transcoder-plus', logger)
+    assert registry.get(str(movie)) == 'force_transcoded'
+
+
+def test_imports_only_the_marks_of_the_plugin(settings, library):
+    movie = library / 'movie.mkv'
+    movie.write_bytes(b'video')
+    write_directory_info(library, 'other_plugin', 'movie.mkv', 'processed')
+    registry = FileRegistry(settings, 'video-transcoder-plus', logger)
+    assert registry.get(str(movie)) == ''
+
+
+def test_mark_survives_a_rename(settings, library):
+    movie = library / 'Movie.mkv'
+    movie.write_bytes(b'video')
+    registry = FileRegistry(settings, 'video-transcoder-plus', logger)
+    registry.mark(str(movie), 'force_transcoded')
+    renamed = library / 'Movie (2001).mkv'
+    movie.rename(renamed)
+    assert registry.get(str(renamed)) == 'force_transcoded'
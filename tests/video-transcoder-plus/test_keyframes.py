@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.video-transcoder-plus.test_keyframes
+
+    Tests for the disk cache of 'lib/ffmpeg/keyframes.py' and the keyframe alignment of sample windows in
+    'lib/tools.py'.
+
+"""
+import os
+import time
+from array import array
+
+from video_transcoder.lib import tools
+from video_transcoder.lib.ffmpeg import keyframes
+
+
+def write_index(cache_directory, name, size, age):
+    cache_file = os.path.join(cache_directory, name + '.kfi')
+    with open(cache_file, 'wb') as f:
+        f.write(b'\0' * size)
+    mtime = time.time() - age
+    os.utime(cache_file, (mtime, mtime))
+    return cache_file
+
+
+def test_prune_removes_expired_indexes(tmp_path):
+    cache_directory = str(tmp_path)
+    expired = write_index(cache_directory, 'expired', 8, keyframes.DISK_CACHE_MAX_AGE + 60)
+    recent = write_index(cache_directory, 'recent', 8, 60)
+    assert keyframes.prune_cache_directory(cache_directory) == 1
+    assert not os.path.exists(expired)
+    assert os.path.exists(recent)
+
+
+def test_prune_removes_least_recently_used_indexes_over_the_size_limit(tmp_path):
+    cache_directory = str(tmp_path)
+    oldest = write_index(cache_directory, 'oldest', 400, 300)
+    older = write_index(cache_directory, 'older', 400, 200)
+    newest = write_index(cache_directory, 'newest', 400, 100)
+    other_file = tmp_path / 'notes.txt'
+    other_file.write_bytes(b'\0' * 4096)
+    assert keyframes.prune_cache_directory(cache_directory, max_bytes=1000) == 1
+    assert not os.path.exists(oldest)
+    assert os.path.exists(older)
+    assert os.path.exists(newest)
+    assert other_file.exists()
+
+
+def test_prune_of_missing_directory(tmp_path):
+    assert keyframes.prune_cache_directory(str(tmp_path / 'missing')) == 0
+
+
+def test_align_windows_subtracts_the_start_time(monkeypatch):
+    requested = {}
+
+    def get_keyframe_index(abspath, read_intervals=None, cache_directory=None):
+        requested['read_intervals'] = read_intervals
+        # Packet timestamps of a file that starts at 10s, with a keyframe every 2s
+        return keyframes.KeyframeIndex(array('d', [10.0 + (2 * n) for n in range(100)]))
+
+    monkeypatch.setattr(tools, 'get_keyframe_index', get_keyframe_index)
+    assert tools.align_windows_to_keyframes('source.mkv', [31, 75], 20, start_time=10.0) == [30.0, 74.0]
+    assert requested['read_intervals'] == '41%+20,85%+20'
+
+
+def test_get_start_time_from_probe():
+    assert tools.get_start_time_from_probe({'format': {'start_time': '1.400000'}}) == 1.4
+    assert tools.get_start_time_from_probe({'format': {'start_time': 'N/A'}}) == 0
+    assert tools.get_start_time_from_probe({}) == 0
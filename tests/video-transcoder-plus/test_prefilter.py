@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.video-transcoder-plus.test_prefilter
+
+    Tests for 'lib/ffmpeg/prefilter.py' and the verdicts it keeps in the plugin's DecisionCache.
+
+"""
+import os
+
+import pytest
+
+from conftest import FakeSettings
+from video_transcoder.lib.ffmpeg import PreFilter, decision_cache, prefilter
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return FakeSettings({'mode': 'basic'}, profile_directory=str(tmp_path / 'profile'))
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = tmp_path / 'library' / 'movie.mkv'
+    path.parent.mkdir()
+    path.write_bytes(b'\0' * prefilter.MIN_FILE_SIZE)
+    return str(path)
+
+
+def test_rejects_extension_of_other_mimetypes(tmp_path, settings):
+    path = tmp_path / 'cover.jpg'
+    path.write_bytes(b'\0' * prefilter.MIN_FILE_SIZE)
+    file_prefilter = PreFilter('test_rejects_extension', ['video'], settings=settings)
+    assert file_prefilter.check(str(path)) == (True, None)
+    assert prefilter.get_stats('test_rejects_extension')['rejected_extension'] == 1
+
+
+def test_rejects_small_and_missing_files(tmp_path, settings):
+    path = tmp_path / 'partial.mkv'
+    path.write_bytes(b'\0' * 1024)
+    file_prefilter = PreFilter('test_rejects_size', ['video'], settings=settings)
+    assert file_prefilter.check(str(path)) == (True, None)
+    assert file_prefilter.check(str(tmp_path / 'missing.mkv')) == (True, None)
+    assert prefilter.get_stats('test_rejects_size')['rejected_size'] == 2
+
+
+def test_reuses_stored_verdict_of_unchanged_file(settings, video_file):
+    file_prefilter = PreFilter('test_reuses_verdict', ['video'], settings=settings)
+    assert file_prefilter.check(video_file) == (False, None)
+    file_prefilter.store(video_file, True, forced_encode=True)
+
+    file_prefilter = PreFilter('test_reuses_verdict', ['video'], settings=settings)
+    assert file_prefilter.check(video_file) == (False, decision_cache.Verdict(True, True))
+
+
+def test_verdicts_are_shared_with_the_decision_cache(settings, video_file):
+    file_prefilter = PreFilter('test_shared_store', ['video'], settings=settings)
+    file_prefilter.check(video_file)
+    file_prefilter.store(video_file, False)
+    assert decision_cache.DecisionCache(settings).get(video_file) == decision_cache.Verdict(False, False)
+
+
+def test_ignores_verdict_of_changed_file(settings, video_file):
+    file_prefilter = PreFilter('test_changed_file', ['video'], settings=settings)
+    file_prefilter.check(video_file)
+    file_prefilter.store(video_file, False)
+    stat = os.stat(video_file)
+    os.utime(video_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert file_prefilter.check(video_file) == (False, None)
+
+
+def test_ignores_verdict_of_other_settings(settings, video_file):
+    file_prefilter = PreFilter('test_changed_settings', ['video'], settings=settings)
+    file_prefilter.check(video_file)
+    file_prefilter.store(video_file, False)
+    settings.set_setting('mode', 'advanced')
+    file_prefilter = PreFilter('test_changed_settings', ['video'], settings=settings)
+    assert file_prefilter.check(video_file) == (False, None)
+
+
+def test_without_settings_no_verdicts_are_kept(video_file):
+    file_prefilter = PreFilter('test_without_settings', ['video'])
+    assert file_prefilter.check(video_file) == (False, None)
+    file_prefilter.store(video_file, True)
+    assert file_prefilter.check(video_file) == (False, None)
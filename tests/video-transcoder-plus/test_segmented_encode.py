@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    tests.video-transcoder-plus.test_segmented_encode
+
+    Tests for the video start offset of 'lib/segmented_encode.py'. The segments are cut with their timestamps reset, so
+    the mux must shift the joined video back to where it started in the source.
+
+"""
+import logging
+
+from conftest import import_plugin, video_probe
+from video_transcoder.lib import segmented_encode
+from video_transcoder.lib.ffmpeg import Probe
+from video_transcoder.lib.plugin_stream_mapper import PluginStreamMapper
+
+plugin = import_plugin('video-transcoder-plus')
+
+AUDIO_STREAM = {'codec_name': 'aac', 'codec_type': 'audio', 'channels': 2, 'start_time': '0.000000'}
+
+
+def segmented_encode_args(probe_info):
+    settings = plugin.Settings(library_id=1)
+    for key, value in {'mode': 'basic', 'video_encoder': 'libx265', 'enable_segmented_encode': True}.items():
+        settings.set_setting(key, value)
+    probe = Probe(logging.getLogger('tests'), allowed_mimetypes=['video'])
+    probe.set_probe(probe_info)
+    mapper = PluginStreamMapper()
+    mapper.set_default_values(settings, '/library/source.mkv', probe)
+    assert mapper.streams_need_processing()
+    assert mapper.segmented_encode_enabled()
+    mapper.set_output_file('/cache/output.mkv')
+    return mapper.get_segmented_encode_args()
+
+
+def test_video_offset_is_the_video_start_in_the_source():
+    probe_info = video_probe('h264', extra_streams=[AUDIO_STREAM])
+    probe_info['streams'][0]['start_time'] = '1.523000'
+    probe_info['format']['start_time'] = '0.500000'
+    assert segmented_encode_args(probe_info)['video_offset'] == 1.023
+
+
+def test_video_offset_without_start_times():
+    probe_info = video_probe('h264', extra_streams=[AUDIO_STREAM])
+    del probe_info['streams'][0]['start_time']
+    del probe_info['format']['start_time']
+    assert segmented_encode_args(probe_info)['video_offset'] == 0
+
+
+def test_mux_shifts_the_joined_video(monkeypatch):
+    commands = []
+    monkeypatch.setattr(segmented_encode, '_run', lambda args: commands.append(args) or (0, ''))
+    manifest = {'input_file': 'source.mkv', 'output_file': 'output.mkv', 'mux_args': ['-map', '1:a:0'],
+                'video_offset': 1.023}
+    segmented_encode.mux_streams(manifest, 'video.mkv')
+    assert commands[0][:7] == ['ffmpeg', '-hide_banner', '-y', '-itsoffset', '1.023000', '-i', 'video.mkv']
+
+
+def test_mux_without_video_offset(monkeypatch):
+    commands = []
+    monkeypatch.setattr(segmented_encode, '_run', lambda args: commands.append(args) or (0, ''))
+    segmented_encode.mux_streams({'input_file': 'source.mkv', 'output_file': 'output.mkv'}, 'video.mkv')
+    assert '-itsoffset' not in commands[0]